@@ -1,7 +1,7 @@
 from aiogram.filters import BaseFilter
-from aiogram.types import Message
+from aiogram.types import Message, CallbackQuery
 from config import ADMIN_ID
 
 class IsAdmin(BaseFilter):
-    async def __call__(self, message: Message) -> bool:
-        return message.from_user.id == ADMIN_ID
+    async def __call__(self, event: Message | CallbackQuery) -> bool:
+        return event.from_user.id == ADMIN_ID
@@ -0,0 +1,254 @@
+"""
+Мікробенчмарк публічних методів сховища на різних розмірах.
+
+Для кожного розміру генерується сховище (гості, половина з другом,
+blacklist — десята частина гостей, known_users — усі гості),
+і кожен метод виконується, доки не набереться --budget секунд
+(не менше --min-reps разів). Методи, що пишуть, отримують нові
+аргументи на кожному повторі.
+
+Результат — таблиця (мкс на виклик) або JSON для порівняння змін:
+    python benchmarks/bench_database.py
+    python benchmarks/bench_database.py --sizes 1000,10000 --backend sqlite
+    python benchmarks/bench_database.py --mode journal --json after.json
+    python benchmarks/bench_database.py --cold      # JSON: кожен виклик читає файл заново
+    python benchmarks/bench_database.py --compare before.json after.json
+"""
+
+import argparse
+import itertools
+import json
+import os
+import sys
+import tempfile
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+FIRST_UID = 100000
+# місця для гостей, яких бенчмарк реєструє сам (до --max-reps на кожен такий випадок)
+SPARE_SLOTS = 10000
+
+
+def make_document(guests: int) -> dict:
+    return {
+        "max_slots": guests * 4 + SPARE_SLOTS,
+        "price": 0,
+        "event_info": {"place": "Квартира", "time": "2026-12-31 19:00", "price": "200"},
+        "unregister_allowed": True,
+        "max_friends_per_user": 3,
+        "registered_users": {
+            str(FIRST_UID + n): {
+                "name": f"Гість Номер{n}",
+                "username": f"guest{n}",
+                "registered_at": f"2026-01-01T00:00:00.{n:06d}",
+                "qr_token": str(uuid.uuid4()),
+                **({"friends": [{"name": f"Друг Гостя{n}", "username": None}]} if n % 2 else {}),
+            }
+            for n in range(guests)
+        },
+        "blacklist": [
+            (FIRST_UID * 10 + n) if n % 2 else f"spam{n}" for n in range(guests // 10)
+        ],
+        "known_users": {f"guest{n}": FIRST_UID + n for n in range(guests)},
+        "waitlist": [],
+    }
+
+
+def open_store(backend: str, guests: int):
+    path = os.path.join(tempfile.mkdtemp(prefix="kvart-bench-db-"), "store")
+    data = make_document(guests)
+
+    if backend == "sqlite":
+        from database_sqlite import SQLiteDatabase
+        store = SQLiteDatabase(path + ".sqlite3")
+        store.import_json(data)
+        return store
+
+    from database import Database
+    # документ пишемо одразу цілим — реєструвати 100k гостей по одному задовго
+    with open(path + ".json", 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+    return Database(path + ".json")
+
+
+def cases(store, guests: int):
+    """
+    (назва, функція від номера повтору[, підготовка]) — номер дає кожному запису
+    нові аргументи; підготовка виконується перед повтором і в замір не входить
+    """
+    existing = lambda i: FIRST_UID + (i * 7919) % guests   # noqa: E731
+    new_uid = itertools.count(FIRST_UID * 100)
+
+    def register(i):
+        uid = next(new_uid)
+        store.register_user(uid, f"Новий Гість{i}", f"new{uid}")
+
+    # unregister і check_in змінюють гостя назавжди — кожен повтор отримує
+    # свіжу реєстрацію, інакше після кількох повторів міряли б порожні виклики
+    victim = {}
+
+    def register_victim(i):
+        uid = next(new_uid)
+        assert store.register_user(uid, f"Тимчасовий Гість{i}", f"victim{uid}")
+        victim["uid"] = uid
+        victim["qr_token"] = store.get_registration(uid)["qr_token"]
+
+    def unregister(i):
+        store.unregister_user(victim["uid"])
+
+    def check_in(i):
+        result = store.check_in(victim["uid"], victim["qr_token"])
+        assert result["status"] == "ok", result
+
+    return [
+        # читання
+        ("get_registration", lambda i: store.get_registration(existing(i))),
+        ("is_user_registered", lambda i: store.is_user_registered(existing(i))),
+        ("get_event_info", lambda i: store.get_event_info()),
+        ("get_free_slots", lambda i: store.get_free_slots()),
+        ("get_current_slots", lambda i: store.get_current_slots()),
+        ("is_in_blacklist", lambda i: store.is_in_blacklist(existing(i), f"guest{i}")),
+        ("get_user_id_by_username", lambda i: store.get_user_id_by_username(f"guest{i % guests}")),
+        ("get_blacklist_count", lambda i: store.get_blacklist_count()),
+        ("get_registered_page", lambda i: store.get_registered_page()),
+        ("get_waitlist_position", lambda i: store.get_waitlist_position(existing(i))),
+        ("get_checked_in_count", lambda i: store.get_checked_in_count()),
+        ("get_all_registered", lambda i: store.get_all_registered()),
+        ("export_event_data", lambda i: store.export_event_data()),
+        # запис
+        ("register_user", register),
+        ("unregister_user", unregister, register_victim),
+        ("save_known_user", lambda i: store.save_known_user(next(new_uid), f"known{i}")),
+        ("add_to_blacklist", lambda i: store.add_to_blacklist(f"bench{i}")),
+        ("remove_from_blacklist", lambda i: store.remove_from_blacklist(f"bench{i}")),
+        ("check_in", check_in, register_victim),
+        ("set_max_slots", lambda i: store.set_max_slots(guests * 4 + SPARE_SLOTS + i)),
+    ]
+
+
+def measure(func, setup, before, budget: float, min_reps: int, max_reps: int) -> dict:
+    times = []
+    total = 0.0
+    for i in range(max_reps):
+        if i >= min_reps and total >= budget:
+            break
+        if setup:
+            setup(i)
+        if before:
+            before()
+        start = time.perf_counter()
+        func(i)
+        elapsed = time.perf_counter() - start
+        times.append(elapsed)
+        total += elapsed
+
+    times.sort()
+    return {
+        "reps": len(times),
+        "mean_us": round(total / len(times) * 1e6, 1),
+        "p50_us": round(times[len(times) // 2] * 1e6, 1),
+        "max_us": round(times[-1] * 1e6, 1),
+    }
+
+
+def run(args) -> dict:
+    results = {}
+    for guests in args.sizes:
+        store = open_store(args.backend, guests)
+        # --cold: JSON-сховище щоразу перечитує файл, як після зміни іншим процесом
+        before = store.invalidate_cache if args.cold and hasattr(store, "invalidate_cache") else None
+
+        for name, func, *setup in cases(store, guests):
+            if args.only and name not in args.only:
+                continue
+            row = measure(func, setup[0] if setup else None, before,
+                          args.budget, args.min_reps, args.max_reps)
+            results.setdefault(name, {})[str(guests)] = row
+            print(f"  {guests:>7} {name:<24} {row['mean_us']:>12.1f} мкс  ({row['reps']} разів)",
+                  file=sys.stderr)
+
+        store.close()
+    return {
+        "backend": args.backend,
+        "mode": args.mode,
+        "cold": args.cold,
+        "sizes": args.sizes,
+        "results": results,
+    }
+
+
+def format_us(value: float) -> str:
+    if value >= 1e6:
+        return f"{value / 1e6:.2f} с"
+    if value >= 1e3:
+        return f"{value / 1e3:.2f} мс"
+    return f"{value:.1f} мкс"
+
+
+def print_table(report: dict):
+    sizes = [str(s) for s in report["sizes"]]
+    print(f"\n{report['backend']} / {report['mode']}{' / cold' if report['cold'] else ''}: середній час виклику")
+    print(f"{'метод':<24}" + "".join(f"{s:>14}" for s in sizes))
+    for name, row in report["results"].items():
+        print(f"{name:<24}" + "".join(
+            f"{format_us(row[s]['mean_us']) if s in row else '-':>14}" for s in sizes
+        ))
+
+
+def compare(before_path: str, after_path: str):
+    with open(before_path, 'r', encoding='utf-8') as f:
+        before = json.load(f)
+    with open(after_path, 'r', encoding='utf-8') as f:
+        after = json.load(f)
+
+    sizes = [str(s) for s in after["sizes"] if str(s) in map(str, before["sizes"])]
+    print(f"{'метод':<24}" + "".join(f"{s:>14}" for s in sizes) + "   (після / до)")
+    for name, row in after["results"].items():
+        cells = []
+        for s in sizes:
+            old = before["results"].get(name, {}).get(s)
+            new = row.get(s)
+            cells.append(f"{new['mean_us'] / old['mean_us']:.2f}×" if old and new else "-")
+        print(f"{name:<24}" + "".join(f"{c:>14}" for c in cells))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="1000,10000,100000",
+                        type=lambda s: [int(x) for x in s.split(",")])
+    parser.add_argument("--backend", choices=["json", "sqlite"], default="json")
+    parser.add_argument("--mode", choices=["json", "journal"], default="json")
+    parser.add_argument("--cold", action="store_true", help="скидати кеш JSON перед кожним викликом")
+    parser.add_argument("--only", type=lambda s: set(s.split(",")), help="лише ці методи (через кому)")
+    parser.add_argument("--budget", type=float, default=0.3, help="секунд на метод і розмір")
+    parser.add_argument("--min-reps", type=int, default=3)
+    parser.add_argument("--max-reps", type=int, default=2000)
+    parser.add_argument("--json", help="записати результат у файл")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"), help="порівняти два JSON")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    json_path = os.path.abspath(args.json) if args.json else None
+    # database.py створює db під час імпорту, а сховища за відносними шляхами
+    # відкриває при першому зверненні — хай це станеться в тимчасовому каталозі
+    os.chdir(tempfile.mkdtemp(prefix="kvart-bench-db-"))
+    import config
+    config.DATABASE_MODE = args.mode
+    import database
+    database.DATABASE_MODE = args.mode
+
+    report = run(args)
+    print_table(report)
+
+    if json_path:
+        with open(json_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Бенчмарк експорту: CSV / XLSX у пам'яті проти старого склеювання рядків.
+
+Запуск (з каталогу бота):
+    python benchmarks/bench_export.py
+    python benchmarks/bench_export.py --guests 10000 --friends 2
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def make_store(guests: int, friends: int):
+    os.chdir(tempfile.mkdtemp(prefix="kvart-export-"))
+    import database
+
+    # документ пишемо одразу цілим — реєструвати 10k гостей по одному задовго
+    data = {
+        "max_slots": guests,
+        "price": 0,
+        "event_info": {"place": "", "time": "", "price": ""},
+        "unregister_allowed": True,
+        "registered_users": {
+            str(100000 + uid): {
+                "name": f"Гість Номер{uid}",
+                "username": f"guest{uid}",
+                "registered_at": f"2026-01-01T00:00:00.{uid:06d}",
+                "qr_token": str(uuid.uuid4()),
+                "friends": [{"name": f"Друг {uid}-{n}", "username": None} for n in range(friends)],
+            }
+            for uid in range(guests)
+        },
+        "blacklist": [],
+        "known_users": {},
+    }
+    os.makedirs("data", exist_ok=True)
+    with open(database.DATABASE_PATH, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+
+    return database.Database()
+
+
+def legacy_export(db) -> bytes:
+    # так /export працював раніше: text += ... у циклі
+    text = "ЕКСПОРТ\n\n"
+    for uid, u in db.get_all_registered().items():
+        text += f"{u['name']} | {uid} | @{u.get('username')}\n"
+    return text.encode("utf-8")
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start, len(result)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--guests", type=int, default=10000)
+    parser.add_argument("--friends", type=int, default=1)
+    args = parser.parse_args()
+
+    db = make_store(args.guests, args.friends)
+
+    from database import AsyncDatabase
+    from export import build_export, fetch_export_pages, xlsx_available
+
+    def export(fmt):
+        # як у /export: сторінки через adb, потім збирання файла
+        adb = AsyncDatabase(db)
+        pages = asyncio.run(fetch_export_pages(adb))
+        adb.shutdown()
+        return build_export(pages, fmt)
+
+    results = [("старий txt (+=)", *timed(legacy_export, db))]
+    results.append(("csv", *timed(export, "csv")))
+    if xlsx_available():
+        results.append(("xlsx", *timed(export, "xlsx")))
+
+    rows = args.guests * (1 + args.friends)
+    print(f"гостей: {args.guests}, рядків експорту: {rows}")
+    print(f"{'формат':<18}{'час, мс':>10}{'розмір, КБ':>12}")
+    for label, elapsed, size in results:
+        print(f"{label:<18}{elapsed * 1000:>10.1f}{size / 1024:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+Бенчмарк генерації QR-кодів: один потік проти пулу процесів.
+
+Запуск (з каталогу бота):
+    python benchmarks/bench_qr.py
+    python benchmarks/bench_qr.py --guests 1000 --workers 4
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import qr_utils  # noqa: E402
+from qr_utils import make_qr_token, render_qr_png, prerender_qr_codes  # noqa: E402
+
+
+def bench_single(tokens):
+    start = time.perf_counter()
+    for token in tokens:
+        render_qr_png(token)
+    return time.perf_counter() - start
+
+
+async def bench_pool(tokens):
+    # прогрів: процеси пулу стартують до заміру
+    await prerender_qr_codes(tokens[:qr_utils.QR_POOL_WORKERS], chunk_size=1)
+
+    start = time.perf_counter()
+    rendered = await prerender_qr_codes(tokens)
+    elapsed = time.perf_counter() - start
+    assert len(rendered) == len(tokens)
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--guests", type=int, default=1000)
+    parser.add_argument("--workers", type=int, default=qr_utils.QR_POOL_WORKERS)
+    args = parser.parse_args()
+
+    qr_utils.QR_POOL_WORKERS = args.workers
+    tokens = [make_qr_token(100000 + i, {"qr_token": str(uuid.uuid4())}, "1") for i in range(args.guests)]
+
+    single = bench_single(tokens)
+    pooled = asyncio.run(bench_pool(tokens))
+    qr_utils.shutdown_qr_pool()
+
+    print(f"{'режим':<22}{'гостей':>8}{'час, с':>10}{'QR/с':>10}")
+    print(f"{'один потік':<22}{args.guests:>8}{single:>10.2f}{args.guests / single:>10.0f}")
+    print(f"{f'пул, {args.workers} процесів':<22}{args.guests:>8}{pooled:>10.2f}{args.guests / pooled:>10.0f}")
+    print(f"прискорення: x{single / pooled:.2f}")
+
+
+if __name__ == "__main__":
+    main()
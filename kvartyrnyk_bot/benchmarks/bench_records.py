@@ -0,0 +1,116 @@
+"""
+Пам'ять і (де)серіалізація: записи з __slots__ (records.py) проти
+старого подання документа (вкладені словники з рядковими ключами).
+
+Обидва варіанти читаються з того самого JSON-тексту, тож порівнюється
+саме те, що сховище тримає в пам'яті після _load_data.
+
+Запуск (з каталогу бота):
+    python benchmarks/bench_records.py
+    python benchmarks/bench_records.py --guests 50000 --friends-every 3
+"""
+
+import argparse
+import gc
+import json
+import os
+import sys
+import time
+import tracemalloc
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from records import encode_record, intern_username, registrations_from_json  # noqa: E402
+
+
+def make_text(guests: int, friends_every: int) -> str:
+    users = {}
+    for n in range(guests):
+        user = {
+            "name": f"Гість Номер{n}",
+            "username": f"guest{n}",
+            "registered_at": f"2026-01-01T00:00:00.{n:06d}",
+            "qr_token": str(uuid.uuid4()),
+        }
+        if friends_every and n % friends_every == 0:
+            user["friends"] = [{"name": f"Друг Гостя{n}", "username": None}]
+        users[str(100000 + n)] = user
+    return json.dumps({
+        "registered_users": users,
+        "known_users": {f"guest{n}": 100000 + n for n in range(guests)},
+    }, ensure_ascii=False)
+
+
+def load_legacy(text: str):
+    return json.loads(text)
+
+
+def load_records(text: str):
+    # те саме, що Database._normalize_document
+    data = json.loads(text)
+    data["registered_users"] = registrations_from_json(data["registered_users"])
+    data["known_users"] = {intern_username(k): v for k, v in data["known_users"].items()}
+    return data
+
+
+def dump_legacy(data) -> str:
+    # так Database писав знімок раніше
+    return json.dumps(data, ensure_ascii=False, indent=2)
+
+
+def dump_records(data) -> str:
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"), default=encode_record)
+
+
+def resident_bytes(load, text: str) -> int:
+    gc.collect()
+    tracemalloc.start()
+    data = load(text)
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del data
+    return size
+
+
+def best_time(func, arg, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(arg)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--guests", type=int, default=20000)
+    parser.add_argument("--friends-every", type=int, default=2, help="у кожного N-го гостя є друг (0 — ні в кого)")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    text = make_text(args.guests, args.friends_every)
+    legacy, records = load_legacy(text), load_records(text)
+    assert json.loads(dump_records(records)) == json.loads(text), "записи не відтворюють документ"
+
+    rows = [
+        ("пам'ять, МБ",
+         resident_bytes(load_legacy, text) / 2 ** 20, resident_bytes(load_records, text) / 2 ** 20),
+        ("читання, мс",
+         best_time(load_legacy, text, args.repeat) * 1000, best_time(load_records, text, args.repeat) * 1000),
+        ("запис, мс",
+         best_time(dump_legacy, legacy, args.repeat) * 1000, best_time(dump_records, records, args.repeat) * 1000),
+        ("розмір файла, КБ",
+         len(dump_legacy(legacy).encode()) / 1024, len(dump_records(records).encode()) / 1024),
+    ]
+
+    friends = f"друг у кожного {args.friends_every}-го" if args.friends_every else "без друзів"
+    print(f"{args.guests} гостей, {friends}\n")
+    print(f"{'':<20}{'словники':>12}{'записи':>12}{'різниця':>10}")
+    for label, old, new in rows:
+        print(f"{label:<20}{old:>12.1f}{new:>12.1f}{new / old:>9.2f}×")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,349 @@
+"""
+Навантажувальний тест обробників без мережі: справжній Dispatcher
+(bot.build_dispatcher) і Bot з підробленою сесією, що відповідає на
+запити до Bot API одразу в процесі.
+
+Кожен синтетичний гість проходить шлях
+    📝 Реєстрація → ім'я → "Так" → кількість друзів → друзі → QR → 🎫 Мій QR
+(оновлення одного гостя — по черзі, гості — паралельно). Гість
+прогріву реєструється без друзів. Після навантаження адміністратор
+виконує ADMIN_SCRIPT: помилка будь-якої команди — провал тесту.
+Наостанок — розсилка частині гостей, де Bot API відповідає 5xx, 404
+і непередбаченою помилкою: вона має дійти до кінця і надіслати звіт.
+
+Звіт: пропускна здатність, p50/p99 затримки оновлення, звернення до
+сховища на оновлення, пікова пам'ять. Код виходу 1 — якщо перевищено
+пороги або результат гірший за базовий понад --tolerance.
+
+Запуск (з каталогу бота):
+    python benchmarks/load_test.py
+    python benchmarks/load_test.py --users 5000 --concurrency 200 --backend sqlite
+    python benchmarks/load_test.py --save baseline.json
+    python benchmarks/load_test.py --baseline baseline.json --tolerance 0.25
+    python benchmarks/load_test.py --min-throughput 500 --max-p99-ms 50
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+BOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BOT_DIR)
+
+from aiogram import Bot  # noqa: E402
+from aiogram.client.session.base import BaseSession  # noqa: E402
+from aiogram.exceptions import TelegramNotFound, TelegramServerError  # noqa: E402
+from aiogram.methods import CopyMessage, SendMessage, SendPhoto, TelegramMethod  # noqa: E402
+from aiogram.types import Chat, Message, PhotoSize  # noqa: E402
+
+
+class FakeSession(BaseSession):
+    """
+    Сесія Bot API без мережі: SendMessage / SendPhoto повертають
+    повідомлення, решта методів — True. api_latency імітує мережу.
+    """
+
+    def __init__(self, api_latency: float = 0.0):
+        super().__init__()
+        self.api_latency = api_latency
+        self.requests = 0
+        self.copy_errors = {}   # chat_id → помилки для наступних CopyMessage (по одній на виклик)
+        self.sent_texts = []    # (chat_id, текст) усіх SendMessage
+        self._message_ids = itertools.count(1)
+
+    async def make_request(self, bot: Bot, method: TelegramMethod, timeout=None):
+        self.requests += 1
+        if self.api_latency:
+            await asyncio.sleep(self.api_latency)
+
+        if isinstance(method, CopyMessage) and self.copy_errors.get(method.chat_id):
+            raise self.copy_errors[method.chat_id].pop(0)(method)
+        if not isinstance(method, (SendMessage, SendPhoto)):
+            return True
+        if isinstance(method, SendMessage):
+            self.sent_texts.append((method.chat_id, method.text))
+
+        message_id = next(self._message_ids)
+        photo = None
+        if isinstance(method, SendPhoto):
+            photo = [PhotoSize(file_id=f"photo-{message_id}", file_unique_id=str(message_id),
+                               width=290, height=290)]
+        return Message(
+            message_id=message_id,
+            date=datetime.now(),
+            chat=Chat(id=method.chat_id, type="private"),
+            text=getattr(method, "text", None),
+            photo=photo,
+        )
+
+    async def stream_content(self, *args, **kwargs):
+        yield b""
+
+    async def close(self):
+        pass
+
+
+def make_update(update_id: int, user_id: int, text: str) -> dict:
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": "Гість", "username": f"guest{user_id}"},
+            "text": text,
+        },
+    }
+
+
+def guest_script(user_id: int, friends: int, friends_allowed: bool = True) -> list:
+    """
+    Тексти, які надсилає один гість (friends_allowed — чи бот питає про друзів)
+    """
+    script = ["📝 Реєстрація", f"Гість Номер{user_id}"]
+    if friends:
+        script += ["Так", str(friends)]
+        for n in range(1, friends + 1):
+            script += [f"Друг{n} Гостя{user_id}", "-"]
+    elif friends_allowed:
+        script.append("Ні")
+    script.append("🎫 Мій QR")
+    return script
+
+
+# команди адміністратора після навантаження (серед гостей є гість без друзів)
+ADMIN_SCRIPT = ["/list_users", "/find Гість", "/full_info", "/waitlist", "/slots_info", "/export", "/metrics"]
+
+
+async def broadcast_check(bot: Bot, session: FakeSession, admin_id: int, recipients: list) -> list:
+    """
+    Розсилка з помилками Bot API; повертає список проблем (порожній — усе гаразд)
+    """
+    from broadcast import broadcaster, send_queue
+
+    session.copy_errors = {
+        recipients[0]: [lambda m: TelegramServerError(m, "Internal Server Error")],   # повтор → доставлено
+        recipients[1]: [lambda m: TelegramNotFound(m, "chat not found")],             # не доставлено
+        recipients[2]: [lambda m: RuntimeError("непередбачена помилка")],             # не доставлено
+    }
+    problems = []
+    send_queue.start(bot)
+    try:
+        broadcaster.start(admin_id, 1, recipients)
+        await broadcaster._task
+        await asyncio.sleep(0.1)   # звіт іде через чергу send_queue
+    except Exception as e:
+        problems.append(f"розсилка обірвалась: {e!r}")
+    finally:
+        await send_queue.stop()
+
+    expected = {"sent": len(recipients) - 2, "failed": 2}
+    got = {key: broadcaster.state[key] for key in expected}
+    if got != expected:
+        problems.append(f"розсилка: {got}, очікувалось {expected}")
+    if os.path.exists(broadcaster.state_path):
+        problems.append("розсилка: стан не прибрано після завершення")
+    if not any(chat_id == admin_id and "Розсилку завершено" in text for chat_id, text in session.sent_texts):
+        problems.append("розсилка: адміністратор не отримав звіт")
+    return problems
+
+
+def peak_memory_mb() -> float:
+    if resource is None:
+        return 0.0
+    # ru_maxrss: КБ у Linux, байти в macOS
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+
+
+def percentile(sorted_values: list, q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+async def run(args) -> dict:
+    from aiogram.fsm.storage.memory import MemoryStorage
+
+    import bot as bot_module
+    from database import db, adb
+    from fsm_storage import SQLiteStorage
+    from config import ADMIN_ID
+    from metrics import metrics
+    from qr_utils import shutdown_qr_pool
+    from throttling import throttling_middleware
+
+    # +1 гість — прогрів
+    db.set_max_slots((args.users + 1) * (1 + args.friends))
+    db.set_max_friends(args.friends)
+
+    storage = SQLiteStorage() if args.fsm == "sqlite" else MemoryStorage()
+    dp = bot_module.build_dispatcher(storage, throttling=args.throttling)
+    session = FakeSession(args.api_latency / 1000)
+    bot = Bot("123456:LOADTEST", session=session)
+
+    update_ids = itertools.count(1)
+    latencies = []
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def guest(user_id: int, friends: int = args.friends):
+        async with semaphore:
+            for text in guest_script(user_id, friends, friends_allowed=args.friends > 0):
+                start = time.perf_counter()
+                await dp.feed_raw_update(bot, make_update(next(update_ids), user_id, text))
+                latencies.append(time.perf_counter() - start)
+
+    # прогрів: імпорти, пул процесів QR, перше читання сховища
+    await guest(10 ** 9, friends=0)
+    latencies.clear()
+    metrics.reset()
+    requests_before = session.requests
+
+    start = time.perf_counter()
+    await asyncio.gather(*(guest(100_000 + n) for n in range(args.users)))
+    elapsed = time.perf_counter() - start
+
+    registered = len(db.get_all_registered()) - 1   # без гостя з прогріву
+
+    admin_errors = []
+    for text in ADMIN_SCRIPT:
+        try:
+            await dp.feed_raw_update(bot, make_update(next(update_ids), ADMIN_ID, text))
+        except Exception as e:
+            admin_errors.append(f"{text}: {e!r}")
+    admin_errors += await broadcast_check(
+        bot, session, ADMIN_ID, [100_000 + n for n in range(20)]
+    )
+
+    await storage.close()
+    adb.shutdown()
+    shutdown_qr_pool()
+
+    latencies.sort()
+    calls = metrics.update_calls
+    throttled = throttling_middleware.stats()
+    return {
+        "users": args.users,
+        "friends": args.friends,
+        "backend": args.backend,
+        "mode": args.mode,
+        "updates": len(latencies),
+        "registered": registered,
+        "seconds": round(elapsed, 3),
+        "updates_per_sec": round(len(latencies) / elapsed, 1),
+        "registrations_per_sec": round(registered / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        "max_ms": round(latencies[-1] * 1000, 2),
+        "storage_calls_per_update": round(calls.mean(), 2),
+        "api_requests_per_update": round((session.requests - requests_before) / len(latencies), 2),
+        "peak_memory_mb": round(peak_memory_mb(), 1),
+        "throttled": throttled["dropped_duplicate"] + throttled["dropped_rate"],
+        "admin_errors": admin_errors,
+    }
+
+
+# ===== ПЕРЕВІРКИ =====
+
+# метрика → чи "більше — краще"
+COMPARED = {
+    "updates_per_sec": True,
+    "p99_ms": False,
+    "storage_calls_per_update": False,
+    "peak_memory_mb": False,
+}
+
+
+def check(result: dict, args) -> list:
+    failures = []
+    # з --throttling скриптові гості клацають швидше за ліміт — частина відкидається
+    if not args.throttling and result["registered"] != args.users:
+        failures.append(f"зареєстровано {result['registered']} з {args.users}")
+    failures += [f"адміністратор: {error}" for error in result["admin_errors"]]
+
+    limits = [
+        ("updates_per_sec", args.min_throughput, True),
+        ("p99_ms", args.max_p99_ms, False),
+        ("storage_calls_per_update", args.max_calls, False),
+        ("peak_memory_mb", args.max_memory_mb, False),
+    ]
+    for key, limit, higher_is_better in limits:
+        if limit is None:
+            continue
+        if (result[key] < limit) if higher_is_better else (result[key] > limit):
+            failures.append(f"{key} = {result[key]}, поріг {limit}")
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        for key, higher_is_better in COMPARED.items():
+            if key not in baseline or not baseline[key]:
+                continue
+            change = result[key] / baseline[key] - 1
+            if (-change if higher_is_better else change) > args.tolerance:
+                failures.append(f"{key}: {result[key]} проти базових {baseline[key]} ({change:+.0%})")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--friends", type=int, default=1, help="друзів у кожного гостя")
+    parser.add_argument("--concurrency", type=int, default=100, help="гостей одночасно")
+    parser.add_argument("--backend", choices=["json", "sqlite"], default="json")
+    parser.add_argument("--mode", choices=["json", "journal"], default="json")
+    parser.add_argument("--fsm", choices=["memory", "sqlite"], default="memory")
+    parser.add_argument("--throttling", action="store_true", help="увімкнути ThrottlingMiddleware")
+    parser.add_argument("--api-latency", type=float, default=0.0, help="імітація мережі Bot API, мс")
+    parser.add_argument("--min-throughput", type=float, help="мінімум оновлень/с")
+    parser.add_argument("--max-p99-ms", type=float)
+    parser.add_argument("--max-calls", type=float, help="максимум звернень до сховища на оновлення")
+    parser.add_argument("--max-memory-mb", type=float)
+    parser.add_argument("--baseline", help="JSON попереднього прогону (--save)")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="допустиме погіршення відносно базового")
+    parser.add_argument("--save", help="записати результат у JSON")
+    args = parser.parse_args()
+    if args.baseline:
+        args.baseline = os.path.abspath(args.baseline)
+    if args.save:
+        args.save = os.path.abspath(args.save)
+
+    logging.basicConfig(level=logging.WARNING)
+
+    # сховища відкриваються за відносними шляхами під час імпорту database
+    os.chdir(tempfile.mkdtemp(prefix="kvart-load-"))
+    import config
+    config.DATABASE_BACKEND = args.backend
+    config.DATABASE_MODE = args.mode
+
+    result = asyncio.run(run(args))
+    for key, value in result.items():
+        print(f"{key:>26}: {value}")
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+
+    failures = check(result, args)
+    if failures:
+        print("\nРЕГРЕСІЯ:")
+        for failure in failures:
+            print(f"  - {failure}")
+        sys.exit(1)
+    print("\nOK")
+
+
+if __name__ == "__main__":
+    main()
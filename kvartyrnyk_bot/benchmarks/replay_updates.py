@@ -0,0 +1,65 @@
+"""
+Надсилає записані оновлення Telegram на локальний вебхук.
+
+Файл — JSON-рядки (по одному об'єкту Update на рядок) або JSON-масив.
+
+Запуск (бот працює з USE_WEBHOOK = True, порожнім WEBHOOK_URL і заданим WEBHOOK_SECRET):
+    python benchmarks/replay_updates.py updates.jsonl
+    python benchmarks/replay_updates.py updates.jsonl --concurrency 50 --secret mysecret
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+import aiohttp
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import WEBHOOK_PORT, WEBHOOK_PATH, WEBHOOK_SECRET  # noqa: E402
+from webhook import SECRET_HEADER  # noqa: E402
+
+
+def load_updates(path: str) -> list:
+    with open(path, 'r', encoding='utf-8') as f:
+        text = f.read().strip()
+    if text.startswith("["):
+        return json.loads(text)
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+
+async def replay(url: str, updates: list, concurrency: int, secret: str):
+    semaphore = asyncio.Semaphore(concurrency)
+    statuses = {}
+    headers = {SECRET_HEADER: secret} if secret else {}
+
+    async with aiohttp.ClientSession(headers=headers) as session:
+        async def post(update):
+            async with semaphore:
+                async with session.post(url, json=update) as response:
+                    statuses[response.status] = statuses.get(response.status, 0) + 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(post(u) for u in updates))
+        elapsed = time.perf_counter() - start
+
+    print(f"Надіслано {len(updates)} оновлень за {elapsed:.2f} с "
+          f"({len(updates) / elapsed:.0f}/с), відповіді: {statuses}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("file")
+    parser.add_argument("--url", default=f"http://127.0.0.1:{WEBHOOK_PORT}{WEBHOOK_PATH}")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--secret", default=WEBHOOK_SECRET)
+    args = parser.parse_args()
+
+    asyncio.run(replay(args.url, load_updates(args.file), args.concurrency, args.secret))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Стрес-тест реєстрації: тисячі одночасних спроб зареєструватися
+мають зайняти рівно max_slots місць (гості разом з друзями) — ні більше, ні менше.
+
+Запуск (з каталогу бота):
+    python benchmarks/stress_register.py
+    python benchmarks/stress_register.py --users 5000 --slots 300 --mode journal
+    python benchmarks/stress_register.py --backend sqlite
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def make_database(backend: str, mode: str):
+    import config
+    config.DATABASE_BACKEND = backend
+    config.DATABASE_MODE = mode
+
+    import database
+    database.DATABASE_MODE = mode
+    return database
+
+
+def open_store(database):
+    if database.DATABASE_BACKEND == "sqlite":
+        from database_sqlite import SQLiteDatabase
+        return SQLiteDatabase()
+    return database.Database()
+
+
+async def run_async(database, users: int, slots: int) -> int:
+    db = open_store(database)
+    db.set_max_slots(slots)
+    adb = database.AsyncDatabase(db)
+
+    results = await asyncio.gather(*(
+        adb.register_user(uid, f"Гість {uid}", f"user{uid}", friends=[{"name": "Друг Гостя"}])
+        for uid in range(users)
+    ))
+    adb.shutdown()
+    return sum(results)
+
+
+def run_threads(database, users: int, slots: int) -> int:
+    db = open_store(database)
+    db.clear_all_registrations()
+    db.set_max_slots(slots)
+
+    with ThreadPoolExecutor(max_workers=32) as pool:
+        results = list(pool.map(
+            lambda uid: db.register_user(uid, f"Гість {uid}", f"user{uid}"),
+            range(users)
+        ))
+    return sum(results)
+
+
+def check(database, label: str, succeeded: int, guests: int, slots: int):
+    db = open_store(database)
+    if isinstance(db, database.Database):
+        db.wait_for_compaction()
+        # перечитуємо з диска, а не з кешу
+        db.invalidate_cache()
+    stored = db.get_current_slots()
+    print(f"{label}: успішних {succeeded}, у сховищі {stored}, ліміт {slots}")
+    assert succeeded == guests, f"{label}: очікували {guests} успішних, маємо {succeeded}"
+    assert stored == slots, f"{label}: у сховищі {stored} замість {slots}"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=3000)
+    parser.add_argument("--slots", type=int, default=200)
+    parser.add_argument("--backend", choices=["json", "sqlite"], default="json")
+    parser.add_argument("--mode", choices=["json", "journal"], default="json")
+    args = parser.parse_args()
+
+    os.chdir(tempfile.mkdtemp(prefix="kvart-stress-"))
+    database = make_database(args.backend, args.mode)
+
+    start = time.perf_counter()
+    # в asyncio-прогоні кожен гість з одним другом — займає два місця
+    check(database, "asyncio", asyncio.run(run_async(database, args.users, args.slots)),
+          args.slots // 2, args.slots)
+    check(database, "threads", run_threads(database, args.users, args.slots), args.slots, args.slots)
+    print(f"OK за {time.perf_counter() - start:.2f} с")
+
+
+if __name__ == "__main__":
+    main()
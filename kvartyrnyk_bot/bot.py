@@ -5,12 +5,12 @@
 import asyncio
 import logging
 
-import dp
 from aiogram import Bot, Dispatcher
 from aiogram.fsm.storage.memory import MemoryStorage
 
-from config import BOT_TOKEN
-from handlers_user import user_router
+from config import BOT_TOKEN, FSM_STORAGE, USE_WEBHOOK, DROP_PENDING_UPDATES, METRICS_HOST, METRICS_PORT
+from fsm_storage import SQLiteStorage
+from handlers_user import user_router, expire_holds_loop
 from handlers_admin import admin_router
 
 
@@ -21,18 +21,19 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-from database import db
-print("DB METHODS:", dir(db))
+from database import db, adb
+from qr_utils import start_qr_pool, shutdown_qr_pool
+from qr_tokens import check_signing_keys
+from webhook import run_webhook
+from broadcast import send_queue, broadcaster
+from throttling import throttling_middleware
+from reminders import reminders
+from metrics import update_metrics_middleware, handler_metrics_middleware, start_metrics_server
 
-async def main():
+def build_dispatcher(storage, throttling: bool = True) -> Dispatcher:
     """
-    Головна функція запуску бота
+    Диспетчер з роутерами і middleware (його ж збирає benchmarks/load_test.py)
     """
-    logger.info("Запуск бота...")
-
-    # Ініціалізація бота та диспетчера
-    bot = Bot(token=BOT_TOKEN)
-    storage = MemoryStorage()
     dp = Dispatcher(storage=storage)
 
     # Реєстрація роутерів
@@ -40,17 +41,69 @@ async def main():
     dp.include_router(admin_router)
     dp.include_router(user_router)
 
+    # обмеження частоти діє на обробники всіх роутерів
+    if throttling:
+        dp.message.middleware(throttling_middleware)
+        dp.callback_query.middleware(throttling_middleware)
+
+    # метрики: усе оновлення + кожен обробник (після throttling)
+    dp.update.outer_middleware(update_metrics_middleware)
+    dp.message.middleware(handler_metrics_middleware)
+    dp.callback_query.middleware(handler_metrics_middleware)
+    return dp
+
+
+async def main():
+    """
+    Головна функція запуску бота
+    """
+    logger.info("Запуск бота...")
+
+    # без секрету QR-коди на вхід можна підробити — краще не стартувати
+    check_signing_keys()
+
+    # сховища і каталог подій (перший запуск — міграція в events/)
+    db.open()
+    start_qr_pool()
+
+    # Ініціалізація бота та диспетчера
+    bot = Bot(token=BOT_TOKEN)
+    storage = SQLiteStorage() if FSM_STORAGE == "sqlite" else MemoryStorage()
+    dp = build_dispatcher(storage)
+
     logger.info("Бот успішно запущено!")
     logger.info("Натисніть Ctrl+C для зупинки бота")
 
-    try:
-        # Видалення вебхуків (якщо були)
-        await bot.delete_webhook(drop_pending_updates=True)
+    # Черга вихідних повідомлень і незавершена розсилка (якщо була)
+    send_queue.start(bot)
+    broadcaster.resume()
+    reminders.start()
+    holds_task = asyncio.create_task(expire_holds_loop())
 
-        # Запуск polling
-        await dp.start_polling(bot)
+    metrics_runner = None
+    if METRICS_PORT:
+        metrics_runner = await start_metrics_server(METRICS_HOST, METRICS_PORT, throttling_middleware.stats)
+        logger.info("Метрики Prometheus: http://%s:%s/metrics", METRICS_HOST, METRICS_PORT)
+
+    try:
+        if USE_WEBHOOK:
+            await run_webhook(dp, bot)
+        else:
+            # Видалення вебхуків (якщо були)
+            await bot.delete_webhook(drop_pending_updates=DROP_PENDING_UPDATES)
+
+            # Запуск polling
+            await dp.start_polling(bot)
     finally:
+        holds_task.cancel()
+        await reminders.stop()
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
+        await send_queue.stop()
         await bot.session.close()
+        await storage.close()
+        adb.shutdown()
+        shutdown_qr_pool()
 
 
 if __name__ == "__main__":
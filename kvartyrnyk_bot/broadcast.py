@@ -0,0 +1,310 @@
+"""
+Вихідні повідомлення з обмеженням швидкості та розсилка всім гостям.
+
+Telegram дозволяє ~30 повідомлень/с на бота і ~1 повідомлення/с в один чат,
+а при перевищенні відповідає 429 з retry_after.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import re
+import time
+from datetime import datetime
+
+from aiogram import Bot
+from aiogram.exceptions import (
+    TelegramAPIError, TelegramRetryAfter, TelegramNetworkError, TelegramServerError,
+)
+
+from config import (
+    BROADCAST_GLOBAL_RATE, BROADCAST_CHAT_INTERVAL, BROADCAST_CONCURRENCY, BROADCAST_STATE_PATH,
+)
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = 5
+
+
+def escape_markdown(text) -> str:
+    """
+    Екранує вільний текст (назви, імена, місце) для parse_mode="Markdown"
+    """
+    return re.sub(r"([_*`\[])", r"\\\1", str(text))
+
+
+class TokenBucket:
+    """
+    Відро токенів: не більше rate запитів за секунду (з короткими сплесками до capacity)
+    """
+
+    def __init__(self, rate: float, capacity: float | None = None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def pause(self, seconds: float):
+        """
+        Зупиняє всі відправлення (після 429 від Telegram)
+        """
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self._tokens = 0
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class SendQueue:
+    """
+    Єдина точка відправлення масових повідомлень: загальний ліміт бота,
+    ліміт на чат і повтор після 429 retry_after.
+    Для сповіщень "відправив і забув" є черга з фоновим воркером (enqueue).
+    """
+
+    def __init__(self, global_rate: float = BROADCAST_GLOBAL_RATE,
+                 chat_interval: float = BROADCAST_CHAT_INTERVAL):
+        self.bucket = TokenBucket(global_rate)
+        self.chat_interval = chat_interval
+        self.bot: Bot | None = None
+        self._chat_next = {}    # chat_id → найраніший час наступного повідомлення
+        self._queue = None
+        self._worker = None
+
+    def start(self, bot: Bot):
+        self.bot = bot
+        self._queue = asyncio.Queue()
+        self._worker = asyncio.create_task(self._run_queue())
+
+    async def stop(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            await asyncio.gather(self._worker, return_exceptions=True)
+            self._worker = None
+
+    async def _wait_for_chat(self, chat_id: int):
+        now = time.monotonic()
+        ready_at = self._chat_next.get(chat_id, 0.0)
+        self._chat_next[chat_id] = max(now, ready_at) + self.chat_interval
+        if ready_at > now:
+            await asyncio.sleep(ready_at - now)
+
+        # прибираємо застарілі записи, щоб словник не ріс безмежно
+        if len(self._chat_next) > 10000:
+            self._chat_next = {c: t for c, t in self._chat_next.items() if t > now}
+
+    async def deliver(self, chat_id: int, make_request) -> bool:
+        """
+        Відправляє запит make_request() з дотриманням лімітів.
+        Мережа і 5xx — повтор з паузою, що зростає; решта помилок Bot API
+        (бот заблокований, чат не існує, ...) — одразу False.
+        """
+        for attempt in range(1, MAX_ATTEMPTS + 1):
+            await self._wait_for_chat(chat_id)
+            await self.bucket.acquire()
+            try:
+                await make_request()
+                return True
+            except TelegramRetryAfter as e:
+                logger.warning("429 від Telegram, пауза %s с", e.retry_after)
+                self.bucket.pause(e.retry_after)
+            except (TelegramNetworkError, TelegramServerError) as e:
+                logger.warning("Чат %s, спроба %s: %s", chat_id, attempt, e)
+                if attempt < MAX_ATTEMPTS:
+                    await asyncio.sleep(attempt)
+            except TelegramAPIError as e:
+                logger.info("Не вдалося надіслати в чат %s: %s", chat_id, e)
+                return False
+        return False
+
+    async def send_message(self, chat_id: int, text: str, **kwargs) -> bool:
+        return await self.deliver(chat_id, lambda: self.bot.send_message(chat_id, text, **kwargs))
+
+    def enqueue(self, chat_id: int, text: str, **kwargs):
+        """
+        Поставити повідомлення в чергу, не чекаючи відправлення
+        """
+        self._queue.put_nowait((chat_id, text, kwargs))
+
+    async def _run_queue(self):
+        while True:
+            chat_id, text, kwargs = await self._queue.get()
+            try:
+                await self.send_message(chat_id, text, **kwargs)
+            except Exception:
+                logger.exception("Помилка відправлення в чат %s", chat_id)
+            finally:
+                self._queue.task_done()
+
+
+class Broadcaster:
+    """
+    Розсилка повідомлення адміністратора всім гостям (через copy_message).
+
+    Прогрес зберігається у BROADCAST_STATE_PATH (знімок кожні 25 відправлень)
+    і в журналі поруч (BROADCAST_STATE_PATH + ".done", рядок на кожне
+    завершене відправлення). Після перезапуску розсилка продовжується з місця
+    зупинки; повторно можуть прийти лише ті кілька повідомлень (не більше
+    BROADCAST_CONCURRENCY), що були в польоті в момент зупинки.
+    """
+
+    def __init__(self, queue: SendQueue, state_path: str = BROADCAST_STATE_PATH,
+                 concurrency: int = BROADCAST_CONCURRENCY):
+        self.queue = queue
+        self.state_path = state_path
+        self.done_path = state_path + ".done"
+        self.concurrency = concurrency
+        self.state = None
+        self._task = None
+
+    # ===== STATE =====
+
+    def _load_state(self):
+        if not os.path.exists(self.state_path):
+            return None
+        with open(self.state_path, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+
+        # відправлення, завершені після останнього знімка
+        if os.path.exists(self.done_path):
+            completed = set(state["completed"])
+            with open(self.done_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    index, _, ok = line.strip().partition(" ")
+                    if not index.isdigit() or ok not in ("0", "1"):
+                        continue   # обірваний останній рядок
+                    index = int(index)
+                    if index < state["done"] or index in completed:
+                        continue   # уже враховано в знімку
+                    completed.add(index)
+                    state["sent" if ok == "1" else "failed"] += 1
+            while state["done"] in completed:
+                completed.discard(state["done"])
+                state["done"] += 1
+            state["completed"] = sorted(completed)
+        return state
+
+    def _save_state(self):
+        tmp_path = self.state_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.state, f)
+        os.replace(tmp_path, self.state_path)
+        # усе з журналу вже у знімку
+        open(self.done_path, 'w').close()
+
+    def _log_done(self, index: int, ok: bool):
+        with open(self.done_path, 'a', encoding='utf-8') as f:
+            f.write(f"{index} {int(ok)}\n")
+
+    def _clear_state(self):
+        for path in (self.state_path, self.done_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def is_running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def status(self):
+        if self.state is None:
+            return None
+        return {
+            "total": len(self.state["recipients"]),
+            "sent": self.state["sent"],
+            "failed": self.state["failed"],
+            "started_at": self.state["started_at"],
+        }
+
+    # ===== RUN =====
+
+    def start(self, from_chat_id: int, message_id: int, recipients: list) -> bool:
+        if self.is_running():
+            return False
+
+        self.state = {
+            "from_chat_id": from_chat_id,
+            "message_id": message_id,
+            "recipients": list(recipients),
+            "done": 0,           # усі індекси до цього вже оброблені
+            "completed": [],     # оброблені індекси після "done"
+            "sent": 0,
+            "failed": 0,
+            "started_at": datetime.now().isoformat(timespec="seconds"),
+        }
+        self._save_state()
+        self._task = asyncio.create_task(self._run())
+        return True
+
+    def resume(self) -> bool:
+        """
+        Продовжити незавершену розсилку (викликається під час запуску бота)
+        """
+        if self.is_running():
+            return False
+        self.state = self._load_state()
+        if self.state is None:
+            return False
+        logger.info("Продовжуємо розсилку: %s/%s", self.state["done"], len(self.state["recipients"]))
+        self._task = asyncio.create_task(self._run())
+        return True
+
+    async def _run(self):
+        state = self.state
+        completed = set(state["completed"])
+        pending = [i for i in range(state["done"], len(state["recipients"])) if i not in completed]
+        semaphore = asyncio.Semaphore(self.concurrency)
+        unsaved = 0
+
+        async def send_one(index: int):
+            nonlocal unsaved
+            chat_id = state["recipients"][index]
+            async with semaphore:
+                try:
+                    ok = await self.queue.deliver(chat_id, lambda: self.queue.bot.copy_message(
+                        chat_id, from_chat_id=state["from_chat_id"], message_id=state["message_id"]
+                    ))
+                except Exception:
+                    # одна невдача не зупиняє розсилку: інакше стан лишився б
+                    # незавершеним, а адміністратор — без звіту
+                    logger.exception("Помилка розсилки в чат %s", chat_id)
+                    ok = False
+
+            self._log_done(index, ok)
+            state["sent" if ok else "failed"] += 1
+            completed.add(index)
+            while state["done"] in completed:
+                completed.discard(state["done"])
+                state["done"] += 1
+
+            unsaved += 1
+            if unsaved >= 25:
+                unsaved = 0
+                state["completed"] = sorted(completed)
+                self._save_state()
+
+        await asyncio.gather(*(send_one(i) for i in pending))
+
+        self._clear_state()
+        self.queue.enqueue(
+            state["from_chat_id"],
+            f"📣 Розсилку завершено.\n✅ Доставлено: {state['sent']}\n❌ Не доставлено: {state['failed']}"
+        )
+
+
+send_queue = SendQueue()
+broadcaster = Broadcaster(send_queue)
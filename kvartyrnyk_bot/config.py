@@ -10,15 +10,101 @@ BOT_TOKEN = "8519361672:AAEnvc95xeRHL2l506mwTI2ORP-yggJZSZM"
 # ID адміністратора (ваш Telegram ID, отримати у @userinfobot)
 ADMIN_ID = 975267542  # Замініть на свій ID
 
+# Отримання оновлень: False — long polling, True — вебхук (aiohttp-сервер)
+USE_WEBHOOK = False
+WEBHOOK_URL = ""              # https://your.domain (порожньо — не реєструвати в Telegram, для локальних тестів)
+WEBHOOK_PATH = "/webhook"
+WEBHOOK_SECRET = ""           # перевіряється в заголовку X-Telegram-Bot-Api-Secret-Token (порожньо — випадковий на кожен запуск)
+WEBHOOK_HOST = "0.0.0.0"
+WEBHOOK_PORT = 8080
+WEBHOOK_WORKERS = 16          # скільки оновлень обробляється одночасно
+WEBHOOK_QUEUE_SIZE = 1000     # розмір черги кожного воркера
+
+# False — зберегти оновлення, що прийшли, поки бот був вимкнений
+DROP_PENDING_UPDATES = False
+
 # Шлях до файлу бази даних
 DATABASE_PATH = "data/event_data.json"
 
-# Назва події
+# Сховище: "json" — файл DATABASE_PATH, "sqlite" — SQLite у режимі WAL (SQLITE_PATH).
+# Перенести дані з JSON у SQLite: python database_sqlite.py import
+DATABASE_BACKEND = "json"
+SQLITE_PATH = "data/event_data.sqlite3"
+
+# Кілька подій: у DATABASE_PATH / SQLITE_PATH лишаються спільні дані (blacklist, known_users),
+# кожна подія — окремим файлом у EVENTS_DIR, минулі події — стиснуто в EVENTS_ARCHIVE_DIR
+EVENTS_DIR = "data/events"
+EVENTS_ARCHIVE_DIR = "data/archive"
+EVENT_CACHE_SIZE = 4          # скільки подій тримати відкритими в пам'яті
+
+# Режим збереження JSON-сховища:
+#   "json"    — кожна зміна переписує весь файл
+#   "journal" — кожна зміна дописується рядком у журнал (DATABASE_PATH + ".journal"),
+#               який у фоні зводиться у знімок, коли перевищує JOURNAL_COMPACT_BYTES
+DATABASE_MODE = "json"
+JOURNAL_COMPACT_BYTES = 1024 * 1024
+
+# Кеш QR-кодів (token → file_id у Telegram)
+QR_CACHE_PATH = "data/qr_cache.json"
+
+# Ключі підпису QR-кодів (HMAC-SHA256): id ключа → секрет.
+# Заміна ключа: додайте новий, зробіть його QR_ACTIVE_KEY, а старий залиште,
+# доки не перестануть ходити видані ним коди.
+# Без QR_SECRET (або з цією заглушкою) бот і qr_tokens.py не запустяться.
+QR_SECRET_PLACEHOLDER = "замініть-на-довгий-випадковий-рядок"
+QR_SIGNING_KEYS = {
+    "1": os.environ.get("QR_SECRET", ""),
+}
+QR_ACTIVE_KEY = "1"
+
+# Кількість процесів для генерації QR-кодів
+QR_POOL_WORKERS = min(4, os.cpu_count() or 1)
+
+# FSM-сховище (стани незавершених реєстрацій):
+#   "sqlite" — зберігається у FSM_STORAGE_PATH і переживає перезапуск
+#   "memory" — лише в пам'яті (MemoryStorage aiogram)
+FSM_STORAGE = "sqlite"
+FSM_STORAGE_PATH = "data/fsm.sqlite3"
+FSM_CACHE_SIZE = 10000       # скільки активних розмов тримати в пам'яті
+FSM_FLUSH_INTERVAL = 0.5     # як часто (с) скидати зміни на диск
+
+# Скільки секунд місця (гість + друзі) утримуються, поки гість вводить дані друзів
+SLOT_HOLD_TTL = 300
+
+# Обмеження частоти для одного користувача: рівень → (оновлень/с, розмір відра).
+# "expensive" — обробники з flags={"throttling": "expensive"} (QR, статус)
+THROTTLE_LIMITS = {
+    "default": (2.0, 5),
+    "expensive": (0.2, 2),
+}
+THROTTLE_DUPLICATE_WINDOW = 1.0   # однакові натискання частіше — відкидаються
+THROTTLE_MAX_USERS = 50000        # скільки користувачів пам'ятати
+THROTTLE_TTL = 60                 # через скільки секунд тиші запис забувається
+
+# Метрики (/metrics в адмінці завжди). METRICS_PORT > 0 — ще й
+# текстовий формат Prometheus на http://METRICS_HOST:METRICS_PORT/metrics
+METRICS_HOST = "127.0.0.1"
+METRICS_PORT = 0
+
+# Розсилка: загальний ліміт бота (повідомлень/с), мінімальний інтервал
+# між повідомленнями в один чат (с), скільки запитів у польоті одночасно
+BROADCAST_GLOBAL_RATE = 25
+BROADCAST_CHAT_INTERVAL = 1.0
+BROADCAST_CONCURRENCY = 10
+BROADCAST_STATE_PATH = "data/broadcast.json"
+
+# Нагадування гостям: за скільки секунд до початку події (час — з /set_event,
+# у поясі EVENT_TIMEZONE). Заплановані завдання зберігаються в REMINDERS_PATH
+REMINDER_OFFSETS = [24 * 3600, 3600]
+REMINDERS_PATH = "data/reminders.json"
+EVENT_TIMEZONE = "Europe/Kyiv"
+
+# Назва першої події (далі події створюються командою /new_event)
 EVENT_NAME = "Квартирник "
 
 # Повідомлення для користувачів
 MESSAGES = {
-    "welcome": f"Привіт! 👋\n\nВітаємо на реєстрації для події **{EVENT_NAME}**!\n\nНатисніть /register щоб зареєструватися.",
+    "welcome": "Привіт! 👋\n\nВітаємо на реєстрації для події **{event}**!\n\nНатисніть /register щоб зареєструватися.",
     "ask_name": "Будь ласка, введіть своє **ім'я та прізвище**:\n\nНаприклад: Іван Петренко",
     "registered": "✅ Вітаємо! Ви успішно зареєстровані на **{event}**!\n\n👤 {name}\n🎫 Ваше місце зарезервовано!\n\nДо зустрічі! 🎉",
     "already_registered": "ℹ️ Ви вже зареєстровані на цю подію!\n\n👤 {name}",
@@ -26,4 +112,9 @@ MESSAGES = {
     "no_slots": "😔 Вибачте, всі місця вже зайняті!\n\nСпробуйте пізніше або зверніться до організаторів.",
     "invalid_name": "⚠️ Будь ласка, введіть коректне ім'я та прізвище (мінімум 2 слова).",
     "admin_only": "⛔️ Ця команда доступна тільки адміністратору.",
+    "waitlist_offer": "😔 Усі місця зайняті, але можна стати в чергу: щойно місце звільниться, вас зареєструють автоматично.\n\n✍️ Введіть ваше імʼя та прізвище:",
+    "waitlist_joined": "⏳ Ви в черзі очікування: №{position}.\nМи повідомимо, щойно звільниться місце.",
+    "waitlist_position": "⏳ Ви в черзі очікування: №{position}.",
+    "waitlist_promoted": "🎉 Звільнилося місце — вас зареєстровано на **{event}**!\n\n👤 {name}\n🎫 QR-код для входу: кнопка «🎫 Мій QR».",
+    "reminder": "⏰ Нагадування: **{event}** {when}!\n\n📍 {place}\n🕒 {time}\n\n🎫 QR-код для входу: кнопка «🎫 Мій QR».",
 }
@@ -1,14 +1,66 @@
+import asyncio
+import bisect
+import contextvars
+import functools
 import json
+import logging
 import os
+import threading
+import time
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional
-from config import DATABASE_PATH
+from config import DATABASE_PATH, DATABASE_MODE, JOURNAL_COMPACT_BYTES, DATABASE_BACKEND
+from guest_index import GuestIndex, guest_texts
+from metrics import metrics
+from records import Friend, Registration, encode_record, intern_username, registrations_from_json
+from slot_holds import SlotHolds
+
+logger = logging.getLogger(__name__)
+
+# Ключі документа, що належать події (решта — спільні дані)
+EVENT_KEYS = (
+    "max_slots", "price", "event_info", "unregister_allowed", "max_friends_per_user",
+    "registered_users", "waitlist",
+)
 
 
 class Database:
 
-    def __init__(self):
-        self.db_path = DATABASE_PATH
+    def __init__(self, path: str = DATABASE_PATH, shared=None):
+        self.db_path = path
+        # сховище події посилається на спільне: глобальний blacklist і known_users
+        self.shared = shared
+        # кеш документа в пам'яті; файл лишається джерелом істини на диску
+        self._data = None
+        self._file_sig = None
+
+        # режим "journal": знімок у db_path + журнал змін поруч
+        self.mode = DATABASE_MODE
+        self.journal_path = self.db_path + ".journal"
+        self._journal = None
+        self._journal_size = 0
+        self._seq = 0
+        self._compacting = False
+        self._compact_lock = threading.RLock()
+
+        # усі перевірки "перевірив → записав" виконуються під цим замком
+        self._lock = threading.RLock()
+
+        # індекси над кешем у пам'яті (перебудовуються при перечитуванні файлу)
+        self._bl_ids = set()
+        self._bl_names = set()
+        self._allow_ids = set()      # винятки події з глобального blacklist
+        self._allow_names = set()
+        self._order = []
+        self._order_keys = {}
+        self._seats = {}         # user_id → місць (гість + друзі)
+        self._seats_taken = 0
+        self._search = GuestIndex()  # /find: імена, usernames, друзі
+
+        # місця, утримані на час реєстрації з друзями (лише в пам'яті)
+        self.holds = SlotHolds()
+
         self._ensure_database()
 
 
@@ -27,7 +79,8 @@ class Database:
                 "unregister_allowed": True,
                 "registered_users": {},
                 "blacklist": [],
-                "known_users": {}
+                "known_users": {},
+                "waitlist": []
             }
             self._save_data(initial_data)
             return
@@ -61,66 +114,620 @@ class Database:
             data["blacklist"] = []
             changed = True
 
+        if "waitlist" not in data:
+            data["waitlist"] = []
+            changed = True
+
         if changed:
             self._save_data(data)
 
+    def _stat_signature(self):
+        """
+        Відбиток файлу (mtime, inode, розмір) — щоб помітити зміни ззовні
+        """
+        try:
+            st = os.stat(self.db_path)
+        except FileNotFoundError:
+            return None
+        return st.st_mtime_ns, st.st_ino, st.st_size
+
     def _load_data(self):
-        with open(self.db_path, 'r', encoding='utf-8') as f:
-            return json.load(f)
+        sig = self._stat_signature()
+        if self._data is not None and sig == self._file_sig:
+            metrics.cache_hit()
+            return self._data
+
+        # файл змінили поза процесом (або це перше читання) — перечитуємо
+        with self._lock, self._compact_lock:
+            with open(self.db_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self._file_sig = self._stat_signature()
+            metrics.storage_call("load", self._file_sig[2])
+            self._normalize_document(data)
+
+            if self.mode == "journal":
+                self._seq = data.get("journal_seq", 0)
+                # спершу журнал, що саме компактується, потім поточний
+                for path in (self.journal_path + ".old", self.journal_path):
+                    self._replay_journal(data, path)
+
+                # залишок незавершеного стиснення — одразу зводимо в знімок
+                if not self._compacting and os.path.exists(self.journal_path + ".old"):
+                    self._save_data(data)
+
+            self._set_cached(data)
+        return self._data
 
     def _save_data(self, data):
-        with open(self.db_path, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+        """
+        Повний запис документа (атомарно, через тимчасовий файл)
+        """
+        if self.mode == "journal":
+            with self._compact_lock:
+                self._close_journal()
+                data["journal_seq"] = self._seq
+                self._write_snapshot(self._dumps(data))
+                for path in (self.journal_path + ".old", self.journal_path):
+                    if os.path.exists(path):
+                        os.remove(path)
+                self._journal_size = 0
+        else:
+            self._write_snapshot(self._dumps(data))
+
+        if data is not self._data:
+            self._set_cached(data)
+
+    @staticmethod
+    def _dumps(data) -> str:
+        # записи реєстрацій серіалізуються у звичні словники (records.encode_record)
+        return json.dumps(data, ensure_ascii=False, separators=(",", ":"), default=encode_record)
+
+    @staticmethod
+    def _normalize_document(data):
+        """
+        Документ з диска → подання в пам'яті: реєстрації — записи з цілими ключами,
+        usernames у known_users — інтерновані
+        """
+        data["registered_users"] = registrations_from_json(data.get("registered_users", {}))
+        if "known_users" in data:
+            data["known_users"] = {intern_username(k): v for k, v in data["known_users"].items()}
+
+    def _write_snapshot(self, text: str):
+        tmp_path = self.db_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.db_path)
+        self._file_sig = self._stat_signature()
+        metrics.storage_call("save", self._file_sig[2])
+
+    def invalidate_cache(self):
+        self._data = None
+        self._file_sig = None
+
+    # ===== INDEXES =====
+
+    def _set_cached(self, data):
+        self._data = data
+        self._rebuild_indexes(data)
+
+    def _rebuild_indexes(self, data):
+        self._rebuild_blacklist_index(data)
+        self._rebuild_order_index(data)
+        self._rebuild_seats_index(data)
+        self._rebuild_search_index(data)
+
+    def _rebuild_blacklist_index(self, data):
+        self._bl_ids = set()
+        self._bl_names = set()
+        for value in data.get("blacklist", []):
+            self._index_blacklist_value(value, add=True)
+        self._rebuild_allow_index(data)
+
+    def _rebuild_allow_index(self, data):
+        # список короткий і змінюється лише через set — перебудова дешева
+        allow = data.get("blacklist_allow", [])
+        self._allow_ids = {v for v in allow if isinstance(v, int)}
+        self._allow_names = {str(v).casefold() for v in allow if not isinstance(v, int)}
+
+    def _index_blacklist_value(self, value, add: bool):
+        if isinstance(value, int):
+            target, key = self._bl_ids, value
+        else:
+            target, key = self._bl_names, str(value).casefold()
+        if add:
+            target.add(key)
+        else:
+            target.discard(key)
+
+    # Відсортований список (registered_at, user_id) — для посторінкового перегляду
+    @staticmethod
+    def _order_key(user):
+        return user.registered_at, user.user_id
+
+    def _rebuild_order_index(self, data):
+        users = data.get("registered_users", {})
+        self._order_keys = {uid: self._order_key(u) for uid, u in users.items()}
+        self._order = sorted(self._order_keys.values())
+
+    def _unindex_order(self, user_id):
+        key = self._order_keys.pop(user_id, None)
+        if key is not None:
+            i = bisect.bisect_left(self._order, key)
+            if i < len(self._order) and self._order[i] == key:
+                del self._order[i]
+
+    # Зайняті місця з урахуванням друзів — щоб не рахувати їх щоразу
+    def _rebuild_seats_index(self, data):
+        users = data.get("registered_users", {})
+        self._seats = {uid: u.seats for uid, u in users.items()}
+        self._seats_taken = sum(self._seats.values())
+
+    # Пошук гостей для /find
+    @staticmethod
+    def _search_texts(user):
+        return guest_texts(user.name, user.username, ((f.name, f.username) for f in user.friends))
+
+    def _rebuild_search_index(self, data):
+        users = data.get("registered_users", {})
+        self._search.rebuild((uid, self._search_texts(u)) for uid, u in users.items())
+
+    def _update_indexes(self, op, path, value=None):
+        """
+        Інкрементне оновлення індексів після операції з _commit
+        """
+        if path == ["blacklist"]:
+            if op == "append":
+                self._index_blacklist_value(value, add=True)
+            elif op == "remove":
+                self._index_blacklist_value(value, add=False)
+            else:
+                self._rebuild_blacklist_index(self._data)
+
+        elif path == ["blacklist_allow"]:
+            self._rebuild_allow_index(self._data)
+
+        elif path == ["registered_users"]:
+            self._rebuild_order_index(self._data)
+            self._rebuild_seats_index(self._data)
+            self._rebuild_search_index(self._data)
+
+        elif len(path) == 2 and path[0] == "registered_users":
+            user_id = int(path[1])
+            self._unindex_order(user_id)
+            self._seats_taken -= self._seats.pop(user_id, 0)
+            self._search.remove(user_id)
+            if op == "set":
+                user = self._data["registered_users"][user_id]
+                key = self._order_key(user)
+                self._order_keys[user_id] = key
+                bisect.insort(self._order, key)
+                self._seats[user_id] = user.seats
+                self._seats_taken += user.seats
+                self._search.add(user_id, self._search_texts(user))
+
+        elif len(path) == 3 and path[0] == "registered_users" and path[2] == "friends":
+            user = self._data["registered_users"].get(int(path[1]))
+            if user is not None:
+                self._seats_taken += user.seats - self._seats.get(user.user_id, user.seats)
+                self._seats[user.user_id] = user.seats
+                self._search.add(user.user_id, self._search_texts(user))
+
+    # ===== MUTATIONS =====
+    # Кожна зміна описується операцією (op, path, value):
+    #   set    — data[path] = value
+    #   del    — видалити data[path]
+    #   append — додати value у список data[path]
+    #   remove — прибрати value зі списку data[path]
+    # У режимі "json" після операцій переписується весь файл,
+    # у режимі "journal" — у журнал дописується по рядку на операцію.
+
+    @staticmethod
+    def _apply_op(data, op, path, value=None):
+        if path[0] == "registered_users":
+            Database._apply_registration_op(data, op, path, value)
+            return
+
+        *parents, key = path
+        if parents == ["known_users"]:
+            key = intern_username(key)
+        node = data
+        for part in parents:
+            node = node.setdefault(part, {})
+
+        if op == "set":
+            node[key] = value
+        elif op == "del":
+            node.pop(key, None)
+        elif op == "append":
+            node.setdefault(key, []).append(value)
+        elif op == "remove":
+            items = node.get(key, [])
+            if value in items:
+                items.remove(value)
+        else:
+            raise ValueError(f"Невідома операція: {op}")
+
+    @staticmethod
+    def _apply_registration_op(data, op, path, value=None):
+        """
+        Операції над registered_users: ключ у шляху (рядок зі старого журналу
+        або число) зводиться до int, словники — до записів Registration / Friend
+        """
+        if len(path) == 1:
+            if op != "set":
+                raise ValueError(f"Невідома операція над registered_users: {op}")
+            data["registered_users"] = registrations_from_json(value)
+            return
+
+        users = data.setdefault("registered_users", {})
+        user_id = int(path[1])
+        if len(path) == 2:
+            if op == "set":
+                users[user_id] = Registration.coerce(user_id, value)
+            elif op == "del":
+                users.pop(user_id, None)
+            else:
+                raise ValueError(f"Невідома операція над гостем: {op}")
+            return
+
+        user = users.get(user_id)
+        if user is None:
+            return
+        field = path[2]
+        if op == "append" and field == "friends":
+            # лише з журналів старих версій: друзі тепер записуються разом з гостем
+            user.add_friend(Friend.coerce(value))
+        elif op == "set" and field in Registration.__slots__:
+            setattr(user, field, value)
+        else:
+            raise ValueError(f"Невідома операція: {op} {path}")
+
+    def _commit(self, *ops):
+        with self._lock:
+            data = self._load_data()
+            for op in ops:
+                self._apply_op(data, *op)
+                self._update_indexes(*op)
+
+            if self.mode != "journal":
+                self._save_data(data)
+                return
+
+            lines = []
+            for op, path, *value in ops:
+                self._seq += 1
+                record = {"seq": self._seq, "op": op, "path": path}
+                if value:
+                    record["value"] = value[0]
+                lines.append(json.dumps(record, ensure_ascii=False, separators=(",", ":"), default=encode_record))
+
+            self._append_journal("\n".join(lines) + "\n")
+
+            if self._journal_size >= JOURNAL_COMPACT_BYTES:
+                self._start_compaction(data)
+
+    # ===== JOURNAL =====
+
+    def _append_journal(self, text: str):
+        if self._journal is None:
+            self._journal = open(self.journal_path, 'a', encoding='utf-8')
+        self._journal.write(text)
+        self._journal.flush()
+        os.fsync(self._journal.fileno())
+        size = len(text.encode('utf-8'))
+        self._journal_size += size
+        metrics.storage_call("journal_append", size)
+
+    def _close_journal(self):
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+
+    def _replay_journal(self, data, path):
+        if not os.path.exists(path):
+            return
+
+        valid_size = 0
+        with open(path, 'rb') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except (json.JSONDecodeError, UnicodeDecodeError):
+                    # обірваний останній рядок після аварійного завершення
+                    break
+                valid_size += len(line)
+                if record["seq"] <= self._seq:
+                    continue
+                self._apply_op(data, record["op"], record["path"], record.get("value"))
+                self._seq = record["seq"]
+
+        # відрізаємо сміття, щоб нові записи не приклеїлись до нього
+        if os.path.getsize(path) != valid_size:
+            os.truncate(path, valid_size)
+
+        if path == self.journal_path:
+            self._journal_size = valid_size
+
+    def _start_compaction(self, data):
+        with self._compact_lock:
+            if self._compacting:
+                return
+            self._compacting = True
+
+            # поточний журнал відкладаємо, нові записи йдуть у свіжий файл
+            self._close_journal()
+            os.replace(self.journal_path, self.journal_path + ".old")
+            self._journal_size = 0
+
+            data["journal_seq"] = self._seq
+            text = self._dumps(data)
+
+        threading.Thread(target=self._compact, args=(text,), daemon=True).start()
+
+    def _compact(self, text: str):
+        try:
+            with self._compact_lock:
+                self._write_snapshot(text)
+                os.remove(self.journal_path + ".old")
+        except OSError:
+            logger.exception("Не вдалося стиснути журнал %s", self.journal_path)
+        finally:
+            self._compacting = False
+
+    def wait_for_compaction(self, timeout: float = 10.0):
+        deadline = time.monotonic() + timeout
+        while self._compacting and time.monotonic() < deadline:
+            time.sleep(0.01)
 
     # ===== EVENT INFO =====
     def get_event_info(self):
         return self._load_data().get("event_info", {"place": "", "time": "", "price": ""})
 
     def set_event_info(self, place, time, price):
-        data = self._load_data()
-        data["event_info"] = {"place": place, "time": time, "price": price}
-        self._save_data(data)
+        self._commit(("set", ["event_info"], {"place": place, "time": time, "price": price}))
 
     def clear_event_info(self):
-        data = self._load_data()
-        data["event_info"] = {"place": "", "time": "", "price": ""}
-        self._save_data(data)
+        self._commit(("set", ["event_info"], {"place": "", "time": "", "price": ""}))
 
     # ===== CHECK REGISTRATION =====
     def is_user_registered(self, user_id: int) -> bool:
-        return str(user_id) in self._load_data().get("registered_users", {})
+        return int(user_id) in self._load_data()["registered_users"]
+
+    def get_registration(self, user_id: int):
+        user = self._load_data()["registered_users"].get(int(user_id))
+        return user.to_dict() if user else None
 
     # ===== REGISTRATION =====
-    def register_user(self, user_id: int, name: str, username: Optional[str] = None) -> bool:
-        data = self._load_data()
+    def register_user(self, user_id: int, name: str, username: Optional[str] = None,
+                      friends: Optional[list] = None) -> bool:
+        """
+        Атомарно бронює місце для гостя разом з його друзями.
+        Усі перевірки і запис виконуються під одним замком,
+        тож паралельні реєстрації не можуть продати більше місць, ніж є.
+        """
+        with self._lock:
+            data = self._load_data()
 
-        if str(user_id) in data["registered_users"]:
-            return False
+            if user_id in data["registered_users"]:
+                return False
 
-        if self.is_in_blacklist(user_id, username):
-            return False
+            if self.is_in_blacklist(user_id, username):
+                return False
 
-        if len(data["registered_users"]) >= data["max_slots"]:
-            return False
+            # гість займає своє утримання; понад нього — лише вільні місця
+            # (черга очікування має пріоритет над новими реєстраціями)
+            # _free_seats спершу знімає прострочені утримання — інакше прострочене
+            # зарахувалось би і як місця гостя, і як вільні
+            needed = 1 + len(friends or [])
+            free = self._free_seats(data)
+            if needed > self.holds.seats(user_id) + free:
+                return False
+
+            self._commit(*self._registration_ops(user_id, name, username, friends))
+            self.holds.release(user_id)
+            if self.shared is not None:
+                self.shared.save_known_user(user_id, username)
+            return True
 
+    def _free_seats(self, data, include_waitlist: bool = True):
+        self.holds.expire()
+        free = data["max_slots"] - self._seats_taken - self.holds.total()
+        if include_waitlist:
+            free -= len(data["waitlist"])
+        return max(0, free)
+
+    def _registration_ops(self, user_id, name, username=None, friends=None):
         from datetime import datetime
-        qr_token = str(uuid.uuid4())
 
-        data["registered_users"][str(user_id)] = {
-            "name": name,
-            "username": username,
-            "registered_at": datetime.now().isoformat(),
-            "qr_token": qr_token
-        }
+        user = Registration(
+            user_id, name, username, datetime.now().isoformat(), str(uuid.uuid4()),
+            tuple(Friend(f["name"], f.get("username")) for f in friends or ()),
+        )
 
-        self._save_data(data)
-        self.save_known_user(user_id, username)
-        return True
+        ops = [("set", ["registered_users", user_id], user)]
+        if username and self.shared is None:
+            ops.append(("set", ["known_users", username.lower()], user_id))
+        return ops
 
     def unregister_user(self, user_id: int):
-        data = self._load_data()
-        data["registered_users"].pop(str(user_id), None)
-        self._save_data(data)
+        """
+        Скасовує реєстрацію і переводить на звільнене місце першого з черги.
+        Повертає список переведених гостей (для сповіщень).
+        """
+        with self._lock:
+            data = self._load_data()
+            user_id = int(user_id)
+            if user_id not in data["registered_users"]:
+                return []
+
+            free = self._free_seats(data, include_waitlist=False) + self._seats[user_id]
+            promote_ops, promoted = self._promotion_ops(data["waitlist"], free)
+            self._commit(("del", ["registered_users", user_id]), *promote_ops)
+            return promoted
+
+    # ===== WAITLIST =====
+    # Черга FIFO тих, кому не вистачило місць. Щойно місце звільняється,
+    # перший з черги реєструється в тому ж записі, що й звільнення,
+    # тож пачка скасувань не дає ні зайвих записів, ні "вікна" для новачків.
+
+    def _promotion_ops(self, waitlist, free: int):
+        """
+        Операції переведення не більше free гостей з початку черги.
+        Повертає (ops, promoted).
+        """
+        data = self._data
+        ops, promoted = [], []
+        for entry in waitlist:
+            if free <= 0:
+                break
+            ops.append(("remove", ["waitlist"], entry))
+
+            user_id = entry["user_id"]
+            if user_id in data["registered_users"] or self.is_in_blacklist(user_id, entry.get("username")):
+                continue
+
+            ops.extend(self._registration_ops(user_id, entry["name"], entry.get("username")))
+            promoted.append({"user_id": user_id, "name": entry["name"]})
+            free -= 1
+        return ops, promoted
+
+    def join_waitlist(self, user_id: int, name: str, username: Optional[str] = None):
+        """
+        Ставить гостя в кінець черги.
+        Повертає {"position": N, "promoted": [...]}; position = 0 — місце
+        щойно звільнилося і гостя вже зареєстровано, None — додати не можна.
+        """
+        with self._lock:
+            data = self._load_data()
+            if user_id in data["registered_users"] or self.is_in_blacklist(user_id, username):
+                return {"position": None, "promoted": []}
+
+            waitlist = data["waitlist"]
+            for position, entry in enumerate(waitlist, start=1):
+                if entry["user_id"] == user_id:
+                    return {"position": position, "promoted": []}
+
+            from datetime import datetime
+            entry = {
+                "user_id": user_id,
+                "name": name,
+                "username": username,
+                "joined_at": datetime.now().isoformat(timespec="seconds"),
+            }
+            queue = waitlist + [entry]
+            free = self._free_seats(data, include_waitlist=False)
+            promote_ops, promoted = self._promotion_ops(queue, free)
+            self._commit(("append", ["waitlist"], entry), *promote_ops)
+            if self.shared is not None:
+                self.shared.save_known_user(user_id, username)
+
+            if any(p["user_id"] == user_id for p in promoted):
+                return {"position": 0, "promoted": promoted}
+            return {"position": len(self._data["waitlist"]), "promoted": promoted}
+
+    def leave_waitlist(self, user_id: int) -> bool:
+        with self._lock:
+            for entry in self._load_data()["waitlist"]:
+                if entry["user_id"] == user_id:
+                    self._commit(("remove", ["waitlist"], entry))
+                    return True
+            return False
+
+    def get_waitlist_position(self, user_id: int):
+        for position, entry in enumerate(self._load_data()["waitlist"], start=1):
+            if entry["user_id"] == user_id:
+                return position
+        return None
+
+    def get_waitlist(self):
+        return [dict(entry) for entry in self._load_data()["waitlist"]]
+
+    def get_waitlist_count(self):
+        return len(self._load_data()["waitlist"])
+
+    def promote_waitlist(self):
+        """
+        Заповнює всі вільні місця з черги одним записом
+        """
+        with self._lock:
+            data = self._load_data()
+            free = self._free_seats(data, include_waitlist=False)
+            promote_ops, promoted = self._promotion_ops(data["waitlist"], free)
+            if promote_ops:
+                self._commit(*promote_ops)
+            return promoted
+
+    # ===== SLOT HOLDS =====
+
+    def hold_slots(self, user_id: int, seats: int) -> bool:
+        """
+        Утримує seats місць (гість + друзі) на час введення даних друзів
+        """
+        with self._lock:
+            data = self._load_data()
+            free = self._free_seats(data)   # спершу — зняти прострочені утримання
+            if seats > self.holds.seats(user_id) + free:
+                return False
+            self.holds.put(user_id, seats)
+            return True
+
+    def release_hold(self, user_id: int):
+        """
+        Знімає утримання; звільнені місця одразу отримує черга
+        """
+        with self._lock:
+            if not self.holds.release(user_id):
+                return []
+            return self.promote_waitlist()
+
+    def expire_holds(self):
+        """
+        Знімає прострочені утримання і віддає місця черзі
+        """
+        with self._lock:
+            return self.promote_waitlist()
+
+    def seconds_to_next_expiry(self):
+        with self._lock:
+            return self.holds.seconds_to_next_expiry()
+
+    # ===== CHECK-IN =====
+
+    def check_in(self, user_id: int, qr_token: str):
+        """
+        Позначає вхід гостя з уже перевіреного підписаного QR-коду.
+        qr_token має збігатися з поточною реєстрацією — код від скасованої
+        реєстрації не спрацює. Перевірка і запис — під замком,
+        тож один QR-код не пропустить двох людей.
+
+        Повертає {"status": "ok" | "already" | "unknown", ...дані гостя}
+        """
+        with self._lock:
+            user_id = int(user_id)
+            user = self._load_data()["registered_users"].get(user_id)
+            if user is None or user.qr_token != qr_token:
+                return {"status": "unknown"}
+
+            result = {
+                "user_id": user_id,
+                "name": user.name,
+                "username": user.username,
+                "friends": len(user.friends),
+            }
+
+            if user.checked_in_at:
+                return {**result, "status": "already", "checked_in_at": user.checked_in_at}
+
+            from datetime import datetime
+            now = datetime.now().isoformat(timespec="seconds")
+            self._commit(("set", ["registered_users", user_id, "checked_in_at"], now))
+            return {**result, "status": "ok", "checked_in_at": now}
+
+    def get_checked_in_count(self):
+        users = self._load_data()["registered_users"]
+        return sum(1 for u in users.values() if u.checked_in_at)
 
     # ===== FRIENDS SYSTEM =====
 
@@ -128,56 +735,93 @@ class Database:
         return self._load_data().get("max_friends_per_user", 0)
 
     def set_max_friends(self, count: int):
-        data = self._load_data()
-        data["max_friends_per_user"] = count
-        self._save_data(data)
-
-    def add_friend_to_user(self, user_id: int, name: str, username: str | None):
-        data = self._load_data()
-        user = data["registered_users"].get(str(user_id))
-        if not user:
-            return
-
-        user.setdefault("friends", [])
-        user["friends"].append({
-            "name": name,
-            "username": username
-        })
-
-        self._save_data(data)
+        self._commit(("set", ["max_friends_per_user"], count))
 
     # ===== SLOTS =====
     def get_max_slots(self): return self._load_data()["max_slots"]
-    def get_current_slots(self): return len(self._load_data()["registered_users"])
-    def get_free_slots(self): return self.get_max_slots() - self.get_current_slots()
+    def set_max_slots(self, count: int):
+        """
+        Повертає гостей, переведених з черги на нові місця
+        """
+        with self._lock:
+            data = self._load_data()
+            free = self._free_seats(dict(data, max_slots=count), include_waitlist=False)
+            promote_ops, promoted = self._promotion_ops(data["waitlist"], free)
+            self._commit(("set", ["max_slots"], count), *promote_ops)
+            return promoted
+
+    def get_current_slots(self):
+        # зайняті місця: гості разом з друзями
+        self._load_data()
+        return self._seats_taken
+
+    def get_free_slots(self):
+        # місця, доступні для нової реєстрації (утримання і черга — попереду)
+        with self._lock:
+            return self._free_seats(self._load_data())
     def has_free_slots(self): return self.get_free_slots() > 0
 
     # ===== PRICE =====
     def get_price(self): return self._load_data()["price"]
     def set_price(self, price):
-        data = self._load_data()
-        data["price"] = price
-        self._save_data(data)
+        self._commit(("set", ["price"], price))
 
     # ===== BLACKLIST =====
 
     def is_in_blacklist(self, user_id: int, username: str | None = None) -> bool:
-        data = self._load_data()
-        bl = data.get("blacklist", [])
+        # _load_data() лише перевіряє, чи не змінився файл; пошук — по множинах
+        self._load_data()
 
-        if user_id in bl:
+        if user_id in self._bl_ids:
             return True
 
-        if username and username.lower() in [str(x).lower() for x in bl]:
+        if username and username.casefold() in self._bl_names:
             return True
 
-        if "known_users" not in data:
-            data["known_users"] = {}
+        if self.shared is None:
+            return False
+
+        # подія може зробити виняток з глобального blacklist
+        if user_id in self._allow_ids or (username and username.casefold() in self._allow_names):
+            return False
+        return self.shared.is_in_blacklist(user_id, username)
+
+    def set_blacklist_override(self, value, blocked: bool | None):
+        """
+        Виняток події з глобального blacklist:
+        True — заблокувати лише на цій події, False — дозволити попри
+        глобальний blacklist, None — прибрати виняток.
+        """
+        with self._lock:
+            data = self._load_data()
+            self.remove_from_blacklist(value)
 
-        return False
+            allow = data.get("blacklist_allow", [])
+            key = value if isinstance(value, int) else str(value).casefold()
+            kept = [v for v in allow if (v if isinstance(v, int) else str(v).casefold()) != key]
+            if blocked is False:
+                kept.append(value)
+            if kept != allow:
+                self._commit(("set", ["blacklist_allow"], kept))
+
+            if blocked:
+                self.add_to_blacklist(value)
+
+    def get_blacklist_overrides(self):
+        data = self._load_data()
+        return {"block": list(data.get("blacklist", [])), "allow": list(data.get("blacklist_allow", []))}
+
+    def _is_blacklisted_value(self, value) -> bool:
+        if isinstance(value, int):
+            return value in self._bl_ids
+        return str(value).casefold() in self._bl_names
 
     def get_blacklist(self):
-        return self._load_data().get("blacklist", [])
+        return list(self._load_data().get("blacklist", []))
+
+    def get_blacklist_count(self):
+        self._load_data()
+        return len(self._bl_ids) + len(self._bl_names)
 
 
     # ===== KNOWN USERS (username → id) =====
@@ -185,10 +829,11 @@ class Database:
     def save_known_user(self, user_id: int, username: Optional[str]):
         if not username:
             return
-        data = self._load_data()
-        data.setdefault("known_users", {})
-        data["known_users"][username.lower()] = user_id
-        self._save_data(data)
+        with self._lock:
+            # без запису, якщо нічого не змінилося (викликається на кожну реєстрацію)
+            if self._load_data().get("known_users", {}).get(username.lower()) == user_id:
+                return
+            self._commit(("set", ["known_users", username.lower()], user_id))
 
     def get_user_id_by_username(self, username: str):
         data = self._load_data()
@@ -200,33 +845,192 @@ class Database:
         return self._load_data().get("unregister_allowed", True)
 
     def set_unregister_allowed(self, value: bool):
-        data = self._load_data()
-        data["unregister_allowed"] = value
-        self._save_data(data)
+        self._commit(("set", ["unregister_allowed"], value))
 
 
     def get_all_registered(self):
-        return self._load_data().get("registered_users", {})
+        # словники-копії: результат читають в іншому потоці, поки сховище змінюється
+        users = self._load_data()["registered_users"]
+        return {str(uid): user.to_dict() for uid, user in list(users.items())}
+
+    def get_registered_page(self, after: str | None = None, before: str | None = None,
+                            limit: int = 10):
+        """
+        Сторінка гостей у порядку реєстрації (курсор — ключ крайнього гостя).
+        Працює по відсортованому індексу: вартість — лише розмір сторінки.
+        """
+        with self._lock:
+            users = self._load_data()["registered_users"]
+
+            if after is not None:
+                start = bisect.bisect_right(self._order, parse_page_cursor(after))
+            elif before is not None:
+                start = max(0, bisect.bisect_left(self._order, parse_page_cursor(before)) - limit)
+            else:
+                start = 0
+            end = min(start + limit, len(self._order))
+
+            items = []
+            for _, user_id in self._order[start:end]:
+                # як у SQLite-сховищі: "friends" є і в гостей без друзів
+                user = users[user_id].to_dict()
+                user.setdefault("friends", [])
+                items.append((str(user_id), user))
+
+            return {
+                "items": items,
+                "offset": start,
+                "total": len(self._order),
+                "has_prev": start > 0,
+                "has_next": end < len(self._order),
+            }
+
+    def find_guests(self, query: str, limit: int = 20):
+        """
+        Гості, в яких ім'я, username або ім'я друга починається з query
+        чи містить його (див. guest_index.py)
+        """
+        with self._lock:
+            users = self._load_data()["registered_users"]
+            return [
+                {"user_id": uid, **users[uid].to_dict()}
+                for uid in self._search.search(query, limit)
+            ]
 
     def clear_all_registrations(self):
-        data = self._load_data()
-        data["registered_users"] = {}
-        self._save_data(data)
+        self._commit(("set", ["registered_users"], {}), ("set", ["waitlist"], []))
+
+    # ===== EVENTS =====
+
+    def export_document(self):
+        """
+        Увесь документ звичними словниками, без записів records.py (для перенесення в SQLite)
+        """
+        with self._lock:
+            return json.loads(self._dumps(self._load_data()))
+
+    def export_event_data(self):
+        """
+        Дані події з документа (для перенесення в окреме сховище)
+        """
+        data = self.export_document()
+        return {k: data[k] for k in EVENT_KEYS if k in data}
+
+    def import_json(self, data: dict):
+        self._commit(*(("set", [key], value) for key, value in data.items()))
+
+    def close(self):
+        """
+        Зводить журнал у знімок і закриває файли (перед архівуванням події)
+        """
+        self.wait_for_compaction()
+        with self._lock:
+            if self.mode == "journal":
+                self._save_data(self._load_data())
+            self._close_journal()
 
     def add_to_blacklist(self, value):
-        data = self._load_data()
-        if "blacklist" not in data:
-            data["blacklist"] = []
+        with self._lock:
+            self._load_data()
+            if not self._is_blacklisted_value(value):
+                self._commit(("append", ["blacklist"], value))
 
-        if value not in data["blacklist"]:
-            data["blacklist"].append(value)
-            self._save_data(data)
+    def add_many_to_blacklist(self, values) -> int:
+        """
+        Масове додавання (імпорт з файлу) — один запис на весь список.
+        Повертає кількість нових записів.
+        """
+        with self._lock:
+            self._load_data()
+            ops = []
+            seen = set()
+            for value in values:
+                key = value if isinstance(value, int) else str(value).casefold()
+                if key in seen or self._is_blacklisted_value(value):
+                    continue
+                seen.add(key)
+                ops.append(("append", ["blacklist"], value))
+
+            if ops:
+                self._commit(*ops)
+            return len(ops)
 
     def remove_from_blacklist(self, value):
-        data = self._load_data()
-        if value in data.get("blacklist", []):
-            data["blacklist"].remove(value)
-            self._save_data(data)
+        with self._lock:
+            data = self._load_data()
+            if not self._is_blacklisted_value(value):
+                return
+
+            if not isinstance(value, int):
+                # у списку значення могло бути записане в іншому регістрі
+                key = str(value).casefold()
+                value = next(v for v in data["blacklist"]
+                             if not isinstance(v, int) and str(v).casefold() == key)
+            self._commit(("remove", ["blacklist"], value))
+
+
+def make_page_cursor(user_id, user) -> str:
+    return f"{user.get('registered_at') or ''}|{user_id}"
+
+
+def parse_page_cursor(cursor: str):
+    registered_at, _, user_id = cursor.rpartition("|")
+    return registered_at, int(user_id)
+
+
+class AsyncDatabase:
+    """
+    Асинхронний фасад над Database.
+    Усі виклики сховища виконуються в окремому потоці-записувачі,
+    тож читання і запис JSON не блокують цикл подій бота.
+    """
+
+    def __init__(self, database):
+        self._db = database
+        # один потік — операції над сховищем виконуються по черзі
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-writer")
+
+    def __getattr__(self, name):
+        method = getattr(self._db, name)
+        if not callable(method) or name.startswith("_"):
+            raise AttributeError(name)
+
+        # метод шукається в момент виклику: після зміни активної події
+        # виклик піде вже до її сховища
+        def run(*args, **kwargs):
+            return getattr(self._db, name)(*args, **kwargs)
+
+        @functools.wraps(method)
+        async def call(*args, **kwargs):
+            return await self.run(run, *args, **kwargs)
+
+        # кешуємо обгортку, щоб __getattr__ більше не викликався
+        setattr(self, name, call)
+        return call
+
+    async def run(self, func, *args, **kwargs):
+        """
+        Виконує func у потоці сховища — для коду, що робить кілька викликів
+        поспіль (експорт, знімок події для нагадувань)
+        """
+        loop = asyncio.get_running_loop()
+        # контекст оновлення — щоб звернення до сховища зарахувались йому (metrics.py)
+        ctx = contextvars.copy_context()
+        return await loop.run_in_executor(
+            self._executor, functools.partial(ctx.run, func, *args, **kwargs)
+        )
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
+
+
+def create_database():
+    """
+    Повертає менеджер подій над сховищем, обраним у config.DATABASE_BACKEND
+    """
+    from events import EventManager
+    return EventManager(DATABASE_BACKEND)
 
 
-db = Database()
+db = create_database()
+adb = AsyncDatabase(db)
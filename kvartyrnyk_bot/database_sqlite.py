@@ -0,0 +1,829 @@
+"""
+SQLite-сховище (режим WAL) з тими ж публічними методами, що й Database.
+
+Вмикається в config.py: DATABASE_BACKEND = "sqlite".
+Перенесення наявних даних з JSON (спільне сховище і кожна подія з EVENTS_DIR):
+    python database_sqlite.py import
+    python database_sqlite.py import data/event_data.json data/event_data.sqlite3 data/events
+"""
+
+import json
+import os
+import sqlite3
+import sys
+import threading
+import uuid
+from datetime import datetime
+from typing import Optional
+
+from config import DATABASE_PATH, SQLITE_PATH, EVENTS_DIR
+from guest_index import GuestIndex, guest_texts
+from metrics import metrics
+from slot_holds import SlotHolds
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS settings (
+    key   TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS registered_users (
+    user_id       INTEGER PRIMARY KEY,
+    name          TEXT NOT NULL,
+    username      TEXT,
+    registered_at TEXT NOT NULL,
+    qr_token      TEXT NOT NULL UNIQUE,
+    checked_in_at TEXT
+);
+
+CREATE TABLE IF NOT EXISTS friends (
+    id       INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id  INTEGER NOT NULL REFERENCES registered_users(user_id) ON DELETE CASCADE,
+    name     TEXT NOT NULL,
+    username TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_users_order ON registered_users(registered_at, user_id);
+CREATE INDEX IF NOT EXISTS idx_friends_user ON friends(user_id);
+
+-- is_id = 1: value — числовий Telegram ID, is_id = 0: username (casefold)
+CREATE TABLE IF NOT EXISTS blacklist (
+    value TEXT NOT NULL,
+    is_id INTEGER NOT NULL,
+    PRIMARY KEY (value, is_id)
+);
+
+-- винятки події з глобального blacklist (сховище події)
+CREATE TABLE IF NOT EXISTS blacklist_allow (
+    value TEXT NOT NULL,
+    is_id INTEGER NOT NULL,
+    PRIMARY KEY (value, is_id)
+);
+
+CREATE TABLE IF NOT EXISTS known_users (
+    username TEXT PRIMARY KEY,
+    user_id  INTEGER NOT NULL
+);
+
+-- черга очікування: порядок — за position
+CREATE TABLE IF NOT EXISTS waitlist (
+    position  INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id   INTEGER NOT NULL UNIQUE,
+    name      TEXT NOT NULL,
+    username  TEXT,
+    joined_at TEXT NOT NULL
+);
+"""
+
+DEFAULT_SETTINGS = {
+    "max_slots": 50,
+    "price": 0,
+    "event_info": {"place": "", "time": "", "price": ""},
+    "unregister_allowed": True,
+    "max_friends_per_user": 0,
+}
+
+
+class SQLiteDatabase:
+
+    def __init__(self, path: str = SQLITE_PATH, shared=None):
+        self.db_path = path
+        # сховище події посилається на спільне: глобальний blacklist і known_users
+        self.shared = shared
+
+        dir_path = os.path.dirname(self.db_path)
+        if dir_path:
+            os.makedirs(dir_path, exist_ok=True)
+
+        # одне з'єднання на процес; транзакції серіалізує замок,
+        # а між процесами — BEGIN IMMEDIATE
+        self._conn = sqlite3.connect(self.db_path, isolation_level=None, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.RLock()
+
+        # місця, утримані на час реєстрації з друзями (лише в пам'яті)
+        self.holds = SlotHolds()
+
+        # індекс для /find: будується при першому пошуку, далі оновлюється
+        # разом зі змінами цього процесу; зміни інших процесів — перебудова
+        self._search = None
+        self._search_version = None
+
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA foreign_keys=ON")
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        self._conn.executescript(SCHEMA)
+        self._migrate()
+        self._conn.set_trace_callback(_trace_statement)
+
+        with self._transaction():
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO settings (key, value) VALUES (?, ?)",
+                [(k, json.dumps(v, ensure_ascii=False)) for k, v in DEFAULT_SETTINGS.items()]
+            )
+
+    def _migrate(self):
+        columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(registered_users)")}
+        if "checked_in_at" not in columns:
+            self._conn.execute("ALTER TABLE registered_users ADD COLUMN checked_in_at TEXT")
+
+    def _transaction(self):
+        return _Transaction(self._conn, self._lock, on_rollback=self._drop_guest_index)
+
+    def _query(self, sql, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def _get_setting(self, key):
+        rows = self._query("SELECT value FROM settings WHERE key = ?", (key,))
+        return json.loads(rows[0]["value"]) if rows else DEFAULT_SETTINGS.get(key)
+
+    def _set_setting(self, key, value):
+        with self._transaction():
+            self._conn.execute(
+                "INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)",
+                (key, json.dumps(value, ensure_ascii=False))
+            )
+
+    def _friends_of(self, user_ids, all_rows: bool = True):
+        friends = {uid: [] for uid in user_ids}
+        if all_rows:
+            rows = self._query("SELECT user_id, name, username FROM friends ORDER BY id")
+        else:
+            placeholders = ",".join("?" * len(friends))
+            rows = self._query(
+                f"SELECT user_id, name, username FROM friends WHERE user_id IN ({placeholders}) "
+                "ORDER BY id", tuple(friends)
+            )
+        for row in rows:
+            if row["user_id"] in friends:
+                friends[row["user_id"]].append({"name": row["name"], "username": row["username"]})
+        return friends
+
+    @staticmethod
+    def _user_to_dict(row, friends):
+        user = {
+            "name": row["name"],
+            "username": row["username"],
+            "registered_at": row["registered_at"],
+            "qr_token": row["qr_token"],
+        }
+        if row["checked_in_at"]:
+            user["checked_in_at"] = row["checked_in_at"]
+        if friends:
+            user["friends"] = friends
+        return user
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    # ===== GUEST SEARCH =====
+
+    def _drop_guest_index(self):
+        self._search = None
+
+    def _guest_index(self) -> GuestIndex:
+        version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+        if self._search is None or version != self._search_version:
+            rows = self._conn.execute("SELECT user_id, name, username FROM registered_users").fetchall()
+            friends = {r["user_id"]: [] for r in rows}
+            for f in self._conn.execute("SELECT user_id, name, username FROM friends ORDER BY id"):
+                friends[f["user_id"]].append((f["name"], f["username"]))
+            self._search = GuestIndex()
+            self._search.rebuild(
+                (r["user_id"], guest_texts(r["name"], r["username"], friends[r["user_id"]])) for r in rows
+            )
+            self._search_version = version
+        return self._search
+
+    def _reindex_guest(self, user_id: int):
+        # викликається в транзакції зміни; при ROLLBACK індекс скидається
+        if self._search is None:
+            return
+        row = self._conn.execute(
+            "SELECT name, username FROM registered_users WHERE user_id = ?", (user_id,)
+        ).fetchone()
+        if row is None:
+            self._search.remove(user_id)
+            return
+        friends = self._conn.execute(
+            "SELECT name, username FROM friends WHERE user_id = ? ORDER BY id", (user_id,)
+        ).fetchall()
+        self._search.add(user_id, guest_texts(row["name"], row["username"], [tuple(f) for f in friends]))
+
+    def find_guests(self, query: str, limit: int = 20):
+        """
+        Гості, в яких ім'я, username або ім'я друга починається з query
+        чи містить його (див. guest_index.py)
+        """
+        with self._lock:
+            user_ids = self._guest_index().search(query, limit)
+            if not user_ids:
+                return []
+            placeholders = ",".join("?" * len(user_ids))
+            rows = {r["user_id"]: r for r in self._conn.execute(
+                f"SELECT * FROM registered_users WHERE user_id IN ({placeholders})", user_ids
+            )}
+        friends = self._friends_of(user_ids, all_rows=False)
+        return [
+            {"user_id": uid, **self._user_to_dict(rows[uid], friends[uid])}
+            for uid in user_ids if uid in rows
+        ]
+
+    # ===== EVENT INFO =====
+    def get_event_info(self):
+        return self._get_setting("event_info")
+
+    def set_event_info(self, place, time, price):
+        self._set_setting("event_info", {"place": place, "time": time, "price": price})
+
+    def clear_event_info(self):
+        self._set_setting("event_info", {"place": "", "time": "", "price": ""})
+
+    # ===== CHECK REGISTRATION =====
+    def is_user_registered(self, user_id: int) -> bool:
+        return bool(self._query("SELECT 1 FROM registered_users WHERE user_id = ?", (user_id,)))
+
+    def get_registration(self, user_id: int):
+        rows = self._query("SELECT * FROM registered_users WHERE user_id = ?", (user_id,))
+        if not rows:
+            return None
+        friends = self._query(
+            "SELECT name, username FROM friends WHERE user_id = ? ORDER BY id", (user_id,)
+        )
+        return self._user_to_dict(rows[0], [dict(f) for f in friends])
+
+    # ===== REGISTRATION =====
+    def register_user(self, user_id: int, name: str, username: Optional[str] = None,
+                      friends: Optional[list] = None) -> bool:
+        """
+        Атомарно бронює місце для гостя разом з його друзями.
+        BEGIN IMMEDIATE блокує запис і для інших процесів бота.
+        """
+        with self._transaction():
+            if self._conn.execute(
+                "SELECT 1 FROM registered_users WHERE user_id = ?", (user_id,)
+            ).fetchone():
+                return False
+
+            if self.is_in_blacklist(user_id, username):
+                return False
+
+            # гість займає своє утримання; понад нього — лише вільні місця
+            # (черга очікування має пріоритет над новими реєстраціями)
+            # _free_seats спершу знімає прострочені утримання — інакше прострочене
+            # зарахувалось би і як місця гостя, і як вільні
+            needed = 1 + len(friends or [])
+            free = self._free_seats()
+            if needed > self.holds.seats(user_id) + free:
+                return False
+
+            self._insert_registration(user_id, name, username, friends)
+            self.holds.release(user_id)
+            return True
+
+    def _free_seats(self, include_waitlist: bool = True):
+        self.holds.expire()
+        taken = self._conn.execute(
+            "SELECT (SELECT COUNT(*) FROM registered_users) + (SELECT COUNT(*) FROM friends)"
+        ).fetchone()[0]
+        free = self._get_setting("max_slots") - taken - self.holds.total()
+        if include_waitlist:
+            free -= self._conn.execute("SELECT COUNT(*) FROM waitlist").fetchone()[0]
+        return max(0, free)
+
+    def _insert_registration(self, user_id, name, username=None, friends=None):
+        self._conn.execute(
+            "INSERT INTO registered_users (user_id, name, username, registered_at, qr_token) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (user_id, name, username, datetime.now().isoformat(), str(uuid.uuid4()))
+        )
+        self._conn.executemany(
+            "INSERT INTO friends (user_id, name, username) VALUES (?, ?, ?)",
+            [(user_id, f["name"], f.get("username")) for f in friends or []]
+        )
+        self._reindex_guest(user_id)
+        if self.shared is not None:
+            self.shared.save_known_user(user_id, username)
+        elif username:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO known_users (username, user_id) VALUES (?, ?)",
+                (username.lower(), user_id)
+            )
+
+    def unregister_user(self, user_id: int):
+        """
+        Скасовує реєстрацію і переводить на звільнене місце першого з черги
+        (в тій самій транзакції). Повертає переведених гостей.
+        """
+        with self._transaction():
+            deleted = self._conn.execute(
+                "DELETE FROM registered_users WHERE user_id = ?", (user_id,)
+            ).rowcount
+            if not deleted:
+                return []
+            self._reindex_guest(user_id)
+            return self._promote()
+
+    # ===== WAITLIST =====
+
+    def _promote(self):
+        """
+        Переводить гостей з початку черги на всі вільні місця.
+        Викликається всередині транзакції.
+        """
+        free = self._free_seats(include_waitlist=False)
+        promoted = []
+
+        while free > 0:
+            rows = self._conn.execute(
+                "SELECT * FROM waitlist ORDER BY position LIMIT ?", (free,)
+            ).fetchall()
+            if not rows:
+                break
+
+            for row in rows:
+                self._conn.execute("DELETE FROM waitlist WHERE position = ?", (row["position"],))
+                if self._conn.execute(
+                    "SELECT 1 FROM registered_users WHERE user_id = ?", (row["user_id"],)
+                ).fetchone() or self.is_in_blacklist(row["user_id"], row["username"]):
+                    continue
+
+                self._insert_registration(row["user_id"], row["name"], row["username"])
+                promoted.append({"user_id": row["user_id"], "name": row["name"]})
+                free -= 1
+
+        return promoted
+
+    def join_waitlist(self, user_id: int, name: str, username: Optional[str] = None):
+        """
+        Ставить гостя в кінець черги.
+        Повертає {"position": N, "promoted": [...]}; position = 0 — місце
+        щойно звільнилося і гостя вже зареєстровано, None — додати не можна.
+        """
+        with self._transaction():
+            if self._conn.execute(
+                "SELECT 1 FROM registered_users WHERE user_id = ?", (user_id,)
+            ).fetchone() or self.is_in_blacklist(user_id, username):
+                return {"position": None, "promoted": []}
+
+            self._conn.execute(
+                "INSERT OR IGNORE INTO waitlist (user_id, name, username, joined_at) VALUES (?, ?, ?, ?)",
+                (user_id, name, username, datetime.now().isoformat(timespec="seconds"))
+            )
+            promoted = self._promote()
+            if self.shared is not None:
+                self.shared.save_known_user(user_id, username)
+            if any(p["user_id"] == user_id for p in promoted):
+                return {"position": 0, "promoted": promoted}
+            return {"position": self._waitlist_position(user_id), "promoted": promoted}
+
+    def _waitlist_position(self, user_id: int):
+        row = self._conn.execute(
+            "SELECT COUNT(*) FROM waitlist WHERE position <= "
+            "(SELECT position FROM waitlist WHERE user_id = ?)", (user_id,)
+        ).fetchone()
+        return row[0] or None
+
+    def leave_waitlist(self, user_id: int) -> bool:
+        with self._transaction():
+            return self._conn.execute(
+                "DELETE FROM waitlist WHERE user_id = ?", (user_id,)
+            ).rowcount > 0
+
+    def get_waitlist_position(self, user_id: int):
+        with self._lock:
+            return self._waitlist_position(user_id)
+
+    def get_waitlist(self):
+        rows = self._query("SELECT user_id, name, username, joined_at FROM waitlist ORDER BY position")
+        return [dict(row) for row in rows]
+
+    def get_waitlist_count(self):
+        return self._query("SELECT COUNT(*) AS n FROM waitlist")[0]["n"]
+
+    def promote_waitlist(self):
+        with self._transaction():
+            return self._promote()
+
+    # ===== SLOT HOLDS =====
+
+    def hold_slots(self, user_id: int, seats: int) -> bool:
+        """
+        Утримує seats місць (гість + друзі) на час введення даних друзів
+        """
+        with self._lock:
+            free = self._free_seats()   # спершу — зняти прострочені утримання
+            if seats > self.holds.seats(user_id) + free:
+                return False
+            self.holds.put(user_id, seats)
+            return True
+
+    def release_hold(self, user_id: int):
+        with self._lock:
+            if not self.holds.release(user_id):
+                return []
+            return self.promote_waitlist()
+
+    def expire_holds(self):
+        return self.promote_waitlist()
+
+    def seconds_to_next_expiry(self):
+        with self._lock:
+            return self.holds.seconds_to_next_expiry()
+
+    # ===== CHECK-IN =====
+
+    def check_in(self, user_id: int, qr_token: str):
+        """
+        Позначає вхід гостя з уже перевіреного підписаного QR-коду.
+        UPDATE ... WHERE checked_in_at IS NULL — атомарна перевірка повторного входу.
+        """
+        now = datetime.now().isoformat(timespec="seconds")
+        with self._transaction():
+            updated = self._conn.execute(
+                "UPDATE registered_users SET checked_in_at = ? "
+                "WHERE user_id = ? AND qr_token = ? AND checked_in_at IS NULL",
+                (now, user_id, qr_token)
+            ).rowcount
+            row = self._conn.execute(
+                "SELECT u.user_id, u.name, u.username, u.checked_in_at, "
+                "(SELECT COUNT(*) FROM friends f WHERE f.user_id = u.user_id) AS friends "
+                "FROM registered_users u WHERE u.user_id = ? AND u.qr_token = ?",
+                (user_id, qr_token)
+            ).fetchone()
+
+        if row is None:
+            return {"status": "unknown"}
+        return {
+            "status": "ok" if updated else "already",
+            "user_id": row["user_id"],
+            "name": row["name"],
+            "username": row["username"],
+            "friends": row["friends"],
+            "checked_in_at": row["checked_in_at"],
+        }
+
+    def get_checked_in_count(self):
+        return self._query(
+            "SELECT COUNT(*) AS n FROM registered_users WHERE checked_in_at IS NOT NULL"
+        )[0]["n"]
+
+    # ===== FRIENDS SYSTEM =====
+
+    def get_max_friends(self):
+        return self._get_setting("max_friends_per_user")
+
+    def set_max_friends(self, count: int):
+        self._set_setting("max_friends_per_user", count)
+
+    # ===== SLOTS =====
+    def get_max_slots(self): return self._get_setting("max_slots")
+    def set_max_slots(self, count: int):
+        """
+        Повертає гостей, переведених з черги на нові місця
+        """
+        with self._transaction():
+            self._set_setting("max_slots", count)
+            return self._promote()
+
+    def get_current_slots(self):
+        # зайняті місця: гості разом з друзями
+        return self._query(
+            "SELECT (SELECT COUNT(*) FROM registered_users) + (SELECT COUNT(*) FROM friends) AS n"
+        )[0]["n"]
+
+    def get_free_slots(self):
+        # місця, доступні для нової реєстрації (утримання і черга — попереду)
+        with self._lock:
+            return self._free_seats()
+
+    def has_free_slots(self): return self.get_free_slots() > 0
+
+    # ===== PRICE =====
+    def get_price(self): return self._get_setting("price")
+    def set_price(self, price):
+        self._set_setting("price", price)
+
+    # ===== BLACKLIST =====
+
+    def is_in_blacklist(self, user_id: int, username: str | None = None) -> bool:
+        params = (str(user_id), username.casefold() if username else None)
+        if self._query(
+            "SELECT 1 FROM blacklist WHERE (value = ? AND is_id = 1) OR (value = ? AND is_id = 0)",
+            params
+        ):
+            return True
+
+        if self.shared is None:
+            return False
+
+        # подія може зробити виняток з глобального blacklist
+        if self._query(
+            "SELECT 1 FROM blacklist_allow WHERE (value = ? AND is_id = 1) OR (value = ? AND is_id = 0)",
+            params
+        ):
+            return False
+        return self.shared.is_in_blacklist(user_id, username)
+
+    def set_blacklist_override(self, value, blocked: bool | None):
+        """
+        True — заблокувати лише на цій події, False — дозволити попри
+        глобальний blacklist, None — прибрати виняток
+        """
+        key = self._blacklist_key(value)
+        with self._transaction():
+            self._conn.execute("DELETE FROM blacklist WHERE value = ? AND is_id = ?", key)
+            self._conn.execute("DELETE FROM blacklist_allow WHERE value = ? AND is_id = ?", key)
+            if blocked is not None:
+                table = "blacklist" if blocked else "blacklist_allow"
+                self._conn.execute(f"INSERT INTO {table} (value, is_id) VALUES (?, ?)", key)
+
+    def get_blacklist_overrides(self):
+        def values(table):
+            rows = self._query(f"SELECT value, is_id FROM {table} ORDER BY rowid")
+            return [int(r["value"]) if r["is_id"] else r["value"] for r in rows]
+        return {"block": values("blacklist"), "allow": values("blacklist_allow")}
+
+    def get_blacklist(self):
+        rows = self._query("SELECT value, is_id FROM blacklist ORDER BY rowid")
+        return [int(r["value"]) if r["is_id"] else r["value"] for r in rows]
+
+    def get_blacklist_count(self):
+        return self._query("SELECT COUNT(*) AS n FROM blacklist")[0]["n"]
+
+    @staticmethod
+    def _blacklist_key(value):
+        if isinstance(value, int):
+            return str(value), 1
+        return str(value).casefold(), 0
+
+    def add_to_blacklist(self, value):
+        with self._transaction():
+            self._conn.execute(
+                "INSERT OR IGNORE INTO blacklist (value, is_id) VALUES (?, ?)",
+                self._blacklist_key(value)
+            )
+
+    def add_many_to_blacklist(self, values) -> int:
+        """
+        Масове додавання (імпорт з файлу) однією транзакцією.
+        Повертає кількість нових записів.
+        """
+        with self._transaction():
+            before = self._conn.total_changes
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO blacklist (value, is_id) VALUES (?, ?)",
+                [self._blacklist_key(v) for v in values]
+            )
+            return self._conn.total_changes - before
+
+    def remove_from_blacklist(self, value):
+        with self._transaction():
+            self._conn.execute(
+                "DELETE FROM blacklist WHERE value = ? AND is_id = ?",
+                self._blacklist_key(value)
+            )
+
+    # ===== KNOWN USERS (username → id) =====
+
+    def save_known_user(self, user_id: int, username: Optional[str]):
+        if not username:
+            return
+        with self._transaction():
+            self._conn.execute(
+                "INSERT OR REPLACE INTO known_users (username, user_id) VALUES (?, ?)",
+                (username.lower(), user_id)
+            )
+
+    def get_user_id_by_username(self, username: str):
+        rows = self._query(
+            "SELECT user_id FROM known_users WHERE username = ?", (username.lower(),)
+        )
+        return rows[0]["user_id"] if rows else None
+
+    # ===== UNREGISTER TOGGLE =====
+    def is_unregister_allowed(self) -> bool:
+        return self._get_setting("unregister_allowed")
+
+    def set_unregister_allowed(self, value: bool):
+        self._set_setting("unregister_allowed", value)
+
+    def get_all_registered(self):
+        rows = self._query("SELECT * FROM registered_users ORDER BY registered_at")
+        friends = self._friends_of(r["user_id"] for r in rows)
+        return {str(r["user_id"]): self._user_to_dict(r, friends[r["user_id"]]) for r in rows}
+
+    def get_registered_page(self, after: str | None = None, before: str | None = None,
+                            limit: int = 10):
+        """
+        Сторінка гостей у порядку реєстрації (курсор — ключ крайнього гостя)
+        """
+        from database import parse_page_cursor
+
+        with self._lock:
+            if after is not None:
+                rows = self._conn.execute(
+                    "SELECT * FROM registered_users WHERE (registered_at, user_id) > (?, ?) "
+                    "ORDER BY registered_at, user_id LIMIT ?",
+                    (*parse_page_cursor(after), limit + 1)
+                ).fetchall()
+                has_next = len(rows) > limit
+                rows = rows[:limit]
+            elif before is not None:
+                rows = self._conn.execute(
+                    "SELECT * FROM registered_users WHERE (registered_at, user_id) < (?, ?) "
+                    "ORDER BY registered_at DESC, user_id DESC LIMIT ?",
+                    (*parse_page_cursor(before), limit)
+                ).fetchall()[::-1]
+                has_next = True
+            else:
+                rows = self._conn.execute(
+                    "SELECT * FROM registered_users ORDER BY registered_at, user_id LIMIT ?",
+                    (limit + 1,)
+                ).fetchall()
+                has_next = len(rows) > limit
+                rows = rows[:limit]
+
+            offset = 0
+            if rows:
+                offset = self._conn.execute(
+                    "SELECT COUNT(*) FROM registered_users WHERE (registered_at, user_id) < (?, ?)",
+                    (rows[0]["registered_at"], rows[0]["user_id"])
+                ).fetchone()[0]
+            total = self._conn.execute("SELECT COUNT(*) FROM registered_users").fetchone()[0]
+
+        friends = self._friends_of([r["user_id"] for r in rows], all_rows=False) if rows else {}
+        items = []
+        for r in rows:
+            user = self._user_to_dict(r, friends[r["user_id"]])
+            user.setdefault("friends", [])
+            items.append((str(r["user_id"]), user))
+
+        return {
+            "items": items,
+            "offset": offset,
+            "total": total,
+            "has_prev": offset > 0,
+            "has_next": has_next,
+        }
+
+    def clear_all_registrations(self):
+        with self._transaction():
+            self._conn.execute("DELETE FROM registered_users")
+            self._conn.execute("DELETE FROM waitlist")
+            if self._search is not None:
+                self._search = GuestIndex()
+
+    # ===== IMPORT =====
+
+    def export_event_data(self):
+        """
+        Дані події (для перенесення в окреме сховище)
+        """
+        data = {key: self._get_setting(key) for key in DEFAULT_SETTINGS}
+        data["registered_users"] = self.get_all_registered()
+        data["waitlist"] = self.get_waitlist()
+        return data
+
+    def import_json(self, data: dict):
+        """
+        Одноразове перенесення документа з JSON-сховища (все в одній транзакції)
+        """
+        self._drop_guest_index()
+        with self._transaction():
+            for key in DEFAULT_SETTINGS:
+                if key in data:
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)",
+                        (key, json.dumps(data[key], ensure_ascii=False))
+                    )
+
+            for uid, user in data.get("registered_users", {}).items():
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO registered_users "
+                    "(user_id, name, username, registered_at, qr_token, checked_in_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (int(uid), user["name"], user.get("username"),
+                     user.get("registered_at") or datetime.now().isoformat(),
+                     user.get("qr_token") or str(uuid.uuid4()), user.get("checked_in_at"))
+                )
+                self._conn.execute("DELETE FROM friends WHERE user_id = ?", (int(uid),))
+                self._conn.executemany(
+                    "INSERT INTO friends (user_id, name, username) VALUES (?, ?, ?)",
+                    [(int(uid), f["name"], f.get("username")) for f in user.get("friends", [])]
+                )
+
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO blacklist (value, is_id) VALUES (?, ?)",
+                [self._blacklist_key(v) for v in data.get("blacklist", [])]
+            )
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO blacklist_allow (value, is_id) VALUES (?, ?)",
+                [self._blacklist_key(v) for v in data.get("blacklist_allow", [])]
+            )
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO known_users (username, user_id) VALUES (?, ?)",
+                [(name.lower(), uid) for name, uid in data.get("known_users", {}).items()]
+            )
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO waitlist (user_id, name, username, joined_at) VALUES (?, ?, ?, ?)",
+                [(e["user_id"], e["name"], e.get("username"), e.get("joined_at") or datetime.now().isoformat())
+                 for e in data.get("waitlist", [])]
+            )
+
+
+def _trace_statement(sql: str):
+    """
+    Рахує SQL-запити для метрик: SELECT — читання, решта — запис
+    (BEGIN / COMMIT / ROLLBACK / PRAGMA не рахуються)
+    """
+    verb = sql.lstrip()[:6].upper()
+    if verb == "SELECT":
+        metrics.storage_call("sql_read")
+    elif verb not in ("BEGIN ", "COMMIT", "ROLLBA", "PRAGMA"):
+        metrics.storage_call("sql_write")
+
+
+class _Transaction:
+    """
+    BEGIN IMMEDIATE ... COMMIT під замком з'єднання (ROLLBACK при помилці;
+    on_rollback — скинути те, що в пам'яті встигло змінитись разом із транзакцією)
+    """
+
+    def __init__(self, conn, lock, on_rollback=None):
+        self._conn = conn
+        self._lock = lock
+        self._on_rollback = on_rollback
+
+    def __enter__(self):
+        self._lock.acquire()
+        # вкладені виклики (наприклад, is_in_blacklist усередині register_user)
+        # працюють у вже відкритій транзакції
+        self._outer = not self._conn.in_transaction
+        if self._outer:
+            self._conn.execute("BEGIN IMMEDIATE")
+        return self._conn
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if self._outer:
+                self._conn.execute("ROLLBACK" if exc_type else "COMMIT")
+            if exc_type and self._on_rollback is not None:
+                self._on_rollback()
+        finally:
+            self._lock.release()
+        return False
+
+
+def _import_file(json_path: str, sqlite_path: str) -> int:
+    # Database сам відтворить журнал, якщо JSON-сховище працювало в режимі "journal"
+    from database import Database
+
+    source = Database(json_path)
+    data = source.export_document()
+    source.close()
+
+    target = SQLiteDatabase(sqlite_path)
+    target.import_json(data)
+    count = len(data.get("registered_users", {}))
+    target.close()
+    return count
+
+
+def import_from_json(json_path: str = DATABASE_PATH, sqlite_path: str = SQLITE_PATH,
+                     events_dir: str = EVENTS_DIR) -> dict:
+    """
+    Спільне сховище → sqlite_path, кожна активна подія events/<id>.json → events/<id>.sqlite3;
+    у каталозі подій (index.json) backend стає "sqlite". Повертає {назва: кількість реєстрацій}.
+    """
+    imported = {"спільне сховище": _import_file(json_path, sqlite_path)}
+
+    index_path = os.path.join(events_dir, "index.json")
+    if os.path.exists(index_path):
+        with open(index_path, 'r', encoding='utf-8') as f:
+            index = json.load(f)
+        for event_id, meta in index["events"].items():
+            source = os.path.join(events_dir, f"{event_id}.json")
+            # архівні події лишаються в архіві (gzip JSON)
+            if meta["status"] == "active" and os.path.exists(source):
+                target = os.path.join(events_dir, f"{event_id}.sqlite3")
+                imported[f"подія {event_id} ({meta['name']})"] = _import_file(source, target)
+
+        index["backend"] = "sqlite"
+        tmp_path = index_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(index, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, index_path)
+    return imported
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "import":
+        print("Використання: python database_sqlite.py import [шлях до JSON] [шлях до SQLite] [каталог подій]")
+        sys.exit(1)
+
+    for name, count in import_from_json(*sys.argv[2:5]).items():
+        print(f"{name}: імпортовано реєстрацій: {count}")
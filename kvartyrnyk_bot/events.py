@@ -0,0 +1,271 @@
+"""
+Кілька подій замість однієї глобальної.
+
+- Спільне сховище (DATABASE_PATH або SQLITE_PATH) — глобальний blacklist і known_users.
+- Кожна подія — окреме сховище в EVENTS_DIR: місця, ціна, інформація,
+  реєстрації, черга і власні винятки з blacklist. Сховище події
+  відкривається лише при першому зверненні; відкритими тримаються
+  не більше EVENT_CACHE_SIZE подій.
+- Минулі події архівуються стиснутими (gzip) у EVENTS_ARCHIVE_DIR
+  і більше не завантажуються.
+- У каталозі (index.json) записано backend, у якому лежать події. Після зміни
+  DATABASE_BACKEND бот не стартує, доки дані не перенесено
+  (python database_sqlite.py import) — інакше він відкрив би порожні сховища.
+
+db з database.py — це EventManager: методи сховища без явної події
+виконуються для активної події, а методи blacklist / known_users — у спільному сховищі.
+Сховища і каталог подій відкриваються при першому зверненні (або db.open()
+під час запуску бота), а не під час імпорту модуля — тож імпорт database.py
+(наприклад, з database_sqlite.py import) нічого не мігрує.
+"""
+
+import gzip
+import json
+import os
+import shutil
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+from config import (
+    DATABASE_BACKEND, DATABASE_PATH, SQLITE_PATH, EVENT_NAME,
+    EVENTS_DIR, EVENTS_ARCHIVE_DIR, EVENT_CACHE_SIZE,
+)
+
+# методи, що працюють зі спільними даними, а не з подією
+SHARED_METHODS = frozenset({
+    "add_to_blacklist", "add_many_to_blacklist", "remove_from_blacklist",
+    "get_blacklist", "get_blacklist_count",
+    "save_known_user", "get_user_id_by_username",
+})
+
+
+class EventManager:
+
+    def __init__(self, backend: str = DATABASE_BACKEND, events_dir: str = EVENTS_DIR,
+                 archive_dir: str = EVENTS_ARCHIVE_DIR, cache_size: int = EVENT_CACHE_SIZE):
+        self.backend = backend
+        self.events_dir = events_dir
+        self.archive_dir = archive_dir
+        self.index_path = os.path.join(events_dir, "index.json")
+        self.cache_size = cache_size
+
+        self._lock = threading.RLock()
+        self._stores = OrderedDict()   # event_id → відкрите сховище (LRU)
+        self._opened = False
+
+    def open(self):
+        """
+        Відкриває спільне сховище і каталог подій (перший запуск — міграція)
+        """
+        if self._opened:
+            return
+        with self._lock:
+            # "_index" уже є — повторний вхід з міграції (get_store) у тому ж потоці
+            if self._opened or "_index" in self.__dict__:
+                return
+            os.makedirs(self.events_dir, exist_ok=True)
+            self.shared = self._open_shared()
+            try:
+                self._index = self._load_index()
+            except BaseException:
+                self.__dict__.pop("_index", None)
+                raise
+            self._opened = True
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        self.open()
+        if name in self.__dict__:
+            return self.__dict__[name]
+        target = self.shared if name in SHARED_METHODS else self.current
+        return getattr(target, name)
+
+    # ===== STORES =====
+
+    def _open_shared(self):
+        if self.backend == "sqlite":
+            from database_sqlite import SQLiteDatabase
+            return SQLiteDatabase(SQLITE_PATH)
+        from database import Database
+        return Database(DATABASE_PATH)
+
+    def _store_path(self, event_id: str, backend: str | None = None) -> str:
+        ext = "sqlite3" if (backend or self.backend) == "sqlite" else "json"
+        return os.path.join(self.events_dir, f"{event_id}.{ext}")
+
+    def _open_store(self, event_id: str):
+        if self.backend == "sqlite":
+            from database_sqlite import SQLiteDatabase
+            return SQLiteDatabase(self._store_path(event_id), shared=self.shared)
+        from database import Database
+        return Database(self._store_path(event_id), shared=self.shared)
+
+    def get_store(self, event_id: str):
+        """
+        Сховище події (відкривається при першому зверненні)
+        """
+        self.open()
+        with self._lock:
+            store = self._stores.get(event_id)
+            if store is not None:
+                self._stores.move_to_end(event_id)
+                return store
+
+            meta = self._index["events"].get(event_id)
+            if meta is None or meta["status"] != "active":
+                raise KeyError(f"Подія {event_id} недоступна")
+
+            store = self._open_store(event_id)
+            self._stores[event_id] = store
+            self._evict()
+            return store
+
+    def _evict(self):
+        current = self._index["current"]
+        for event_id in list(self._stores):
+            if len(self._stores) <= self.cache_size:
+                return
+            if event_id != current:
+                self._stores.pop(event_id).close()
+
+    @property
+    def current(self):
+        self.open()
+        return self.get_store(self._index["current"])
+
+    # ===== INDEX =====
+
+    def _load_index(self):
+        if os.path.exists(self.index_path):
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                self._index = json.load(f)
+            self._check_backend()
+            return self._index
+        return self._migrate_single_event()
+
+    def _check_backend(self):
+        """
+        Події мають лежати в сховищах поточного backend (див. docstring модуля)
+        """
+        recorded = self._index.get("backend")
+        if recorded == self.backend:
+            return
+
+        if recorded is None:
+            # каталог зі старої версії: backend видно з файлів подій
+            other = "json" if self.backend == "sqlite" else "sqlite"
+            stale = any(
+                meta["status"] == "active"
+                and not os.path.exists(self._store_path(event_id))
+                and os.path.exists(self._store_path(event_id, other))
+                for event_id, meta in self._index["events"].items()
+            )
+            recorded = other if stale else self.backend
+
+        if recorded != self.backend:
+            hint = ("перенесіть дані: python database_sqlite.py import" if self.backend == "sqlite"
+                    else f'поверніть DATABASE_BACKEND = "{recorded}" (перенесення з SQLite в JSON немає)')
+            raise RuntimeError(
+                f'Події збережено в backend "{recorded}", а DATABASE_BACKEND = "{self.backend}" — '
+                f"{hint}. Інакше бот відкрив би порожні сховища."
+            )
+
+        self._index["backend"] = self.backend
+        self._save_index()
+
+    def _save_index(self):
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._index, f, ensure_ascii=False, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.index_path)
+
+    def _migrate_single_event(self):
+        """
+        Перший запуск: наявна подія зі спільного сховища стає подією "1"
+        """
+        self._index = {
+            "current": "1",
+            "next_id": 2,
+            "backend": self.backend,
+            "events": {"1": self._new_meta(EVENT_NAME)},
+        }
+        self.get_store("1").import_json(self.shared.export_event_data())
+        self._save_index()
+        # лише після збереження каталогу — повторний запуск нічого не втратить
+        self.shared.clear_all_registrations()
+        return self._index
+
+    @staticmethod
+    def _new_meta(name: str):
+        return {
+            "name": name.strip(),
+            "status": "active",
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+        }
+
+    # ===== EVENTS =====
+
+    def get_current_event(self):
+        self.open()
+        event_id = self._index["current"]
+        return {"id": event_id, **self._index["events"][event_id]}
+
+    def list_events(self):
+        self.open()
+        current = self._index["current"]
+        return [
+            {"id": event_id, **meta, "current": event_id == current}
+            for event_id, meta in self._index["events"].items()
+        ]
+
+    def create_event(self, name: str) -> str:
+        self.open()
+        with self._lock:
+            event_id = str(self._index["next_id"])
+            self._index["next_id"] += 1
+            self._index["events"][event_id] = self._new_meta(name)
+            self._save_index()
+            return event_id
+
+    def switch_event(self, event_id: str) -> bool:
+        self.open()
+        with self._lock:
+            meta = self._index["events"].get(event_id)
+            if meta is None or meta["status"] != "active":
+                return False
+            self._index["current"] = event_id
+            self._save_index()
+            return True
+
+    def archive_event(self, event_id: str) -> bool:
+        """
+        Переносить минулу подію в архів (gzip); активну подію архівувати не можна
+        """
+        self.open()
+        with self._lock:
+            meta = self._index["events"].get(event_id)
+            if meta is None or meta["status"] != "active" or event_id == self._index["current"]:
+                return False
+
+            # закриття зводить журнал / WAL в основний файл
+            store = self._stores.pop(event_id, None) or self._open_store(event_id)
+            store.close()
+
+            os.makedirs(self.archive_dir, exist_ok=True)
+            path = self._store_path(event_id)
+            archive_path = os.path.join(self.archive_dir, os.path.basename(path) + ".gz")
+            with open(path, 'rb') as src, gzip.open(archive_path, 'wb') as dst:
+                shutil.copyfileobj(src, dst)
+
+            meta["status"] = "archived"
+            meta["archive"] = archive_path
+            self._save_index()
+
+            for suffix in ("", ".journal", "-wal", "-shm"):
+                if os.path.exists(path + suffix):
+                    os.remove(path + suffix)
+            return True
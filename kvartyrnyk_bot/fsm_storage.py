@@ -0,0 +1,191 @@
+"""
+Постійне FSM-сховище: незавершені реєстрації переживають перезапуск бота.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Any, Mapping
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StorageKey, StateType
+
+from config import FSM_STORAGE_PATH, FSM_CACHE_SIZE, FSM_FLUSH_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+
+class SQLiteStorage(BaseStorage):
+    """
+    FSM-сховище на SQLite.
+
+    Активні розмови живуть у LRU-кеші в пам'яті, тож читання стану
+    не ходить на диск. Зміни накопичуються і скидаються в базу пачкою
+    раз на flush_interval секунд в окремому потоці — без звернення
+    до диска на кожне повідомлення.
+    """
+
+    def __init__(self, path: str = FSM_STORAGE_PATH, cache_size: int = FSM_CACHE_SIZE,
+                 flush_interval: float = FSM_FLUSH_INTERVAL):
+        dir_path = os.path.dirname(path)
+        if dir_path:
+            os.makedirs(dir_path, exist_ok=True)
+
+        self._conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS fsm ("
+            "key TEXT PRIMARY KEY, state TEXT, data TEXT NOT NULL)"
+        )
+        self._conn_lock = threading.Lock()
+
+        self.cache_size = cache_size
+        self.flush_interval = flush_interval
+
+        self._cache = OrderedDict()  # key → (state, data)
+        self._dirty = {}             # зміни, ще не записані на диск
+        self._flushing = {}          # пачка, яка саме записується
+        self._flush_task = None
+
+    @staticmethod
+    def _key(key: StorageKey) -> str:
+        return ":".join(str(part) for part in (
+            key.bot_id, key.chat_id, key.user_id, key.thread_id,
+            key.business_connection_id, key.destiny,
+        ))
+
+    # ===== CACHE =====
+
+    def _cached_record(self, k: str):
+        record = self._cache.get(k)
+        if record is not None:
+            self._cache.move_to_end(k)
+            return record
+
+        # витіснена з кешу розмова може ще чекати запису
+        record = self._dirty.get(k) or self._flushing.get(k)
+        if record is not None:
+            self._remember(k, record)
+        return record
+
+    async def _get_record(self, key: StorageKey):
+        k = self._key(key)
+
+        record = self._cached_record(k)
+        if record is not None:
+            return record
+
+        # SELECT чекає на _conn_lock разом із записом пачки — не в циклі подій
+        record = await asyncio.to_thread(self._read_record, k)
+
+        # поки читали, цю розмову могли змінити — свіжіший запис важливіший
+        fresher = self._cached_record(k)
+        if fresher is not None:
+            return fresher
+
+        self._remember(k, record)
+        return record
+
+    def _read_record(self, k: str):
+        with self._conn_lock:
+            row = self._conn.execute("SELECT state, data FROM fsm WHERE key = ?", (k,)).fetchone()
+        if row is None:
+            return None, {}
+        return row[0], json.loads(row[1])
+
+    def _remember(self, k: str, record):
+        self._cache[k] = record
+        self._cache.move_to_end(k)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def _put_record(self, key: StorageKey, record):
+        k = self._key(key)
+        self._remember(k, record)
+        self._dirty[k] = record
+
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_later())
+
+    # ===== FLUSH =====
+
+    async def _flush_later(self):
+        # працює, доки є що писати: і зміни, що прийшли під час запису,
+        # і пачка, повернута в _dirty після помилки, підуть наступним заходом
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Не вдалося записати FSM-стани (%s), повтор через %s с",
+                                 len(self._dirty), self.flush_interval)
+            if not self._dirty:
+                return
+
+    async def flush(self):
+        """
+        Записує накопичені зміни однією транзакцією
+        """
+        if not self._dirty:
+            return
+
+        self._flushing, self._dirty = self._dirty, {}
+        try:
+            await asyncio.to_thread(self._write_batch, self._flushing)
+        except Exception:
+            # не губимо зміни: новіші записи з _dirty мають пріоритет
+            self._dirty = {**self._flushing, **self._dirty}
+            raise
+        finally:
+            self._flushing = {}
+
+    def _write_batch(self, batch: dict):
+        upserts = []
+        deletes = []
+        for k, (state, data) in batch.items():
+            if state is None and not data:
+                # розмову завершено — рядок більше не потрібен
+                deletes.append((k,))
+            else:
+                upserts.append((k, state, json.dumps(data, ensure_ascii=False)))
+
+        with self._conn_lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO fsm (key, state, data) VALUES (?, ?, ?)", upserts
+                )
+                self._conn.executemany("DELETE FROM fsm WHERE key = ?", deletes)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    # ===== BaseStorage =====
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        state = state.state if isinstance(state, State) else state
+        _, data = await self._get_record(key)
+        self._put_record(key, (state, data))
+
+    async def get_state(self, key: StorageKey) -> str | None:
+        return (await self._get_record(key))[0]
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        state, _ = await self._get_record(key)
+        self._put_record(key, (state, dict(data)))
+
+    async def get_data(self, key: StorageKey) -> dict[str, Any]:
+        return dict((await self._get_record(key))[1])
+
+    async def close(self) -> None:
+        if self._flush_task is not None and not self._flush_task.done():
+            self._flush_task.cancel()
+        await self.flush()
+        with self._conn_lock:
+            self._conn.close()
@@ -0,0 +1,115 @@
+"""
+Пошук гостей для /find: за початком слова або за частиною імені, username
+чи імені друга (без урахування регістру).
+
+- Префікс: відсортований список (слово, user_id) — bisect, без перебору.
+- Підрядок (від 3 символів): триграми → множини user_id; кандидати,
+  що мають усі триграми запиту, перевіряються справжнім входженням.
+
+Індекс оновлюється по одному гостю (add / remove) при кожній зміні
+реєстрації; повна перебудова — лише при читанні сховища з диска.
+"""
+
+import bisect
+import re
+
+_WORD = re.compile(r"\w+")
+
+
+def guest_texts(name, username, friends=()) -> tuple:
+    """
+    Рядки, за якими шукається гість; friends — пари (ім'я, username)
+    """
+    texts = [name, username]
+    for friend_name, friend_username in friends:
+        texts += [friend_name, friend_username]
+    return tuple(dict.fromkeys(t.casefold() for t in texts if t))
+
+
+def _trigrams(text: str):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class GuestIndex:
+
+    def __init__(self):
+        self._texts = {}    # user_id → рядки гостя (casefold)
+        self._words = []    # відсортовані (слово, user_id)
+        self._grams = {}    # триграма → {user_id}
+
+    def __len__(self):
+        return len(self._texts)
+
+    @staticmethod
+    def _words_of(texts):
+        return {word for text in texts for word in [text, *_WORD.findall(text)]}
+
+    def add(self, user_id: int, texts: tuple):
+        if user_id in self._texts:
+            self.remove(user_id)
+        self._texts[user_id] = texts
+
+        for word in self._words_of(texts):
+            bisect.insort(self._words, (word, user_id))
+        for text in texts:
+            for gram in _trigrams(text):
+                self._grams.setdefault(gram, set()).add(user_id)
+
+    def remove(self, user_id: int):
+        texts = self._texts.pop(user_id, None)
+        if texts is None:
+            return
+
+        for word in self._words_of(texts):
+            i = bisect.bisect_left(self._words, (word, user_id))
+            if i < len(self._words) and self._words[i] == (word, user_id):
+                del self._words[i]
+        for text in texts:
+            for gram in _trigrams(text):
+                users = self._grams.get(gram)
+                if users is not None:
+                    users.discard(user_id)
+                    if not users:
+                        del self._grams[gram]
+
+    def rebuild(self, guests):
+        """
+        guests — пари (user_id, рядки гостя); одне сортування замість insort на кожного
+        """
+        self._texts = dict(guests)
+        self._words = sorted(
+            (word, user_id) for user_id, texts in self._texts.items() for word in self._words_of(texts)
+        )
+        self._grams = {}
+        for user_id, texts in self._texts.items():
+            for text in texts:
+                for gram in _trigrams(text):
+                    self._grams.setdefault(gram, set()).add(user_id)
+
+    def search(self, query: str, limit: int = 20) -> list:
+        """
+        user_id знайдених гостей: спершу збіги з початком слова, потім — усередині
+        """
+        query = query.strip().lstrip("@").casefold()
+        if not query:
+            return []
+
+        found = {}   # dict як впорядкована множина
+        i = bisect.bisect_left(self._words, (query,))
+        while i < len(self._words) and len(found) < limit:
+            word, user_id = self._words[i]
+            if not word.startswith(query):
+                break
+            found[user_id] = None
+            i += 1
+
+        if len(query) >= 3 and len(found) < limit:
+            postings = sorted((self._grams.get(g, ()) for g in _trigrams(query)), key=len)
+            candidates = set(postings[0]).intersection(*postings[1:])
+            for user_id in sorted(candidates - found.keys()):
+                if any(query in text for text in self._texts[user_id]):
+                    found[user_id] = None
+                    if len(found) >= limit:
+                        break
+
+        return list(found)
@@ -1,19 +1,31 @@
 from aiogram import Router, F
-from aiogram.types import Message, FSInputFile
+from aiogram.types import Message, BufferedInputFile, CallbackQuery
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from datetime import datetime
-from aiogram.filters import StateFilter
 
-import os
+import asyncio
+import html
+import re
 
-from database import db
-from config import ADMIN_ID, MESSAGES, EVENT_NAME
-from keyboards import admin_keyboard, user_keyboard
+from database import adb, make_page_cursor
+from keyboards import admin_keyboard, user_keyboard, users_page_keyboard, find_results_keyboard
 from admin_filter import IsAdmin
+from qr_utils import make_qr_token, prerender_qr_codes, qr_cache, qr_decoding_available, read_qr_from_photo
+from qr_tokens import verify_qr_token
+from broadcast import broadcaster
+from handlers_user import notify_promoted
+from throttling import throttling_middleware
+from metrics import metrics
+from reminders import reminders, parse_event_time
+from export import build_export, fetch_export_pages, xlsx_available
 
 admin_router = Router()
 admin_router.message.filter(IsAdmin())  # ← ФІЛЬТР ПРАЦЮЄ
+admin_router.callback_query.filter(IsAdmin())
+
+LIST_PAGE_SIZE = 10
+FIND_LIMIT = 10
 
 # ================= FSM =================
 
@@ -23,8 +35,11 @@ class AdminStates(StatesGroup):
     waiting_event_price = State()
     waiting_for_blacklist_add = State()
     waiting_for_blacklist_remove = State()
+    waiting_for_blacklist_import = State()
     waiting_for_slots = State()
     waiting_for_user_remove = State()
+    waiting_broadcast_message = State()
+    checkin_mode = State()
 
 # ================= HELPERS =================
 
@@ -64,31 +79,116 @@ async def set_event_time(message: Message, state: FSMContext):
 async def set_event_price(message: Message, state: FSMContext):
     data = await state.get_data()
 
-    db.set_event_info(
+    await adb.set_event_info(
         place=data["place"],
         time=data["time"],
         price=message.text
     )
 
     await state.clear()
-    await message.answer("✅ Подію оновлено.")
+
+    event = await adb.get_current_event()
+    starts_at = parse_event_time(data["time"])
+    if starts_at is None:
+        reminders.cancel_event(event["id"])
+        await message.answer(
+            "✅ Подію оновлено.\n"
+            "⚠️ Час не розпізнано (приклад: 31.12.2026 19:00) — нагадувань гостям не буде."
+        )
+        return
+
+    planned = reminders.schedule_event(event["id"], starts_at)
+    lines = ["✅ Подію оновлено.", f"⏰ Нагадувань заплановано: {len(planned)}"]
+    lines += [f"• {fire_at:%d.%m.%Y %H:%M}" for fire_at in planned]
+    await message.answer("\n".join(lines))
 
 @admin_router.message(F.text.startswith("/clear_event"))
 async def clear_event(message: Message):
-    db.clear_event_info()
+    await adb.clear_event_info()
+    reminders.cancel_event((await adb.get_current_event())["id"])
     await message.answer("🗑 Дані події очищено.")
 
+
+@admin_router.message(F.text.startswith("/reminders"))
+async def show_reminders(message: Message):
+    jobs = reminders.pending()
+    if not jobs:
+        await message.answer("⏰ Запланованих нагадувань немає.")
+        return
+
+    events = {e["id"]: e["name"] for e in await adb.list_events()}
+    lines = ["⏰ Заплановані нагадування:", ""]
+    for job in jobs:
+        line = f"• {job['fire_at']:%d.%m.%Y %H:%M} — {events.get(job['event_id'], job['event_id'])}"
+        if job["sent"]:
+            line += f" (надіслано {job['sent']})"
+        lines.append(line)
+    await message.answer("\n".join(lines))
+
+    # ================= EVENTS =================
+
+@admin_router.message(F.text.startswith("/events"))
+async def list_events(message: Message):
+    lines = ["🗂 Події:", ""]
+    for event in await adb.list_events():
+        mark = "▶️" if event["current"] else ("📦" if event["status"] == "archived" else "▫️")
+        lines.append(f"{mark} {event['id']}. {event['name']} (від {event['created_at'][:10]})")
+    lines.append("\n▶️ — активна, 📦 — в архіві")
+    await message.answer("\n".join(lines))
+
+@admin_router.message(F.text.startswith("/new_event"))
+async def new_event(message: Message):
+    name = message.text.removeprefix("/new_event").strip()
+    if not name:
+        await message.answer("Формат: /new_event Назва події")
+        return
+
+    event_id = await adb.create_event(name)
+    await adb.switch_event(event_id)
+    await message.answer(
+        f"✅ Створено подію {event_id}: {name}. Тепер вона активна.\n"
+        "Налаштуйте її: /set_event, /set_slots, /set_max_friends"
+    )
+
+@admin_router.message(F.text.startswith("/switch_event"))
+async def switch_event(message: Message):
+    parts = message.text.split()
+    if len(parts) != 2:
+        await message.answer("Формат: /switch_event 2 (id — у /events)")
+        return
+
+    if not await adb.switch_event(parts[1]):
+        await message.answer("❌ Такої активної події немає.")
+        return
+    event = await adb.get_current_event()
+    await message.answer(f"▶️ Активна подія: {event['name']}")
+
+@admin_router.message(F.text.startswith("/archive_event"))
+async def archive_event(message: Message):
+    parts = message.text.split()
+    if len(parts) != 2:
+        await message.answer("Формат: /archive_event 1 (id — у /events)")
+        return
+
+    if not await adb.archive_event(parts[1]):
+        await message.answer("❌ Не вдалося: подію не знайдено, вона вже в архіві або зараз активна.")
+        return
+    reminders.cancel_event(parts[1])
+    await message.answer(f"📦 Подію {parts[1]} перенесено в архів.")
+
     # ================= FULL INFO =================
 
 @admin_router.message(F.text.startswith("/full_info"))
 async def full_info(message: Message):
-        event = db.get_event_info()
-        registered = db.get_current_slots()
-        max_slots = db.get_max_slots()
-        free = db.get_free_slots()
-        price = db.get_price()
-        unregister_allowed = db.is_unregister_allowed()
-        bl_count = len(db.get_blacklist())
+        event = await adb.get_event_info()
+        registered = await adb.get_current_slots()
+        max_slots = await adb.get_max_slots()
+        free = await adb.get_free_slots()
+        price = await adb.get_price()
+        unregister_allowed = await adb.is_unregister_allowed()
+        bl_count = await adb.get_blacklist_count()
+        checked_in = await adb.get_checked_in_count()
+        current = await adb.get_current_event()
 
         event_block = (
             "ℹ️ Подію ще не налаштовано\n"
@@ -102,12 +202,13 @@ async def full_info(message: Message):
             "📊 <b>ПОВНА ІНФОРМАЦІЯ</b>\n"
             "━━━━━━━━━━━━━━━━━━\n\n"
 
-            f"🎤 <b>Подія:</b>\n{event_block}\n"
+            f"🎤 <b>Подія:</b> {html.escape(current['name'])} (id {current['id']})\n{event_block}\n"
 
             f"🎫 <b>Місця:</b>\n"
             f"Ліміт: {max_slots}\n"
             f"Зареєстровано: {registered}\n"
-            f"Вільно: {free}\n\n"
+            f"Вільно: {free}\n"
+            f"Пройшли на вхід (/checkin): {checked_in}\n\n"
 
             f"⛔ У blacklist: {bl_count}\n"
         )
@@ -141,11 +242,11 @@ async def cmd_admin(message: Message):
 
 
 
-    event = db.get_event_info()
-    registered = db.get_current_slots()
-    max_slots = db.get_max_slots()
-    free = db.get_free_slots()
-    bl_count = len(db.get_blacklist())
+    event = await adb.get_event_info()
+    registered = await adb.get_current_slots()
+    max_slots = await adb.get_max_slots()
+    free = await adb.get_free_slots()
+    bl_count = await adb.get_blacklist_count()
 
     event_block = (
         "ℹ️ Дані події ще не задані\n" if not event["place"] else
@@ -167,26 +268,42 @@ async def cmd_admin(message: Message):
         "🎤 Подія:\n"
         "/set_event — задати подію\n"
         "/clear_event — очистити подію\n"
-        "/full_info — повна інформація\n\n"
+        "/reminders — заплановані нагадування гостям\n"
+        "/full_info — повна інформація\n"
+        "/events — усі події\n"
+        "/new_event — створити подію і зробити її активною\n"
+        "/switch_event — перемкнути активну подію\n"
+        "/archive_event — перенести минулу подію в архів\n\n"
 
 
         "🎫 Місця:\n"
         "/set_slots — змінити ліміт місць\n"
         "/set_max_friends — ліміт друзів на гостя\n"
-        "/slots_info — завантаженість\n\n"
+        "/slots_info — завантаженість\n"
+        "/waitlist — черга очікування\n\n"
 
         "👥 Реєстрації:\n"
         "/list_users — список гостей\n"
+        "/find — пошук гостя за ім'ям, @username або іменем друга\n"
         "/remove_user — видалити гостя\n"
         "/clear_all — стерти всі реєстрації\n\n"
 
         "⛔ Blacklist:\n"
         "/blacklist_add — заблокувати\n"
         "/blacklist_remove — розблокувати\n"
-        "/blacklist_list — список blacklist\n\n"
+        "/blacklist_list — список blacklist\n"
+        "/blacklist_import — імпорт списку з файлу\n"
+        "/event_block, /event_allow, /event_reset — винятки для активної події\n"
+        "/event_overrides — список винятків активної події\n\n"
 
         "📦 Інше:\n"
-        "/export — експорт\n"
+        "/export — експорт у CSV (/export xlsx — у Excel)\n"
+        "/qr_prerender — згенерувати QR-коди всім гостям\n"
+        "/broadcast — розсилка всім гостям\n"
+        "/broadcast_status — стан розсилки\n"
+        "/throttle_stats — відкинуті повторні натискання\n"
+        "/metrics — затримка обробників і звернення до сховища\n"
+        "/checkin — режим перевірки QR на вході\n"
     )
 
     await message.answer(text, reply_markup=admin_keyboard, parse_mode="HTML")
@@ -204,31 +321,123 @@ async def process_slots(message: Message, state: FSMContext):
         await message.answer("Введіть число.")
         return
 
-    db.set_max_slots(int(message.text))
+    promoted = await adb.set_max_slots(int(message.text))
+    await notify_promoted(promoted)
 
     await state.clear()
-    await message.answer("✅ Ліміт місць оновлено.")
+    text = "✅ Ліміт місць оновлено."
+    if promoted:
+        text += f"\n⏫ З черги зареєстровано: {len(promoted)}"
+    await message.answer(text)
 
 
 @admin_router.message(F.text.startswith("/slots_info"))
 async def slots_info(message: Message):
     await message.answer(
-        f"👥 Зареєстровано: {db.get_current_slots()}\n"
-        f"🎫 Ліміт: {db.get_max_slots()}\n"
-        f"🟢 Вільно: {db.get_free_slots()}"
+        f"👥 Зайнято (з друзями): {await adb.get_current_slots()}\n"
+        f"🎫 Ліміт: {await adb.get_max_slots()}\n"
+        f"🟢 Вільно: {await adb.get_free_slots()}\n"
+        f"⏳ У черзі: {await adb.get_waitlist_count()}"
     )
 
+
+@admin_router.message(F.text.startswith("/waitlist"))
+async def waitlist_list(message: Message):
+    waitlist = await adb.get_waitlist()
+    if not waitlist:
+        await message.answer("⏳ Черга очікування порожня.")
+        return
+
+    lines = [f"⏳ Черга очікування: {len(waitlist)}", ""]
+    for n, entry in enumerate(waitlist[:50], start=1):
+        lines.append(f"{n}. {entry['name']} | ID {entry['user_id']} | @{entry.get('username')}")
+    if len(waitlist) > 50:
+        lines.append(f"… і ще {len(waitlist) - 50}")
+    await message.answer("\n".join(lines))
+
 # ================= USERS =================
 
+def render_users_page(page):
+    first = page["offset"] + 1
+    last = page["offset"] + len(page["items"])
+    lines = [f"👥 Гості {first}–{last} з {page['total']}", ""]
+
+    for n, (uid, u) in enumerate(page["items"], start=first):
+        lines.append(f"{n}. {u['name']} | ID {uid} | @{u.get('username')}")
+        for friend in u["friends"]:
+            tag = f" (@{friend['username']})" if friend.get("username") else ""
+            lines.append(f"    👤 {friend['name']}{tag}")
+
+    items = page["items"]
+    keyboard = users_page_keyboard(
+        make_page_cursor(*items[0]) if page["has_prev"] else None,
+        make_page_cursor(*items[-1]) if page["has_next"] else None,
+    )
+    return "\n".join(lines), keyboard
+
 @admin_router.message(F.text.startswith("/list_users"))
 async def list_users(message: Message):
-    users = db.get_all_registered()
-    if not users:
+    page = await adb.get_registered_page(limit=LIST_PAGE_SIZE)
+    if not page["items"]:
         await message.answer("Список пустий.")
         return
 
-    text = "\n".join(f"{u['name']} | ID {uid} | @{u.get('username')}" for uid, u in users.items())
-    await message.answer(text)
+    text, keyboard = render_users_page(page)
+    await message.answer(text, reply_markup=keyboard)
+
+@admin_router.callback_query(F.data.startswith("users:"))
+async def list_users_page(callback: CallbackQuery):
+    _, direction, cursor = callback.data.split(":", 2)
+    if direction == "n":
+        page = await adb.get_registered_page(after=cursor, limit=LIST_PAGE_SIZE)
+    else:
+        page = await adb.get_registered_page(before=cursor, limit=LIST_PAGE_SIZE)
+
+    if not page["items"]:
+        await callback.answer("Більше гостей немає.")
+        return
+
+    text, keyboard = render_users_page(page)
+    await callback.message.edit_text(text, reply_markup=keyboard)
+    await callback.answer()
+
+@admin_router.message(F.text.startswith("/find"))
+async def find_guests(message: Message):
+    query = message.text.partition(" ")[2].strip()
+    if not query:
+        await message.answer("Формат: /find ім'я, @username або частина імені (від 3 літер)")
+        return
+
+    results = await adb.find_guests(query, limit=FIND_LIMIT)
+    if not results:
+        await message.answer("🔍 Нічого не знайдено.")
+        return
+
+    lines = [f"🔍 Знайдено: {len(results)}" + (" (перші)" if len(results) == FIND_LIMIT else ""), ""]
+    for n, u in enumerate(results, start=1):
+        lines.append(f"{n}. {u['name']} | ID {u['user_id']} | @{u.get('username')}")
+        for friend in u.get("friends", []):
+            tag = f" (@{friend['username']})" if friend.get("username") else ""
+            lines.append(f"    👤 {friend['name']}{tag}")
+    await message.answer("\n".join(lines), reply_markup=find_results_keyboard(results))
+
+@admin_router.callback_query(F.data.startswith("find:"))
+async def find_guest_action(callback: CallbackQuery):
+    _, action, raw_id = callback.data.split(":", 2)
+    user_id = int(raw_id)
+
+    if action == "rm":
+        if not await adb.is_user_registered(user_id):
+            await callback.answer("Гостя вже немає в списку.", show_alert=True)
+            return
+        promoted = await adb.unregister_user(user_id)
+        qr_cache.invalidate_user(user_id)
+        await notify_promoted(promoted)
+        await callback.answer(f"🗑 Гостя {user_id} видалено.", show_alert=True)
+    else:
+        # як /blacklist_add: реєстрація лишається, видалити — окремою кнопкою
+        await adb.add_to_blacklist(user_id)
+        await callback.answer(f"⛔ {user_id} додано в blacklist.", show_alert=True)
 
 @admin_router.message(F.text.startswith("/remove_user"))
 async def remove_user(message: Message, state: FSMContext):
@@ -240,17 +449,59 @@ async def process_remove_user(message: Message, state: FSMContext):
     if not message.text.isdigit():
         await message.answer("Потрібен числовий ID.")
         return
-    db.unregister_user(int(message.text))
+    promoted = await adb.unregister_user(int(message.text))
+    qr_cache.invalidate_user(int(message.text))
+    await notify_promoted(promoted)
     await state.clear()
     await message.answer("🗑 Користувача видалено.")
 
 @admin_router.message(F.text.startswith("/clear_all"))
 async def clear_all(message: Message):
-    db.clear_all_registrations()
+    # QR-коди лише цієї події: у кеші лежать і коди інших подій
+    users = await adb.get_all_registered()
+    event = await adb.get_current_event()
+    await adb.clear_all_registrations()
+    qr_cache.invalidate_tokens(make_qr_token(int(uid), u, event["id"]) for uid, u in users.items())
     await message.answer("🗑 Усі реєстрації стерто.")
 
 # ================= BLACKLIST =================
-# (без змін, працює і для ID і для @username)
+# працює і для ID і для @username
+
+def parse_blacklist_value(raw: str):
+    value = raw.replace("@", "").strip()
+    try: return int(value)
+    except ValueError: return value.lower()
+
+
+@admin_router.message(F.text.startswith("/event_block"))
+@admin_router.message(F.text.startswith("/event_allow"))
+@admin_router.message(F.text.startswith("/event_reset"))
+async def event_blacklist_override(message: Message):
+    """
+    Винятки з глобального blacklist лише для активної події
+    """
+    command, _, raw = message.text.partition(" ")
+    if not raw.strip():
+        await message.answer(f"Формат: {command} ID або @username")
+        return
+
+    blocked = {"/event_block": True, "/event_allow": False}.get(command)
+    await adb.set_blacklist_override(parse_blacklist_value(raw), blocked)
+    replies = {True: "⛔ Заблоковано на цій події.", False: "✅ Дозволено на цій події.", None: "↩️ Виняток прибрано."}
+    await message.answer(replies[blocked])
+
+@admin_router.message(F.text.startswith("/event_overrides"))
+async def event_blacklist_overrides(message: Message):
+    overrides = await adb.get_blacklist_overrides()
+    if not overrides["block"] and not overrides["allow"]:
+        await message.answer("Винятків для цієї події немає.")
+        return
+    await message.answer(
+        "⛔ Заблоковано лише на цій події:\n" + ("\n".join(map(str, overrides["block"])) or "—")
+        + "\n\n✅ Дозволено попри blacklist:\n" + ("\n".join(map(str, overrides["allow"])) or "—")
+    )
+
+
 @admin_router.message(F.text.startswith("/blacklist_add"))
 async def bl_add(message: Message, state: FSMContext):
     await message.answer("Введіть ID або @username:")
@@ -258,10 +509,8 @@ async def bl_add(message: Message, state: FSMContext):
 
 @admin_router.message(AdminStates.waiting_for_blacklist_add)
 async def bl_add_process(message: Message, state: FSMContext):
-    value = message.text.replace("@", "").strip()
-    try: value = int(value)
-    except: value = value.lower()
-    db.add_to_blacklist(value)
+    value = parse_blacklist_value(message.text)
+    await adb.add_to_blacklist(value)
     await state.clear()
     await message.answer("⛔ Додано в blacklist.")
 
@@ -272,36 +521,154 @@ async def bl_remove(message: Message, state: FSMContext):
 
 @admin_router.message(AdminStates.waiting_for_blacklist_remove)
 async def bl_remove_process(message: Message, state: FSMContext):
-    value = message.text.replace("@", "").strip()
-    try: value = int(value)
-    except: value = value.lower()
-    db.remove_from_blacklist(value)
+    value = parse_blacklist_value(message.text)
+    await adb.remove_from_blacklist(value)
     await state.clear()
     await message.answer("✅ Видалено з blacklist.")
 
 @admin_router.message(F.text.startswith("/blacklist_list"))
 async def bl_list(message: Message):
-    bl = db.get_blacklist()
+    bl = await adb.get_blacklist()
     await message.answer("Blacklist:\n" + "\n".join(map(str, bl)) if bl else "Blacklist порожній.")
 
+@admin_router.message(F.text.startswith("/blacklist_import"))
+async def bl_import(message: Message, state: FSMContext):
+    await message.answer(
+        "Надішліть файл (.txt / .csv) або текст зі списком ID та @username "
+        "(через кому, пробіл або з нового рядка):"
+    )
+    await state.set_state(AdminStates.waiting_for_blacklist_import)
+
+@admin_router.message(AdminStates.waiting_for_blacklist_import)
+async def bl_import_process(message: Message, state: FSMContext):
+    if message.document:
+        file = await message.bot.download(message.document)
+        raw = file.read().decode("utf-8-sig", errors="ignore")
+    else:
+        raw = message.text or ""
+
+    values = [parse_blacklist_value(v) for v in re.split(r"[\s,;]+", raw) if v.strip("@")]
+    added = await adb.add_many_to_blacklist(values)
+
+    await state.clear()
+    await message.answer(f"⛔ Імпортовано в blacklist: {added} (у списку: {len(values)}).")
+
 # ================= EXPORT =================
 
 @admin_router.message(F.text.startswith("/export"))
 async def export_data(message: Message):
-    users = db.get_all_registered()
-    event = db.get_event_info()
+    parts = message.text.split()
+    fmt = parts[1].lower() if len(parts) > 1 else "csv"
+    if fmt not in ("csv", "xlsx"):
+        await message.answer("Формат: /export або /export xlsx")
+        return
+    if fmt == "xlsx" and not xlsx_available():
+        await message.answer("⚠️ XLSX недоступний: встановіть пакет openpyxl. Надсилаю CSV.")
+        fmt = "csv"
+
+    # сторінки — короткими викликами adb, файл — в окремому потоці (export.py)
+    pages = await fetch_export_pages(adb)
+    content = await asyncio.to_thread(build_export, pages, fmt)
+    filename = f"export_{datetime.now():%Y%m%d_%H%M%S}.{fmt}"
+
+    await message.answer_document(BufferedInputFile(content, filename=filename))
+
+    # ================= QR =================
+@admin_router.message(F.text.startswith("/qr_prerender"))
+async def qr_prerender(message: Message):
+    users = await adb.get_all_registered()
+    event = await adb.get_current_event()
+    owners = {make_qr_token(int(uid), u, event["id"]): int(uid) for uid, u in users.items()}
+    tokens = [t for t in owners if not qr_cache.get_file_id(t)]
+
+    await message.answer(f"⏳ Генерую QR-коди: {len(tokens)}...")
+    rendered = await prerender_qr_codes(tokens)
+    for token, png in rendered.items():
+        qr_cache.put_png(token, owners[token], png)
+
+    await message.answer(f"✅ Згенеровано QR-кодів: {len(rendered)}")
+
+    # ================= BROADCAST =================
+@admin_router.message(F.text.startswith("/broadcast_status"))
+async def broadcast_status(message: Message):
+    status = broadcaster.status()
+    if not broadcaster.is_running() or status is None:
+        await message.answer("📣 Активної розсилки немає.")
+        return
+
+    done = status["sent"] + status["failed"]
+    await message.answer(
+        f"📣 Розсилка з {status['started_at']}\n"
+        f"Оброблено: {done}/{status['total']}\n"
+        f"✅ {status['sent']} | ❌ {status['failed']}"
+    )
+
+@admin_router.message(F.text.startswith("/broadcast"))
+async def broadcast_start(message: Message, state: FSMContext):
+    if broadcaster.is_running():
+        await message.answer("⏳ Розсилка вже триває. /broadcast_status — стан.")
+        return
 
-    text = f"ЕКСПОРТ {EVENT_NAME}\n{datetime.now()}\n\n"
-    for uid, u in users.items():
-        text += f"{u['name']} | {uid} | @{u.get('username')}\n"
+    await message.answer("📣 Надішліть повідомлення для розсилки всім гостям (текст, фото тощо):")
+    await state.set_state(AdminStates.waiting_broadcast_message)
 
-    os.makedirs("data", exist_ok=True)
-    filename = "data/export.txt"
-    with open(filename, "w", encoding="utf-8") as f:
-        f.write(text)
+@admin_router.message(AdminStates.waiting_broadcast_message)
+async def broadcast_process(message: Message, state: FSMContext):
+    await state.clear()
+
+    recipients = [int(uid) for uid in await adb.get_all_registered()]
+    if not recipients:
+        await message.answer("Список гостей порожній.")
+        return
+
+    if not broadcaster.start(message.chat.id, message.message_id, recipients):
+        await message.answer("⏳ Розсилка вже триває.")
+        return
 
-    await message.answer_document(FSInputFile(filename))
-    os.remove(filename)
+    await message.answer(f"📣 Розсилку розпочато: {len(recipients)} гостей.")
+
+    # ================= THROTTLING =================
+@admin_router.message(F.text.startswith("/throttle_stats"))
+async def throttle_stats(message: Message):
+    stats = throttling_middleware.stats()
+    await message.answer(
+        f"🚦 Оброблено: {stats['passed']}\n"
+        f"🔁 Відкинуто повторів: {stats['dropped_duplicate']}\n"
+        f"⏱ Відкинуто через ліміт: {stats['dropped_rate']}\n"
+        f"👤 Користувачів у пам'яті: {stats['tracked_users']}"
+    )
+
+    # ================= METRICS =================
+@admin_router.message(F.text.startswith("/metrics"))
+async def show_metrics(message: Message):
+    summary = metrics.summary()
+    storage = summary["storage"]
+
+    lines = [
+        f"📈 Оновлень: {summary['updates']} за {summary['uptime'] / 60:.0f} хв",
+        f"⏱ Оновлення: p50 ≤ {summary['update_p50'] * 1000:g} мс, p99 ≤ {summary['update_p99'] * 1000:g} мс",
+        f"💾 Звернень до сховища на оновлення: {summary['calls_per_update']:.1f} "
+        f"(p99 ≤ {summary['calls_per_update_p99']:g})",
+        f"📦 Байтів сховища на оновлення: {summary['storage_bytes_per_update']:.0f} "
+        f"(p99 ≤ {summary['storage_bytes_per_update_p99']:g})",
+        f"✉️ Розмір оновлення: {summary['update_size']:.0f} Б "
+        f"(p99 ≤ {summary['update_size_p99']:g})",
+        "",
+        "<b>Обробники (найповільніші за p99):</b>",
+    ]
+    for row in summary["handlers"]:
+        lines.append(
+            f"• {row['name']}: {row['count']} × {row['mean'] * 1000:.1f} мс, "
+            f"p99 ≤ {row['p99'] * 1000:g} мс"
+        )
+
+    lines += ["", "<b>Сховище:</b>"]
+    for kind, value in sorted(storage.items()):
+        if kind.startswith("bytes_"):
+            value = f"{value / 1024:.0f} КБ"
+        lines.append(f"• {kind}: {value}")
+
+    await message.answer("\n".join(lines), parse_mode="HTML")
 
     # ================= Friends =================
 @admin_router.message(F.text.startswith("/set_max_friends"))
@@ -311,5 +678,54 @@ async def set_max_friends(message: Message):
         await message.answer("Формат: /set_max_friends 3")
         return
 
-    db.set_max_friends(int(parts[1]))
+    await adb.set_max_friends(int(parts[1]))
     await message.answer("✅ Ліміт друзів встановлено.")
+
+
+    # ================= CHECK-IN =================
+@admin_router.message(F.text.startswith("/checkin"))
+async def checkin_start(message: Message, state: FSMContext):
+    await state.set_state(AdminStates.checkin_mode)
+    hint = "фото QR-коду або токен текстом" if qr_decoding_available() else "токен з QR-коду текстом"
+    await message.answer(
+        f"🚪 Режим входу. Надсилайте {hint} — по одному на гостя.\n"
+        "Вийти: ❌ Cancel",
+        reply_markup=admin_keyboard
+    )
+
+@admin_router.message(AdminStates.checkin_mode)
+async def checkin_process(message: Message):
+    if message.photo:
+        if not qr_decoding_available():
+            await message.answer("⚠️ Розпізнавання фото недоступне (потрібен opencv-python). Надішліть токен текстом.")
+            return
+        photo = await message.bot.download(message.photo[-1])
+        token = await read_qr_from_photo(photo.read())
+        if not token:
+            await message.answer("⚠️ QR-код на фото не знайдено. Спробуйте ще раз.")
+            return
+    elif message.text:
+        token = message.text.strip()
+    else:
+        return
+
+    # підпис перевіряється без звернення до бази
+    event = await adb.get_current_event()
+    claims = verify_qr_token(token, event=event["id"])
+    if claims is None:
+        await message.answer("❌ Недійсний QR-код (підпис не збігається або інша подія).")
+        return
+
+    result = await adb.check_in(claims["user_id"], claims["nonce"])
+    status = result["status"]
+
+    if status == "unknown":
+        await message.answer("❓ Реєстрацію за цим QR-кодом скасовано.")
+        return
+
+    who = result["name"] + (f" (@{result['username']})" if result.get("username") else "")
+    if status == "already":
+        await message.answer(f"⛔ Вже пройшов(ла) о {result['checked_in_at']}: {who}")
+        return
+
+    await message.answer(f"✅ {who}\n👥 Друзів: {result['friends']}")
@@ -1,14 +1,20 @@
+import asyncio
+import logging
+
 from aiogram import Router, F
 from aiogram.filters import Command
-from aiogram.types import Message, FSInputFile
+from aiogram.types import Message, BufferedInputFile
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 
-from qr_utils import generate_qr_image
-from database import db
-from config import MESSAGES, EVENT_NAME
+from qr_utils import generate_qr_png, make_qr_token, qr_cache
+from database import adb
+from broadcast import send_queue, escape_markdown
+from config import MESSAGES, SLOT_HOLD_TTL
 from keyboards import user_keyboard, confirm_keyboard, yes_no_keyboard
 
+logger = logging.getLogger(__name__)
+
 user_router = Router()
 
 
@@ -26,13 +32,19 @@ class RegistrationStates(StatesGroup):
 @user_router.message(F.text == "⬅️ Назад")
 async def cmd_start(message: Message, state: FSMContext):
     await state.clear()
-    await message.answer(MESSAGES["welcome"], reply_markup=user_keyboard, parse_mode="Markdown")
+    # реєстрацію перервано — утримані місця повертаються
+    await notify_promoted(await adb.release_hold(message.from_user.id))
+    event = await adb.get_current_event()
+    await message.answer(
+        MESSAGES["welcome"].format(event=escape_markdown(event["name"])),
+        reply_markup=user_keyboard, parse_mode="Markdown"
+    )
 
 
 # EVENT INFO
-@user_router.message(F.text == "ℹ️ Інформація про подію")
+@user_router.message(F.text == "ℹ️ Інформація про подію", flags={"throttling": "expensive"})
 async def event_info_user(message: Message):
-    info = db.get_event_info()
+    info = await adb.get_event_info()
 
     if not info["place"] and not info["time"] and not info["price"]:
         await message.answer("ℹ️ Організатори ще не оголосили деталі на рахунок наступної події")
@@ -44,7 +56,7 @@ async def event_info_user(message: Message):
         f"📍 Місце: {info['place'] or 'ще не вказано'}\n"
         f"🕒 Час: {info['time'] or 'ще не вказано'}\n"
         f"💰 Ціна: {info['price'] or 'не вказано'}\n\n"
-        f"🎫 Вільних місць: {db.get_free_slots()}"
+        f"🎫 Вільних місць: {await adb.get_free_slots()}"
     )
 
     await message.answer(text)
@@ -54,16 +66,22 @@ async def event_info_user(message: Message):
 @user_router.message(Command("register"))
 @user_router.message(F.text == "📝 Реєстрація")
 async def cmd_register(message: Message, state: FSMContext):
-    if db.is_in_blacklist(message.from_user.id):
+    if await adb.is_in_blacklist(message.from_user.id):
         await message.answer(MESSAGES["blacklist"])
         return
 
-    if db.is_user_registered(message.from_user.id):
+    if await adb.is_user_registered(message.from_user.id):
         await message.answer("ℹ️ Ви вже зареєстровані.")
         return
 
-    if not db.has_free_slots():
-        await message.answer(MESSAGES["no_slots"])
+    if not await adb.has_free_slots():
+        position = await adb.get_waitlist_position(message.from_user.id)
+        if position:
+            await message.answer(MESSAGES["waitlist_position"].format(position=position))
+            return
+        # замість повторних натискань "Реєстрація" — черга з автоматичним переведенням
+        await message.answer(MESSAGES["waitlist_offer"])
+        await state.set_state(RegistrationStates.waiting_for_name)
         return
 
     await message.answer("✍️ Введіть ваше імʼя та прізвище:")
@@ -78,56 +96,151 @@ async def process_name(message: Message, state: FSMContext):
         await message.answer(MESSAGES["invalid_name"])
         return
 
-    success = db.register_user(message.from_user.id, name, message.from_user.username)
-    if not success:
-        await message.answer("❌ Помилка реєстрації.")
-        await state.clear()
+    if not await adb.has_free_slots():
+        await join_waitlist(message, state, name)
         return
 
-    await state.update_data(main_name=name)
+    await state.update_data(main_name=name, friends=[])
 
-    max_friends = db.get_max_friends()
+    max_friends = await adb.get_max_friends()
 
     if max_friends > 0:
+        # місце гостя утримується, поки він вводить дані друзів
+        if not await adb.hold_slots(message.from_user.id, 1):
+            await join_waitlist(message, state, name)
+            return
         await message.answer(
             "👥 Хочете привести друзів?",
             reply_markup=yes_no_keyboard
         )
         await state.set_state(RegistrationStates.ask_about_friends)
     else:
+        await complete_registration(message, state)
+
+
+async def join_waitlist(message: Message, state: FSMContext, name: str):
+    result = await adb.join_waitlist(message.from_user.id, name, message.from_user.username)
+    position = result["position"]
+    await notify_promoted(p for p in result["promoted"] if p["user_id"] != message.from_user.id)
+
+    if position is None:
+        await message.answer("❌ Помилка реєстрації.", reply_markup=user_keyboard)
+        await state.clear()
+    elif position == 0:
+        # поки людина вводила ім'я, місце звільнилося
+        await state.update_data(main_name=name)
         await finish_registration(message, state)
+    else:
+        await message.answer(MESSAGES["waitlist_joined"].format(position=position), reply_markup=user_keyboard)
+        await state.clear()
+
+
+async def expire_holds_loop():
+    """
+    Знімає прострочені утримання місць у момент спливання
+    (чекає до найближчого строку з купи, без періодичного перегляду)
+    """
+    while True:
+        try:
+            # через adb: купа утримань змінюється в потоці сховища
+            delay = await adb.seconds_to_next_expiry()
+        except Exception:
+            logger.exception("Помилка читання утримань місць")
+            delay = None
+        # нове утримання спливе не раніше ніж через SLOT_HOLD_TTL
+        await asyncio.sleep(SLOT_HOLD_TTL if delay is None else delay)
+        try:
+            await notify_promoted(await adb.expire_holds())
+        except Exception:
+            logger.exception("Помилка зняття утримань місць")
+
+
+async def notify_promoted(promoted):
+    """
+    Сповіщення гостям, яких перевели з черги (через чергу відправлення)
+    """
+    promoted = list(promoted)
+    if not promoted:
+        return
+
+    event = await adb.get_current_event()
+    for guest in promoted:
+        send_queue.enqueue(
+            guest["user_id"],
+            MESSAGES["waitlist_promoted"].format(
+                event=escape_markdown(event["name"]), name=escape_markdown(guest["name"])
+            ),
+            parse_mode="Markdown"
+        )
+
+
+async def complete_registration(message: Message, state: FSMContext):
+    """
+    Записує гостя разом з друзями однією атомарною операцією
+    """
+    data = await state.get_data()
+
+    success = await adb.register_user(
+        message.from_user.id,
+        data["main_name"],
+        message.from_user.username,
+        friends=data.get("friends", [])
+    )
+    if not success:
+        await message.answer(
+            "❌ Не вдалося завершити реєстрацію: місць уже немає або час броні вийшов.",
+            reply_markup=user_keyboard
+        )
+        await state.clear()
+        return
+
+    await finish_registration(message, state)
 
 
 async def finish_registration(message: Message, state: FSMContext):
     data = await state.get_data()
     name = data.get("main_name")
 
-    token = f"{message.from_user.id}:{EVENT_NAME}"
-    qr_path = generate_qr_image(token, message.from_user.id)
-
+    event = await adb.get_current_event()
     await message.answer(
-        MESSAGES["registered"].format(event=EVENT_NAME, name=name),
+        MESSAGES["registered"].format(event=event["name"], name=name),
         reply_markup=user_keyboard
     )
 
-    await message.answer_photo(
-        FSInputFile(qr_path),
-        caption="🎫 Ваш QR-код для входу. Збережіть його."
-    )
+    registration = await adb.get_registration(message.from_user.id)
+    await send_qr(message, registration, caption="🎫 Ваш QR-код для входу. Збережіть його.")
 
     await state.clear()
 
+
+async def send_qr(message: Message, registration: dict, caption: str):
+    """
+    Надсилає QR-код: з кешу за file_id, а якщо його ще нема —
+    генерує картинку один раз і запам'ятовує file_id від Telegram
+    """
+    user_id = message.from_user.id
+    event = await adb.get_current_event()
+    token = make_qr_token(user_id, registration, event["id"])
+
+    file_id = qr_cache.get_file_id(token)
+    if file_id:
+        await message.answer_photo(file_id, caption=caption)
+        return
+
+    png = qr_cache.take_png(token) or await generate_qr_png(token)
+    sent = await message.answer_photo(BufferedInputFile(png, filename="qr.png"), caption=caption)
+    qr_cache.set_file_id(token, user_id, sent.photo[-1].file_id)
+
 # ===== FRIENDS SYSTEM =====
 
 @user_router.message(RegistrationStates.ask_about_friends, F.text == "Ні")
 async def no_friends(message: Message, state: FSMContext):
-    await state.clear()
-    await message.answer("✅ Реєстрацію завершено.", reply_markup=user_keyboard)
+    await complete_registration(message, state)
 
 
 @user_router.message(RegistrationStates.ask_about_friends, F.text == "Так")
 async def ask_friend_count(message: Message, state: FSMContext):
-    max_friends = db.get_max_friends()
+    max_friends = await adb.get_max_friends()
     await message.answer(f"Скільки друзів приведете? (максимум {max_friends})")
     await state.set_state(RegistrationStates.waiting_friend_count)
 
@@ -139,15 +252,15 @@ async def process_friend_count(message: Message, state: FSMContext):
         return
 
     count = int(message.text)
-    max_friends = db.get_max_friends()
+    max_friends = await adb.get_max_friends()
 
     if count < 1 or count > max_friends:
         await message.answer("Невірна кількість.")
         return
 
-    if db.get_free_slots() < count:
-        await message.answer("Недостатньо вільних місць.")
-        await state.clear()
+    # утримання гостя розширюється на друзів — на час введення їхніх даних
+    if not await adb.hold_slots(message.from_user.id, 1 + count):
+        await message.answer("Недостатньо вільних місць. Введіть меншу кількість.")
         return
 
     await state.update_data(friends_total=count, current_friend=1)
@@ -170,18 +283,15 @@ async def process_friend_username(message: Message, state: FSMContext):
     if username == "-":
         username = None
 
-    db.add_friend_to_user(
-        user_id=message.from_user.id,
-        name=data["friend_name"],
-        username=username
-    )
+    friends = data.get("friends", []) + [{"name": data["friend_name"], "username": username}]
+    await state.update_data(friends=friends)
 
     current = data["current_friend"]
     total = data["friends_total"]
 
     if current >= total:
         await message.answer("✅ Усі друзі додані!")
-        await finish_registration(message, state)
+        await complete_registration(message, state)
         return
 
     await state.update_data(current_friend=current + 1)
@@ -190,26 +300,29 @@ async def process_friend_username(message: Message, state: FSMContext):
 
 
 # MY QR
-@user_router.message(F.text == "🎫 Мій QR")
+@user_router.message(F.text == "🎫 Мій QR", flags={"throttling": "expensive"})
 async def cmd_my_qr(message: Message):
-    if not db.is_user_registered(message.from_user.id):
+    registration = await adb.get_registration(message.from_user.id)
+    if not registration:
         await message.answer("ℹ️ Ви ще не зареєстровані.")
         return
 
-    token = f"{message.from_user.id}:{EVENT_NAME}"
-    qr_path = generate_qr_image(token, message.from_user.id)
-
-    await message.answer_photo(FSInputFile(qr_path), caption="🎫 Ось ваш QR-код для входу.")
+    await send_qr(message, registration, caption="🎫 Ось ваш QR-код для входу.")
 
 
 # STATUS
-@user_router.message(Command("status"))
-@user_router.message(F.text == "📋 Мій статус")
+@user_router.message(Command("status"), flags={"throttling": "expensive"})
+@user_router.message(F.text == "📋 Мій статус", flags={"throttling": "expensive"})
 async def cmd_status(message: Message):
-    if db.is_user_registered(message.from_user.id):
-        user_info = db.get_all_registered()[str(message.from_user.id)]
+    user_info = await adb.get_registration(message.from_user.id)
+    if user_info:
         friends = user_info.get("friends", [])
         await message.answer(f"✅ Ви зареєстровані як {user_info['name']}\n👥 Друзів: {len(friends)}")
+        return
+
+    position = await adb.get_waitlist_position(message.from_user.id)
+    if position:
+        await message.answer(MESSAGES["waitlist_position"].format(position=position))
     else:
         await message.answer("ℹ️ Ви ще не зареєстровані.")
 
@@ -219,11 +332,14 @@ async def cmd_status(message: Message):
 @user_router.message(F.text == "❌ Скасувати бронь")
 async def ask_unregister_confirm(message: Message, state: FSMContext):
 
-    if not db.is_unregister_allowed():
+    if not await adb.is_unregister_allowed():
         await message.answer("🚫 Зараз скасування броні вимкнене адміністратором.")
         return
 
-    if not db.is_user_registered(message.from_user.id):
+    if not await adb.is_user_registered(message.from_user.id):
+        if await adb.leave_waitlist(message.from_user.id):
+            await message.answer("❌ Вас прибрано з черги очікування.")
+            return
         await message.answer("ℹ️ Ви не маєте активної реєстрації.")
         return
 
@@ -233,7 +349,9 @@ async def ask_unregister_confirm(message: Message, state: FSMContext):
 
 @user_router.message(RegistrationStates.confirm_unregister, F.text == "✅ Так")
 async def confirm_yes(message: Message, state: FSMContext):
-    db.unregister_user(message.from_user.id)
+    promoted = await adb.unregister_user(message.from_user.id)
+    qr_cache.invalidate_user(message.from_user.id)
+    await notify_promoted(promoted)
     await message.answer("❌ Вашу бронь скасовано.", reply_markup=user_keyboard)
     await state.clear()
 
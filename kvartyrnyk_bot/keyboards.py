@@ -1,4 +1,4 @@
-from aiogram.types import ReplyKeyboardMarkup, KeyboardButton
+from aiogram.types import ReplyKeyboardMarkup, KeyboardButton, InlineKeyboardMarkup, InlineKeyboardButton
 
 # ===== USER =====
 user_keyboard = ReplyKeyboardMarkup(
@@ -36,3 +36,29 @@ admin_keyboard = ReplyKeyboardMarkup(
     ],
     resize_keyboard=True
 )
+
+
+def users_page_keyboard(prev_cursor: str | None, next_cursor: str | None):
+    """
+    Кнопки гортання /list_users (курсор — ключ крайнього гостя на сторінці)
+    """
+    row = []
+    if prev_cursor:
+        row.append(InlineKeyboardButton(text="⬅️ Назад", callback_data=f"users:p:{prev_cursor}"))
+    if next_cursor:
+        row.append(InlineKeyboardButton(text="Далі ➡️", callback_data=f"users:n:{next_cursor}"))
+    return InlineKeyboardMarkup(inline_keyboard=[row]) if row else None
+
+
+def find_results_keyboard(results):
+    """
+    Кнопки під результатами /find: видалити гостя або заблокувати його
+    """
+    rows = [
+        [
+            InlineKeyboardButton(text=f"🗑 {guest['name'][:24]}", callback_data=f"find:rm:{guest['user_id']}"),
+            InlineKeyboardButton(text="⛔ у blacklist", callback_data=f"find:bl:{guest['user_id']}"),
+        ]
+        for guest in results
+    ]
+    return InlineKeyboardMarkup(inline_keyboard=rows) if rows else None
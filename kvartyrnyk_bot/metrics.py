@@ -0,0 +1,274 @@
+"""
+Метрики бота: затримка обробників і звернення до сховища.
+
+- Затримка кожного обробника — гістограма з фіксованими межами
+  (запис — один bisect і два додавання, тож метрики можна не вимикати).
+- Звернення до сховища рахують самі сховища через storage_call():
+  загальні лічильники + лічильники поточного оновлення (contextvar),
+  з яких складаються розподіли "звернень" і "байтів сховища на одне
+  оновлення". Читання з кешу в пам'яті (cache_hit) — не звернення.
+- Розмір самого оновлення: вебхук передає довжину тіла запиту,
+  при polling — довжина серіалізованого Update.
+- Перегляд: /metrics в адмінці; METRICS_PORT > 0 — ще й текстовий
+  формат Prometheus на http://METRICS_HOST:METRICS_PORT/metrics.
+"""
+
+import bisect
+import contextvars
+import time
+from collections import Counter
+from typing import Any, Awaitable, Callable
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+# межі кошиків затримки, секунди
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# межі кошиків "звернень до сховища на оновлення"
+CALLS_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55)
+# межі кошиків розмірів: оновлення і байти сховища на оновлення
+BYTES_BUCKETS = (0, 256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+# лічильники оновлення, що обробляється зараз (None — поза оновленням)
+_update_calls = contextvars.ContextVar("update_storage_calls", default=None)
+
+
+class UpdateStorageStats:
+    __slots__ = ("calls", "bytes")
+
+    def __init__(self):
+        self.calls = 0
+        self.bytes = 0
+
+
+class Histogram:
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)   # останній — понад найбільшу межу
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float):
+        """
+        Оцінка квантиля — верхня межа кошика, в який він потрапляє
+        """
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, n in zip(self.buckets, self.counts):
+            seen += n
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+    def mean(self):
+        return self.sum / self.count if self.count else 0.0
+
+
+class Metrics:
+
+    def __init__(self):
+        self.started_at = time.time()
+        self.handlers = {}                       # ім'я обробника → Histogram
+        self.updates = Histogram()               # повна обробка оновлення
+        self.update_calls = Histogram(CALLS_BUCKETS)
+        self.update_storage_bytes = Histogram(BYTES_BUCKETS)
+        self.update_size = Histogram(BYTES_BUCKETS)  # байтів в оновленні від Telegram
+        self.storage = Counter()                 # "load", "cache_hit", "save", "bytes_written", ...
+
+    def observe_handler(self, name: str, seconds: float):
+        histogram = self.handlers.get(name)
+        if histogram is None:
+            histogram = self.handlers[name] = Histogram()
+        histogram.observe(seconds)
+
+    def storage_call(self, kind: str, nbytes: int = 0):
+        """
+        Викликається сховищем: kind — "load" (читання файлу) / "save" /
+        "journal_append" / "sql_read" / "sql_write"; nbytes — прочитано або записано
+        """
+        self.storage[kind] += 1
+        if nbytes:
+            self.storage["bytes_read" if kind == "load" else "bytes_written"] += nbytes
+
+        stats = _update_calls.get()
+        if stats is not None:
+            stats.calls += 1
+            stats.bytes += nbytes
+
+    def cache_hit(self):
+        """
+        Дані віддано з кешу в пам'яті — до звернень оновлення не входить
+        """
+        self.storage["cache_hit"] += 1
+
+    def reset(self):
+        self.__init__()
+
+    # ===== ВИВІД =====
+
+    def summary(self, top: int = 10):
+        """
+        Дані для /metrics: найповільніші обробники (за p99), сховище
+        """
+        handlers = sorted(
+            (
+                {"name": name, "count": h.count, "mean": h.mean(),
+                 "p50": h.quantile(0.5), "p99": h.quantile(0.99)}
+                for name, h in self.handlers.items()
+            ),
+            key=lambda row: (row["p99"], row["mean"]), reverse=True,
+        )
+        return {
+            "uptime": time.time() - self.started_at,
+            "updates": self.updates.count,
+            "update_p50": self.updates.quantile(0.5),
+            "update_p99": self.updates.quantile(0.99),
+            "calls_per_update": self.update_calls.mean(),
+            "calls_per_update_p99": self.update_calls.quantile(0.99),
+            "storage_bytes_per_update": self.update_storage_bytes.mean(),
+            "storage_bytes_per_update_p99": self.update_storage_bytes.quantile(0.99),
+            "update_size": self.update_size.mean(),
+            "update_size_p99": self.update_size.quantile(0.99),
+            "handlers": handlers[:top],
+            "storage": dict(self.storage),
+        }
+
+    def prometheus(self, extra_counters: dict = None) -> str:
+        """
+        Текстовий формат Prometheus (exposition format 0.0.4)
+        """
+        lines = []
+
+        def histogram(name, h, labels=""):
+            sep = "," if labels else ""
+            seen = 0
+            for bound, n in zip(h.buckets, h.counts):
+                seen += n
+                lines.append(f'{name}_bucket{{{labels}{sep}le="{bound}"}} {seen}')
+            lines.append(f'{name}_bucket{{{labels}{sep}le="+Inf"}} {h.count}')
+            suffix = f"{{{labels}}}" if labels else ""
+            lines.append(f"{name}_sum{suffix} {h.sum}")
+            lines.append(f"{name}_count{suffix} {h.count}")
+
+        name = "kvartyrnyk_handler_latency_seconds"
+        lines += [f"# HELP {name} Затримка обробників", f"# TYPE {name} histogram"]
+        for handler, h in sorted(self.handlers.items()):
+            histogram(name, h, f'handler="{handler}"')
+
+        name = "kvartyrnyk_update_latency_seconds"
+        lines += [f"# HELP {name} Повна обробка оновлення", f"# TYPE {name} histogram"]
+        histogram(name, self.updates)
+
+        name = "kvartyrnyk_storage_calls_per_update"
+        lines += [f"# HELP {name} Звернень до сховища на одне оновлення", f"# TYPE {name} histogram"]
+        histogram(name, self.update_calls)
+
+        name = "kvartyrnyk_storage_bytes_per_update"
+        lines += [f"# HELP {name} Байтів прочитано і записано сховищем за оновлення",
+                  f"# TYPE {name} histogram"]
+        histogram(name, self.update_storage_bytes)
+
+        name = "kvartyrnyk_update_size_bytes"
+        lines += [f"# HELP {name} Розмір оновлення від Telegram", f"# TYPE {name} histogram"]
+        histogram(name, self.update_size)
+
+        name = "kvartyrnyk_storage_total"
+        lines += [f"# HELP {name} Звернення до сховища і байти", f"# TYPE {name} counter"]
+        for kind, value in sorted(self.storage.items()):
+            lines.append(f'{name}{{kind="{kind}"}} {value}')
+
+        for key, value in sorted((extra_counters or {}).items()):
+            name = f"kvartyrnyk_{key}"
+            lines += [f"# TYPE {name} gauge", f"{name} {value}"]
+
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+
+
+class UpdateMetricsMiddleware(BaseMiddleware):
+    """
+    Зовнішній middleware на dp.update: час усього оновлення, його розмір
+    і скільки разів (і скільки байтів) за нього зверталися до сховища
+    """
+
+    def __init__(self, registry: Metrics = metrics):
+        self.registry = registry
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        # вебхук знає довжину тіла запиту; при polling сирих байтів немає
+        size = data.get("update_size")
+        if size is None:
+            size = len(event.model_dump_json(exclude_none=True))
+        self.registry.update_size.observe(size)
+
+        stats = UpdateStorageStats()
+        token = _update_calls.set(stats)
+        start = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            self.registry.updates.observe(time.perf_counter() - start)
+            self.registry.update_calls.observe(stats.calls)
+            self.registry.update_storage_bytes.observe(stats.bytes)
+            _update_calls.reset(token)
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """
+    Внутрішній middleware: затримка конкретного обробника
+    (реєструється після throttling — відкинуті оновлення не рахуються)
+    """
+
+    def __init__(self, registry: Metrics = metrics):
+        self.registry = registry
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        handler_object = data.get("handler")
+        name = getattr(handler_object.callback, "__name__", "unknown") if handler_object else "unknown"
+        start = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            self.registry.observe_handler(name, time.perf_counter() - start)
+
+
+update_metrics_middleware = UpdateMetricsMiddleware()
+handler_metrics_middleware = HandlerMetricsMiddleware()
+
+
+async def start_metrics_server(host: str, port: int, extra: Callable[[], dict] = None):
+    """
+    Окремий aiohttp-сервер з GET /metrics для Prometheus. Повертає runner (для cleanup()).
+    """
+    from aiohttp import web
+
+    async def handle(request: web.Request) -> web.Response:
+        text = metrics.prometheus(extra() if extra else None)
+        return web.Response(text=text, content_type="text/plain", charset="utf-8")
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
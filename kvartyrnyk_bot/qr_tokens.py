@@ -0,0 +1,119 @@
+"""
+Підписані QR-токени: user_id, подія і кількість друзів + HMAC-підпис.
+
+Перевірка — лише обчислення, без звернення до сховища, тож сканер на вході
+працює і офлайн (наприклад, на ноутбуці зі знімком бази):
+    python qr_tokens.py verify TOKEN [TOKEN ...] [--event 1] [--snapshot data/events/1.json]
+
+Формат: "{id ключа}.{дані base64url}.{підпис base64url}",
+дані — "{user_id}|{друзів}|{qr_token реєстрації}|{id події}".
+"""
+
+import base64
+import hashlib
+import hmac
+
+from config import QR_SIGNING_KEYS, QR_ACTIVE_KEY, QR_SECRET_PLACEHOLDER
+
+SIGNATURE_BYTES = 16
+
+
+def check_signing_keys(keys: dict = QR_SIGNING_KEYS):
+    """
+    Відмовляє, якщо ключ порожній або лишився заглушкою з config.py —
+    такими кодами будь-хто зміг би підробити вхідний QR
+    """
+    for key_id, secret in keys.items():
+        if not secret or secret == QR_SECRET_PLACEHOLDER:
+            raise ValueError(f"Ключ підпису QR «{key_id}» не задано або це заглушка: вкажіть QR_SECRET")
+
+
+def _b64encode(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode("ascii")
+
+
+def _b64decode(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+def _sign(key_id: str, payload: bytes, keys: dict) -> bytes:
+    message = key_id.encode("ascii") + b"." + payload
+    return hmac.new(keys[key_id].encode("utf-8"), message, hashlib.sha256).digest()[:SIGNATURE_BYTES]
+
+
+def sign_qr_token(user_id: int, friends: int, nonce: str, event: str,
+                  key_id: str = QR_ACTIVE_KEY, keys: dict = QR_SIGNING_KEYS) -> str:
+    payload = f"{user_id}|{friends}|{nonce}|{event}".encode("utf-8")
+    return f"{key_id}.{_b64encode(payload)}.{_b64encode(_sign(key_id, payload, keys))}"
+
+
+def verify_qr_token(token: str, event: str | None = None, keys: dict = QR_SIGNING_KEYS):
+    """
+    Перевіряє підпис і (якщо задано) подію.
+    Повертає {"user_id", "friends", "nonce", "event", "key_id"} або None.
+    """
+    try:
+        key_id, payload_b64, signature_b64 = token.strip().split(".")
+        if key_id not in keys:
+            return None
+        payload = _b64decode(payload_b64)
+        if not hmac.compare_digest(_b64decode(signature_b64), _sign(key_id, payload, keys)):
+            return None
+        user_id, friends, nonce, token_event = payload.decode("utf-8").split("|", 3)
+        claims = {
+            "user_id": int(user_id),
+            "friends": int(friends),
+            "nonce": nonce,
+            "event": token_event,
+            "key_id": key_id,
+        }
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+    if event is not None and token_event != event:
+        return None
+    return claims
+
+
+def main(argv=None):
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="Офлайн-перевірка QR-токенів")
+    sub = parser.add_subparsers(dest="command", required=True)
+    verify = sub.add_parser("verify")
+    verify.add_argument("tokens", nargs="+")
+    verify.add_argument("--event", help="id події, для якої перевіряти коди")
+    verify.add_argument("--snapshot", help="знімок JSON-бази, щоб показати імена")
+    args = parser.parse_args(argv)
+
+    try:
+        check_signing_keys()
+    except ValueError as e:
+        parser.exit(1, f"❌ {e}\n")
+
+    users = {}
+    if args.snapshot:
+        with open(args.snapshot, 'r', encoding='utf-8') as f:
+            users = json.load(f).get("registered_users", {})
+
+    for token in args.tokens:
+        claims = verify_qr_token(token, event=args.event)
+        if claims is None:
+            print(f"❌ {token[:24]}… — недійсний підпис або інша подія")
+            continue
+
+        line = f"✅ подія {claims['event']} user_id={claims['user_id']} друзів={claims['friends']}"
+        user = users.get(str(claims["user_id"]))
+        if args.snapshot:
+            if user is None or user.get("qr_token") != claims["nonce"]:
+                line = f"❓ user_id={claims['user_id']} — реєстрацію скасовано"
+            else:
+                line += f" {user['name']}"
+                if user.get("checked_in_at"):
+                    line += f" (вже пройшов о {user['checked_in_at']})"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
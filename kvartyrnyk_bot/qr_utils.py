@@ -1,24 +1,231 @@
+import asyncio
+import io
+import json
+import multiprocessing
 import os
+from concurrent.futures import ProcessPoolExecutor
+
 import qrcode
 
+try:
+    import cv2
+    import numpy as np
+except ImportError:  # розпізнавання QR з фото — необов'язкове
+    cv2 = None
+
+from config import QR_CACHE_PATH, QR_POOL_WORKERS
+from qr_tokens import sign_qr_token
+
+
+def make_qr_token(user_id: int, registration: dict, event_id: str) -> str:
+    """
+    Вміст QR-коду гостя — підписаний токен (див. qr_tokens.py)
+    """
+    return sign_qr_token(user_id, len(registration.get("friends", [])), registration["qr_token"], event_id)
+
+
+def render_qr_png(token: str) -> bytes:
+    """
+    Генерує QR-картинку і повертає PNG у байтах (без файлів на диску).
+    Виконується в процесі пулу — це CPU-робота Pillow.
+    """
+    buffer = io.BytesIO()
+    qrcode.make(token).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def render_qr_batch(tokens: list) -> list:
+    return [render_qr_png(token) for token in tokens]
+
+
+def qr_decoding_available() -> bool:
+    return cv2 is not None
+
+
+def decode_qr_image(image: bytes):
+    """
+    Читає QR-код з фото (потрібен opencv-python). Виконується в пулі процесів.
+    """
+    if cv2 is None:
+        return None
+    img = cv2.imdecode(np.frombuffer(image, np.uint8), cv2.IMREAD_COLOR)
+    if img is None:
+        return None
+    text, _, _ = cv2.QRCodeDetector().detectAndDecode(img)
+    return text or None
+
+
+async def read_qr_from_photo(image: bytes):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_qr_pool(), decode_qr_image, image)
+
+
+_pool = None
+
+
+def get_qr_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        # не fork: у процесі вже працюють потоки (db-writer, компакція журналу,
+        # скидання FSM), і дочірній процес міг би успадкувати захоплений ними замок
+        method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+        _pool = ProcessPoolExecutor(max_workers=QR_POOL_WORKERS, mp_context=multiprocessing.get_context(method))
+    return _pool
+
+
+def start_qr_pool():
+    """
+    Запускає пул під час старту бота, щоб перший QR не чекав на процеси
+    """
+    get_qr_pool().submit(render_qr_batch, [])
 
-QR_DIR = "qr"
 
+def shutdown_qr_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=True)
+        _pool = None
 
-def ensure_qr_dir():
-    os.makedirs(QR_DIR, exist_ok=True)
 
+async def generate_qr_png(token: str) -> bytes:
+    """
+    Генерує QR у пулі процесів, не блокуючи цикл подій
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_qr_pool(), render_qr_png, token)
 
-def generate_qr_image(token: str, user_id: int) -> str:
+
+async def prerender_qr_codes(tokens: list, chunk_size: int = 50) -> dict:
     """
-    Генерує QR-картинку для користувача
-    Повертає шлях до файлу
+    Пакетна генерація (наприклад, перед відкриттям дверей):
+    токени діляться на частини, які паралельно рендерять процеси пулу.
+    Повертає token → PNG.
     """
-    ensure_qr_dir()
+    loop = asyncio.get_running_loop()
+    pool = get_qr_pool()
+    chunks = [tokens[i:i + chunk_size] for i in range(0, len(tokens), chunk_size)]
+
+    results = await asyncio.gather(*(
+        loop.run_in_executor(pool, render_qr_batch, chunk) for chunk in chunks
+    ))
+
+    rendered = {}
+    for chunk, images in zip(chunks, results):
+        rendered.update(zip(chunk, images))
+    return rendered
+
+
+class QRCache:
+    """
+    Кеш надісланих QR-кодів: token → file_id, який Telegram повернув
+    після першого answer_photo. Далі фото надсилається за file_id —
+    без генерації картинки і без повторного завантаження.
+
+    На диску — журнал JSON-рядків (дописується, а не переписується),
+    який зводиться під час першого звернення.
+    Попередньо згенеровані PNG (ще без file_id) тримаються лише в пам'яті.
+    """
+
+    def __init__(self, path: str = QR_CACHE_PATH):
+        self.path = path
+        self._entries = {}   # token → {"user_id": ..., "file_id": ...}
+        self._by_user = {}   # user_id → token
+        self._png = {}       # token → PNG, згенерований заздалегідь
+        self._png_tokens = {}  # user_id → token попередньо згенерованого PNG
+        self._loaded = False
+
+    def _load(self):
+        if self._loaded:
+            return
+        self._loaded = True
+
+        if not os.path.exists(self.path):
+            return
+
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if "file_id" in record:
+                    self._put(record["token"], record["user_id"], record["file_id"])
+                elif "token" in record:
+                    self._drop_token(record["token"])
+                else:
+                    self._drop(record["user_id"])
+
+        # зводимо журнал до актуальних записів
+        with open(self.path, 'w', encoding='utf-8') as f:
+            for token, entry in self._entries.items():
+                f.write(json.dumps({"token": token, **entry}, ensure_ascii=False) + "\n")
+
+    def _append(self, *records: dict):
+        dir_path = os.path.dirname(self.path)
+        if dir_path:
+            os.makedirs(dir_path, exist_ok=True)
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.writelines(json.dumps(record, ensure_ascii=False) + "\n" for record in records)
+
+    def _put(self, token: str, user_id: int, file_id: str):
+        self._drop(user_id)
+        self._entries[token] = {"user_id": user_id, "file_id": file_id}
+        self._by_user[user_id] = token
+
+    def _drop(self, user_id: int):
+        token = self._by_user.pop(user_id, None)
+        if token is not None:
+            self._entries.pop(token, None)
+
+    def _drop_token(self, token: str):
+        entry = self._entries.pop(token, None)
+        if entry is not None and self._by_user.get(entry["user_id"]) == token:
+            del self._by_user[entry["user_id"]]
+
+    def get_file_id(self, token: str):
+        self._load()
+        entry = self._entries.get(token)
+        return entry["file_id"] if entry else None
+
+    def set_file_id(self, token: str, user_id: int, file_id: str):
+        self._load()
+        self._put(token, user_id, file_id)
+        self._png.pop(token, None)
+        self._append({"token": token, "user_id": user_id, "file_id": file_id})
+
+    def put_png(self, token: str, user_id: int, png: bytes):
+        self._png[token] = png
+        self._png_tokens[user_id] = token
+
+    def take_png(self, token: str):
+        return self._png.pop(token, None)
+
+    def invalidate_user(self, user_id: int):
+        """
+        Викликається, коли реєстрацію видалено
+        """
+        self._load()
+        self._png.pop(self._png_tokens.pop(user_id, None), None)
+        if user_id not in self._by_user:
+            return
+        self._drop(user_id)
+        self._append({"user_id": user_id})
 
-    path = os.path.join(QR_DIR, f"{user_id}.png")
+    def invalidate_tokens(self, tokens):
+        """
+        Викликається, коли стерто всі реєстрації події: токени містять id події,
+        тож QR-коди інших подій лишаються в кеші
+        """
+        self._load()
+        dropped = []
+        for token in tokens:
+            self._png.pop(token, None)
+            if token in self._entries:
+                self._drop_token(token)
+                dropped.append({"token": token})
+        self._png_tokens = {uid: t for uid, t in self._png_tokens.items() if t in self._png}
+        if dropped:
+            self._append(*dropped)
 
-    img = qrcode.make(token)
-    img.save(path)
 
-    return path
+qr_cache = QRCache()
@@ -0,0 +1,119 @@
+"""
+Компактні записи реєстрацій для JSON-сховища.
+
+У пам'яті гість — об'єкт з __slots__ (без __dict__ на кожен запис),
+ключ — ціле число, username інтернований (той самий рядок у
+known_users і в реєстраціях), друзі — кортеж (порожній спільний на всіх).
+На диску формат не змінився: той самий словник, що й раніше, тож старі
+файли і журнали читаються без міграції. Назовні (публічні методи,
+export_document для перенесення в SQLite) віддаються звичні словники.
+
+Порівняння пам'яті і швидкості: python benchmarks/bench_records.py
+"""
+
+import sys
+from typing import Optional
+
+
+def intern_username(username):
+    return sys.intern(username) if username else None
+
+
+class Friend:
+    __slots__ = ("name", "username")
+
+    def __init__(self, name: str, username: Optional[str] = None):
+        self.name = name
+        self.username = intern_username(username)
+
+    @classmethod
+    def coerce(cls, value):
+        if isinstance(value, cls):
+            return value
+        return cls(value["name"], value.get("username"))
+
+    def to_dict(self) -> dict:
+        return {"name": self.name, "username": self.username}
+
+
+class Registration:
+    __slots__ = ("user_id", "name", "username", "registered_at", "qr_token", "friends", "checked_in_at")
+
+    def __init__(self, user_id: int, name: str, username: Optional[str], registered_at: str,
+                 qr_token: str, friends: tuple = (), checked_in_at: Optional[str] = None):
+        self.user_id = user_id
+        self.name = name
+        self.username = intern_username(username)
+        self.registered_at = registered_at
+        self.qr_token = qr_token
+        self.friends = friends
+        self.checked_in_at = checked_in_at
+
+    @classmethod
+    def from_dict(cls, user_id, data: dict):
+        friends = data.get("friends")
+        return cls(
+            int(user_id), data["name"], data.get("username"), data.get("registered_at") or "",
+            data.get("qr_token"), tuple(Friend.coerce(f) for f in friends) if friends else (),
+            data.get("checked_in_at"),
+        )
+
+    @classmethod
+    def coerce(cls, user_id, value):
+        if isinstance(value, cls):
+            return value
+        return cls.from_dict(user_id, value)
+
+    def add_friend(self, friend: Friend):
+        # кортеж замість списку: у більшості гостей друзів нема, а порожній кортеж спільний
+        self.friends = self.friends + (friend,)
+
+    @property
+    def seats(self) -> int:
+        return 1 + len(self.friends)
+
+    def to_dict(self) -> dict:
+        """
+        Словник у форматі документа (той, що повертають get_registration / get_all_registered)
+        """
+        data = {
+            "name": self.name,
+            "username": self.username,
+            "registered_at": self.registered_at,
+            "qr_token": self.qr_token,
+        }
+        if self.friends:
+            data["friends"] = [f.to_dict() for f in self.friends]
+        if self.checked_in_at:
+            data["checked_in_at"] = self.checked_in_at
+        return data
+
+
+def registrations_from_json(users: dict) -> dict:
+    """
+    {"123": {...}} з документа → {123: Registration}.
+    Виконується на кожне читання файла — тому без coerce / from_dict на кожного гостя.
+    """
+    result = {}
+    for uid, user in users.items():
+        uid = int(uid)
+        if isinstance(user, Registration):
+            result[uid] = user
+            continue
+        friends = user.get("friends")
+        result[uid] = Registration(
+            uid, user["name"], user.get("username"), user.get("registered_at") or "",
+            user.get("qr_token"),
+            tuple([Friend(f["name"], f.get("username")) for f in friends]) if friends else (),
+            user.get("checked_in_at"),
+        )
+    return result
+
+
+def encode_record(obj):
+    """
+    default= для json.dumps: записи серіалізуються у свій словник, решта — помилка як звично
+    """
+    if isinstance(obj, (Registration, Friend)):
+        return obj.to_dict()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
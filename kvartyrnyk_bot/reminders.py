@@ -0,0 +1,278 @@
+"""
+Нагадування гостям перед подією.
+
+Час події адміністратор вводить текстом (/set_event); якщо його вдається
+розібрати (parse_event_time), для кожного зсуву з REMINDER_OFFSETS
+(наприклад, за 24 год і за 1 год) планується завдання.
+
+- Завдання лежать у купі за часом спрацювання: цикл спить рівно
+  до найближчого і прокидається раніше, лише якщо додали ближче.
+- Завдання зберігаються в REMINDERS_PATH, а кому нагадування вже
+  надіслано — в журналі поруч (REMINDERS_PATH + ".sent", рядок на гостя).
+  Кожне планування дає завданням нові id, тож рядки журналу скасованих
+  завдань (їх прибирає cancel_event) не зачеплять переплановані.
+  Після перезапуску пропущені нагадування надсилаються (якщо подія
+  ще не почалась), а вже отримані — не повторюються (хіба що ті
+  кілька, що були в польоті в момент зупинки).
+- Відправлення — через send_queue, з тими самими лімітами, що й розсилка.
+"""
+
+import asyncio
+import heapq
+import json
+import logging
+import os
+import re
+import time
+import uuid
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+from broadcast import SendQueue, send_queue, escape_markdown
+from config import (
+    MESSAGES, REMINDER_OFFSETS, REMINDERS_PATH, EVENT_TIMEZONE, BROADCAST_CONCURRENCY,
+)
+from database import db, adb
+
+logger = logging.getLogger(__name__)
+
+# формати часу події; без року — найближча така дата в майбутньому
+TIME_FORMATS = (
+    "%d.%m.%Y %H:%M", "%d.%m.%y %H:%M", "%Y-%m-%d %H:%M", "%d/%m/%Y %H:%M",
+    "%H:%M %d.%m.%Y", "%d.%m %H:%M", "%H:%M %d.%m",
+)
+
+
+def parse_event_time(text: str, now: datetime | None = None):
+    """
+    "31.12.2026 19:00", "31.12 о 19:00", "2026-12-31 19:00" → datetime (EVENT_TIMEZONE) або None
+    """
+    tz = ZoneInfo(EVENT_TIMEZONE)
+    now = now or datetime.now(tz)
+    cleaned = re.sub(r"\s+(?:о|об|at)\s+", " ", text.strip(), flags=re.IGNORECASE)
+    cleaned = re.sub(r"\s+", " ", cleaned).rstrip(".")
+
+    for fmt in TIME_FORMATS:
+        try:
+            parsed = datetime.strptime(cleaned, fmt)
+        except ValueError:
+            continue
+        parsed = parsed.replace(tzinfo=tz)
+        if "%Y" not in fmt and "%y" not in fmt:
+            parsed = parsed.replace(year=now.year)
+            if parsed < now:
+                parsed = parsed.replace(year=now.year + 1)
+        return parsed
+    return None
+
+
+def format_offset(seconds: int) -> str:
+    hours, minutes = divmod(seconds // 60, 60)
+    if hours and minutes:
+        return f"через {hours} год {minutes} хв"
+    return f"через {hours} год" if hours else f"через {minutes} хв"
+
+
+class ReminderScheduler:
+
+    def __init__(self, queue: SendQueue, path: str = REMINDERS_PATH,
+                 offsets=REMINDER_OFFSETS, concurrency: int = BROADCAST_CONCURRENCY):
+        self.queue = queue
+        self.path = path
+        self.sent_path = path + ".sent"
+        self.offsets = offsets
+        self.concurrency = concurrency
+
+        self._jobs = {}    # job_id → {"event_id", "offset", "fire_at", "starts_at"} (час — unix)
+        self._heap = []    # (fire_at, job_id); застарілі записи пропускаються
+        self._sent = {}    # job_id → user_id, яким уже надіслано
+        self._wakeup = None
+        self._task = None
+        self._load()
+
+    # ===== STATE =====
+
+    def _load(self):
+        if os.path.exists(self.path):
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self._jobs = json.load(f)
+            for job_id, job in self._jobs.items():
+                heapq.heappush(self._heap, (job["fire_at"], job_id))
+
+        if os.path.exists(self.sent_path):
+            with open(self.sent_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    job_id, _, user_id = line.strip().rpartition(" ")
+                    if job_id in self._jobs and user_id.isdigit():
+                        self._sent.setdefault(job_id, set()).add(int(user_id))
+
+    def _save(self):
+        dir_path = os.path.dirname(self.path)
+        if dir_path:
+            os.makedirs(dir_path, exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._jobs, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def _log_sent(self, job_id: str, user_id: int):
+        with open(self.sent_path, 'a', encoding='utf-8') as f:
+            f.write(f"{job_id} {user_id}\n")
+
+    def _rewrite_sent_log(self):
+        # журнал зводиться до незавершених завдань
+        with open(self.sent_path, 'w', encoding='utf-8') as f:
+            for job_id, users in self._sent.items():
+                f.writelines(f"{job_id} {user_id}\n" for user_id in users)
+
+    # ===== JOBS =====
+
+    def schedule_event(self, event_id: str, starts_at: datetime) -> list:
+        """
+        (Пере)планує нагадування події. Повертає час спрацювання запланованих.
+        Зсуви, що вже минули, пропускаються.
+        """
+        self.cancel_event(event_id, save=False)
+
+        now = time.time()
+        generation = uuid.uuid4().hex[:8]
+        planned = []
+        for offset in self.offsets:
+            fire_at = starts_at.timestamp() - offset
+            if fire_at <= now:
+                continue
+            job_id = f"{event_id}:{offset}:{generation}"
+            self._jobs[job_id] = {
+                "event_id": event_id, "offset": offset,
+                "fire_at": fire_at, "starts_at": starts_at.timestamp(),
+            }
+            heapq.heappush(self._heap, (fire_at, job_id))
+            planned.append(datetime.fromtimestamp(fire_at, starts_at.tzinfo))
+
+        self._save()
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return sorted(planned)
+
+    def cancel_event(self, event_id: str, save: bool = True) -> int:
+        cancelled = [job_id for job_id, job in self._jobs.items() if job["event_id"] == event_id]
+        had_sent = False
+        for job_id in cancelled:
+            del self._jobs[job_id]
+            had_sent |= self._sent.pop(job_id, None) is not None
+        if had_sent:
+            self._rewrite_sent_log()
+        if save and cancelled:
+            self._save()
+        return len(cancelled)
+
+    def pending(self) -> list:
+        tz = ZoneInfo(EVENT_TIMEZONE)
+        return [
+            {**job, "id": job_id, "fire_at": datetime.fromtimestamp(job["fire_at"], tz),
+             "sent": len(self._sent.get(job_id, ()))}
+            for job_id, job in sorted(self._jobs.items(), key=lambda item: item[1]["fire_at"])
+        ]
+
+    def _finish(self, job_id: str, job: dict):
+        # поки надсилали, завдання могли скасувати або перепланувати
+        if self._jobs.get(job_id) is not job:
+            return
+        del self._jobs[job_id]
+        if self._sent.pop(job_id, None) is not None:
+            self._rewrite_sent_log()
+        self._save()
+
+    # ===== RUN =====
+
+    def start(self):
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def _next_delay(self):
+        # застарілі записи (скасовані або переплановані) з вершини купи
+        while self._heap:
+            fire_at, job_id = self._heap[0]
+            job = self._jobs.get(job_id)
+            if job is not None and job["fire_at"] == fire_at:
+                return max(0.0, fire_at - time.time())
+            heapq.heappop(self._heap)
+        return None
+
+    async def _run(self):
+        while True:
+            delay = self._next_delay()
+            if delay is None or delay > 0:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            _, job_id = heapq.heappop(self._heap)
+            job = self._jobs[job_id]
+            try:
+                await self._fire(job_id, job)
+            except Exception:
+                # повтор за хвилину; кому вже надіслано — не дублюється
+                logger.exception("Помилка надсилання нагадування %s", job_id)
+                if self._jobs.get(job_id) is not job:
+                    continue
+                job["fire_at"] = time.time() + 60
+                heapq.heappush(self._heap, (job["fire_at"], job_id))
+                self._save()
+
+    @staticmethod
+    def _event_snapshot(event_id: str):
+        store = db.get_store(event_id)
+        name = next(e["name"] for e in db.list_events() if e["id"] == event_id)
+        return name, store.get_event_info(), [int(uid) for uid in store.get_all_registered()]
+
+    async def _fire(self, job_id: str, job: dict):
+        if time.time() >= job["starts_at"]:
+            # бот лежав до самого початку — нагадування вже не актуальне
+            logger.info("Нагадування %s пропущено: подія вже почалась", job_id)
+            self._finish(job_id, job)
+            return
+
+        try:
+            name, info, guests = await adb.run(self._event_snapshot, job["event_id"])
+        except KeyError:
+            # подію заархівовано
+            self._finish(job_id, job)
+            return
+
+        # назва, місце і час — вільний текст адміністратора
+        text = MESSAGES["reminder"].format(
+            event=escape_markdown(name), when=format_offset(job["offset"]),
+            place=escape_markdown(info["place"] or "—"), time=escape_markdown(info["time"]),
+        )
+        sent = self._sent.setdefault(job_id, set())
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def send_one(user_id: int):
+            async with semaphore:
+                delivered = await self.queue.send_message(user_id, text, parse_mode="Markdown")
+            if delivered:
+                sent.add(user_id)
+                self._log_sent(job_id, user_id)
+            return delivered
+
+        pending = [uid for uid in guests if uid not in sent]
+        logger.info("Нагадування %s: %s гостей", job_id, len(pending))
+        results = await asyncio.gather(*(send_one(uid) for uid in pending))
+        if not all(results):
+            # мережу і 5xx deliver уже повторив; лишились заблоковані боти,
+            # видалені чати і відхилені Telegram повідомлення
+            logger.warning("Нагадування %s не доставлено %s гостям", job_id, results.count(False))
+        self._finish(job_id, job)
+
+
+reminders = ReminderScheduler(send_queue)
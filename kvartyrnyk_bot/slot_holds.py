@@ -0,0 +1,75 @@
+"""
+Тимчасове утримання місць, поки гість проходить кроки реєстрації з друзями.
+
+Утримання живе SLOT_HOLD_TTL секунд. Строки зберігаються в купі (heap):
+прострочені знімаються з її вершини за O(log n) кожне, без перегляду
+всіх утримань.
+"""
+
+import heapq
+import threading
+import time
+
+from config import SLOT_HOLD_TTL
+
+
+class SlotHolds:
+
+    def __init__(self, ttl: float = SLOT_HOLD_TTL):
+        self.ttl = ttl
+        self._holds = {}   # user_id → (місць, коли спливає)
+        self._heap = []    # (коли спливає, user_id); застарілі записи пропускаються
+        self._total = 0
+        self._lock = threading.Lock()
+
+    def put(self, user_id: int, seats: int):
+        """
+        Утримує seats місць для user_id (замінює попереднє утримання)
+        """
+        expires_at = time.monotonic() + self.ttl
+        with self._lock:
+            old = self._holds.get(user_id)
+            if old is not None:
+                self._total -= old[0]
+            self._holds[user_id] = (seats, expires_at)
+            self._total += seats
+            heapq.heappush(self._heap, (expires_at, user_id))
+
+    def release(self, user_id: int) -> int:
+        with self._lock:
+            hold = self._holds.pop(user_id, None)
+            if hold is None:
+                return 0
+            self._total -= hold[0]
+            return hold[0]
+
+    def expire(self) -> int:
+        """
+        Знімає прострочені утримання. Повертає кількість звільнених місць.
+        """
+        now = time.monotonic()
+        freed = 0
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                expires_at, user_id = heapq.heappop(self._heap)
+                hold = self._holds.get(user_id)
+                # запис у купі міг застаріти: утримання оновили або вже зняли
+                if hold is not None and hold[1] == expires_at:
+                    del self._holds[user_id]
+                    self._total -= hold[0]
+                    freed += hold[0]
+        return freed
+
+    def seats(self, user_id: int) -> int:
+        hold = self._holds.get(user_id)
+        return hold[0] if hold else 0
+
+    def total(self) -> int:
+        return self._total
+
+    def seconds_to_next_expiry(self):
+        with self._lock:
+            # застарілі записи на вершині лише розбудять таймер трохи раніше
+            if not self._heap:
+                return None
+            return max(0.0, self._heap[0][0] - time.monotonic())
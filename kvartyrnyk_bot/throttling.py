@@ -0,0 +1,129 @@
+"""
+Обмеження частоти оновлень від одного користувача.
+
+Під час ажіотажу люди натискають "📋 Мій статус" чи "🎫 Мій QR" по кілька
+разів на секунду — кожне натискання читає сховище, а QR ще й рендериться.
+Middleware мовчки відкидає повтори того самого натискання в межах вікна
+і тримає для кожного користувача відро токенів; дорогі обробники
+(позначені flags={"throttling": "expensive"}) мають суворіший ліміт.
+"""
+
+import time
+from collections import Counter, OrderedDict
+from typing import Any, Awaitable, Callable
+
+from aiogram import BaseMiddleware
+from aiogram.dispatcher.flags import get_flag
+from aiogram.types import CallbackQuery, Message, TelegramObject
+
+from config import (
+    ADMIN_ID, THROTTLE_LIMITS, THROTTLE_DUPLICATE_WINDOW, THROTTLE_MAX_USERS, THROTTLE_TTL,
+)
+
+
+class ExpiringDict:
+    """
+    Словник з обмеженим розміром: записи, яких не чіпали ttl секунд,
+    і найдавніші понад max_size викидаються.
+    Порядок — за часом останнього запису, тож прибирання йде з голови за O(1).
+    """
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._items = OrderedDict()   # key → (value, час запису)
+
+    def get(self, key, now: float):
+        item = self._items.get(key)
+        if item is None or now - item[1] > self.ttl:
+            return None
+        return item[0]
+
+    def set(self, key, value, now: float):
+        self._items[key] = (value, now)
+        self._items.move_to_end(key)
+
+        while self._items:
+            _, (_, touched_at) = next(iter(self._items.items()))
+            if len(self._items) <= self.max_size and now - touched_at <= self.ttl:
+                break
+            self._items.popitem(last=False)
+
+    def __len__(self):
+        return len(self._items)
+
+
+class ThrottlingMiddleware(BaseMiddleware):
+
+    def __init__(self, limits: dict = THROTTLE_LIMITS,
+                 duplicate_window: float = THROTTLE_DUPLICATE_WINDOW,
+                 max_users: int = THROTTLE_MAX_USERS, ttl: float = THROTTLE_TTL):
+        self.limits = limits                      # рівень → (токенів/с, розмір відра)
+        self.duplicate_window = duplicate_window
+        self._buckets = ExpiringDict(max_users * len(limits), ttl)  # (user_id, рівень) → (токени, час)
+        self._last = ExpiringDict(max_users, ttl)                   # user_id → (що натиснуто, коли)
+        self.counters = Counter()
+
+    @staticmethod
+    def _fingerprint(event: TelegramObject):
+        if isinstance(event, Message):
+            return event.text
+        if isinstance(event, CallbackQuery):
+            return event.data
+        return None
+
+    def _take(self, user_id: int, tier: str, now: float) -> bool:
+        rate, burst = self.limits.get(tier, self.limits["default"])
+        state = self._buckets.get((user_id, tier), now)
+        tokens = burst if state is None else min(burst, state[0] + (now - state[1]) * rate)
+
+        if tokens < 1:
+            self._buckets.set((user_id, tier), (tokens, now), now)
+            return False
+        self._buckets.set((user_id, tier), (tokens - 1, now), now)
+        return True
+
+    async def _drop(self, event: TelegramObject, reason: str):
+        self.counters[f"dropped_{reason}"] += 1
+        if isinstance(event, CallbackQuery):
+            # інакше в клієнта крутитиметься годинник на кнопці
+            await event.answer()
+        return None
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        user = data.get("event_from_user")
+        if user is None or user.id == ADMIN_ID:
+            return await handler(event, data)
+
+        now = time.monotonic()
+
+        # однакові натискання підряд зливаються в одне
+        fingerprint = self._fingerprint(event)
+        last = self._last.get(user.id, now)
+        self._last.set(user.id, (fingerprint, now), now)
+        if (fingerprint is not None and last is not None
+                and last[0] == fingerprint and now - last[1] < self.duplicate_window):
+            return await self._drop(event, "duplicate")
+
+        tier = get_flag(data, "throttling", default="default")
+        if not self._take(user.id, tier, now):
+            return await self._drop(event, "rate")
+
+        self.counters["passed"] += 1
+        return await handler(event, data)
+
+    def stats(self):
+        return {
+            "passed": self.counters["passed"],
+            "dropped_duplicate": self.counters["dropped_duplicate"],
+            "dropped_rate": self.counters["dropped_rate"],
+            "tracked_users": len(self._last),
+        }
+
+
+throttling_middleware = ThrottlingMiddleware()
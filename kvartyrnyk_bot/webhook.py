@@ -0,0 +1,144 @@
+"""
+Режим вебхука: Telegram надсилає оновлення POST-запитами на aiohttp-сервер.
+
+Запити без правильного X-Telegram-Bot-Api-Secret-Token відхиляються завжди:
+якщо WEBHOOK_SECRET порожній, під час запуску генерується випадковий і
+передається Telegram у set_webhook (інакше будь-хто, хто знайшов URL,
+міг би надіслати оновлення від імені ADMIN_ID).
+
+Перевірка локально (без Telegram): залиште WEBHOOK_URL порожнім, задайте
+WEBHOOK_SECRET, запустіть бота і надішліть записані оновлення:
+    python benchmarks/replay_updates.py updates.jsonl
+"""
+
+import asyncio
+import hmac
+import json
+import logging
+import secrets
+from typing import Any
+
+from aiogram import Bot, Dispatcher
+from aiogram.methods import TelegramMethod
+from aiohttp import web
+
+from config import (
+    WEBHOOK_URL, WEBHOOK_PATH, WEBHOOK_SECRET, WEBHOOK_HOST, WEBHOOK_PORT,
+    WEBHOOK_WORKERS, WEBHOOK_QUEUE_SIZE, DROP_PENDING_UPDATES,
+)
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+def update_user_id(update: dict) -> int:
+    """
+    Telegram ID автора оновлення (0, якщо його нема)
+    """
+    for value in update.values():
+        if isinstance(value, dict) and isinstance(value.get("from"), dict):
+            return value["from"].get("id", 0)
+    return 0
+
+
+class WebhookServer:
+    """
+    Приймає оновлення і одразу відповідає 200, а обробляє їх
+    фіксована кількість воркерів.
+
+    Оновлення одного користувача завжди потрапляють до того самого
+    воркера, тож кроки його реєстрації обробляються по черзі.
+    Черги обмежені: якщо всі зайняті, запит чекає — це зворотний тиск
+    на Telegram замість необмеженого накопичення задач.
+    """
+
+    def __init__(self, dp: Dispatcher, bot: Bot, secret: str = WEBHOOK_SECRET,
+                 workers: int = WEBHOOK_WORKERS, queue_size: int = WEBHOOK_QUEUE_SIZE):
+        if not secret:
+            raise ValueError("Вебхук без секрету приймав би оновлення від будь-кого")
+        self.dp = dp
+        self.bot = bot
+        self.secret = secret
+        self._queues = [asyncio.Queue(maxsize=queue_size) for _ in range(workers)]
+        self._workers = []
+
+    async def handle(self, request: web.Request) -> web.Response:
+        if not hmac.compare_digest(request.headers.get(SECRET_HEADER, ""), self.secret):
+            return web.Response(status=401, text="Unauthorized")
+
+        body = await request.read()
+        try:
+            update = json.loads(body)
+        except ValueError:
+            return web.Response(status=400, text="Bad Request")
+
+        queue = self._queues[update_user_id(update) % len(self._queues)]
+        await queue.put((update, len(body)))
+        return web.json_response({})
+
+    async def _worker(self, queue: asyncio.Queue):
+        while True:
+            update, size = await queue.get()
+            try:
+                # update_size — для метрик (metrics.UpdateMetricsMiddleware)
+                result = await self.dp.feed_raw_update(self.bot, update, update_size=size)
+                if isinstance(result, TelegramMethod):
+                    await self.dp.silent_call_request(bot=self.bot, result=result)
+            except Exception:
+                logger.exception("Помилка обробки оновлення %s", update.get("update_id"))
+            finally:
+                queue.task_done()
+
+    async def start(self):
+        self._workers = [asyncio.create_task(self._worker(q)) for q in self._queues]
+
+    async def stop(self):
+        # даємо дообробити вже прийняті оновлення
+        for queue in self._queues:
+            await queue.join()
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+
+    def build_app(self, path: str = WEBHOOK_PATH) -> web.Application:
+        app = web.Application()
+        app.router.add_post(path, self.handle)
+        return app
+
+
+async def run_webhook(dp: Dispatcher, bot: Bot, **kwargs: Any):
+    """
+    Запускає aiohttp-сервер і (якщо задано WEBHOOK_URL) реєструє вебхук у Telegram
+    """
+    secret = WEBHOOK_SECRET
+    if not secret:
+        secret = secrets.token_urlsafe(32)
+        logger.warning("WEBHOOK_SECRET не задано — використовується випадковий секрет цього запуску%s",
+                       "" if WEBHOOK_URL else " (replay_updates.py його не знає: задайте WEBHOOK_SECRET)")
+
+    server = WebhookServer(dp, bot, secret=secret)
+    runner = web.AppRunner(server.build_app())
+    await runner.setup()
+
+    await dp.emit_startup(bot=bot, **kwargs)
+    await server.start()
+
+    site = web.TCPSite(runner, WEBHOOK_HOST, WEBHOOK_PORT)
+    await site.start()
+    logger.info("Вебхук слухає %s:%s%s", WEBHOOK_HOST, WEBHOOK_PORT, WEBHOOK_PATH)
+
+    if WEBHOOK_URL:
+        await bot.set_webhook(
+            WEBHOOK_URL + WEBHOOK_PATH,
+            secret_token=secret,
+            drop_pending_updates=DROP_PENDING_UPDATES,
+            allowed_updates=dp.resolve_used_update_types(),
+        )
+
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+        await server.stop()
+        await dp.emit_shutdown(bot=bot, **kwargs)